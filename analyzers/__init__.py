@@ -0,0 +1,11 @@
+"""
+解析ツール - かよ皮膚科予約管理システム
+auto_analyzer.py・timing_analyzer.py・page_analyzer.py・page_analyzer_v2.py・interactive_analyzer.pyの共通部分
+"""
+
+from analyzers.common import (
+    MAIN_URL, BOOKING_URL, BOOKING_HOURS, WEEKDAY_JP, booking_links, check_booking_availability
+)
+from analyzers.backends import SeleniumBackend, HtmlBackend, create_backend
+from analyzers.probes import PROBES, PageContext, probe, run_probes
+from analyzers.session import AnalyzerSession
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析ツールの共通の入口
+
+使用方法:
+  python -m analyzers [--html] [URLまたはHTMLファイル] [プローブ名...]
+  python -m analyzers --html reception_form_20250827_105106.html forms inputs buttons
+"""
+
+import sys
+
+from analyzers.common import MAIN_URL
+from analyzers.probes import PROBES
+from analyzers.session import AnalyzerSession
+
+DEFAULT_PROBES = ["page_info", "booking_links", "forms", "inputs", "buttons"]
+
+def main():
+    """メイン関数"""
+    arguments = sys.argv[1:]
+    backend = 'html' if '--html' in arguments else 'selenium'
+    arguments = [argument for argument in arguments if argument != '--html']
+
+    url = MAIN_URL
+    if arguments and arguments[0] not in PROBES:
+        url = arguments.pop(0)
+    probes = arguments or DEFAULT_PROBES
+
+    with AnalyzerSession(backend) as session:
+        session.open(url)
+        session.analyze(probes)
+
+if __name__ == "__main__":
+    main()
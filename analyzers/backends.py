@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析ツールのページ取得方式 - かよ皮膚科予約管理システム
+SeleniumBackend: ブラウザプールのChromeで表示（seleniumは使用時に読み込む）
+HtmlBackend: HTTPで取得したHTMLまたは保存済みのHTMLを解析（ブラウザ不要）
+どちらもスナップショット・テキスト検索・ページソース・リンクのクリックを同じ形で提供する
+"""
+
+import os
+import logging
+
+from dom_snapshot import snapshot_from_html, find_text_in_html
+
+logger = logging.getLogger(__name__)
+
+# ページの読み込み完了を待つ上限（秒）
+LOAD_TIMEOUT = 10
+
+class SeleniumBackend:
+    """ブラウザプールから借りたChromeでページを表示する取得方式"""
+
+    name = 'selenium'
+
+    def __init__(self, headless=False, load_timeout=LOAD_TIMEOUT):
+        self.headless = headless
+        self.load_timeout = load_timeout
+        self.pool = None
+        self.driver = None
+
+    def start(self):
+        """ブラウザを借りる"""
+        # seleniumの読み込みはブラウザを使うときまで遅らせる
+        from browser_pool import get_browser_pool
+
+        self.pool = get_browser_pool(headless=self.headless, size=1)
+        self.driver = self.pool.acquire()
+
+    def close(self):
+        """ブラウザを返却"""
+        if self.driver is not None:
+            self.pool.release(self.driver)
+            self.driver = None
+
+    def _wait_loaded(self):
+        from page_waits import wait_for_document_ready
+        wait_for_document_ready(self.driver, self.load_timeout)
+
+    def open(self, url):
+        """ページを表示（予約サイトへの送信はプロセス全体の制限で調整）"""
+        from request_governor import get_request_governor
+
+        with get_request_governor().slot(url):
+            self.driver.get(url)
+        self._wait_loaded()
+
+    @property
+    def title(self):
+        return self.driver.title
+
+    @property
+    def current_url(self):
+        return self.driver.current_url
+
+    def snapshot(self):
+        """フォーム・入力欄・ボタン・リンクを取得"""
+        from dom_snapshot import take_dom_snapshot
+        return take_dom_snapshot(self.driver)
+
+    def find_text(self, keywords, limit=3):
+        """文字列ごとに(件数, 先頭limit件の要素)を取得"""
+        from dom_snapshot import find_text_elements
+        return find_text_elements(self.driver, keywords, limit=limit)
+
+    def page_source(self):
+        """ページのHTML"""
+        return self.driver.page_source
+
+    def click_link(self, link):
+        """スナップショットのリンクをクリックして遷移を待つ"""
+        from selenium.webdriver.common.by import By
+        from page_waits import wait_for_navigation
+
+        previous_url = self.driver.current_url
+        element = self.driver.find_element(By.XPATH, f"(//a)[{link.index + 1}]")
+        element.click()
+        wait_for_navigation(self.driver, self.load_timeout, previous_url, element)
+
+    def back(self):
+        """前のページに戻る"""
+        self.driver.back()
+        self._wait_loaded()
+
+    def screenshot(self, filename):
+        """スクリーンショットを保存"""
+        self.driver.save_screenshot(filename)
+        return True
+
+class HtmlBackend:
+    """HTMLだけを取得して解析する取得方式（ファイルのパスも指定可能）"""
+
+    name = 'html'
+
+    def __init__(self, timeout=LOAD_TIMEOUT, user_agent=None):
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.session = None
+        self.history = []
+        self.html = ''
+        self.url = None
+        self._snapshot = None
+
+    def start(self):
+        """HTTPセッションを作成"""
+        import requests
+
+        self.session = requests.Session()
+        if self.user_agent:
+            self.session.headers['User-Agent'] = self.user_agent
+
+    def close(self):
+        """HTTPセッションを閉じる"""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def _load(self, url):
+        if os.path.isfile(url):
+            from snapshot_writer import read_snapshot
+            return read_snapshot(url), None
+
+        from request_governor import get_request_governor
+        response = get_request_governor().get(self.session, url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text, response.url
+
+    def open(self, url):
+        """ページを取得（保存済みのHTMLのパスも可）"""
+        html, final_url = self._load(url)
+        if self.url is not None:
+            self.history.append((self.url, self.html))
+        self.html = html
+        self.url = final_url or url
+        self._snapshot = None
+
+    @property
+    def title(self):
+        return self.snapshot().title
+
+    @property
+    def current_url(self):
+        return self.url
+
+    def snapshot(self):
+        """フォーム・入力欄・ボタン・リンクを取得"""
+        if self._snapshot is None:
+            base_url = self.url if self.url and '://' in self.url else None
+            self._snapshot = snapshot_from_html(self.html, base_url)._replace(url=self.url)
+        return self._snapshot
+
+    def find_text(self, keywords, limit=3):
+        """文字列ごとに(件数, 先頭limit件の要素)を取得"""
+        return find_text_in_html(self.html, keywords, limit=limit)
+
+    def page_source(self):
+        """ページのHTML"""
+        return self.html
+
+    def click_link(self, link):
+        """リンク先を取得"""
+        if not link.href:
+            raise ValueError(f"リンク先がありません: '{link.text}'")
+        self.open(link.href)
+
+    def back(self):
+        """前のページに戻る"""
+        if not self.history:
+            raise ValueError("前のページがありません")
+        self.url, self.html = self.history.pop()
+        self._snapshot = None
+
+    def screenshot(self, filename):
+        """HTMLのみの取得方式ではスクリーンショットを保存できない"""
+        logger.info(f"HTMLのみの取得方式のため、スクリーンショットは保存しません: {filename}")
+        return False
+
+BACKENDS = {
+    SeleniumBackend.name: SeleniumBackend,
+    HtmlBackend.name: HtmlBackend
+}
+
+def create_backend(name='selenium', **options):
+    """取得方式を作成"""
+    try:
+        return BACKENDS[name](**options)
+    except KeyError:
+        raise ValueError(f"不明な取得方式です: {name}（{', '.join(BACKENDS)}）")
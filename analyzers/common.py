@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析ツール共通の設定 - かよ皮膚科予約管理システム
+URL・受付時間・予約関連リンクの分類を各解析ツールで共有する
+"""
+
+from datetime import datetime
+
+from reception_calendar import DEFAULT_BOOKING_HOURS, get_reception_calendar
+
+MAIN_URL = "https://www5.tandt.co.jp/cti/hs713/index_p.html"
+BOOKING_URL = "https://www4.tandt.co.jp/rsvsys/jsp/JobDispatcher.jsp?agent=RSV1&jobid=rsvmod000&callback=0&gc=KQhkYPLO&portal=index_P.html&nj=rsvmodG01&"
+
+# 受付時間設定
+BOOKING_HOURS = DEFAULT_BOOKING_HOURS
+
+WEEKDAY_JP = {
+    "monday": "月曜日",
+    "tuesday": "火曜日",
+    "wednesday": "水曜日",
+    "thursday": "木曜日",
+    "friday": "金曜日",
+    "saturday": "土曜日",
+    "sunday": "日曜日"
+}
+
+# 予約関連リンクの分類（表示名, リンクの文字列）
+BOOKING_LINK_CATEGORIES = [
+    ("順番受付", "順番受付"),
+    ("予約確認", "予約の確認・取消"),
+    ("呼出状況", "現在のお呼出状況")
+]
+
+def booking_links(snapshot):
+    """予約関連リンクを分類順に取得（[(表示名, [LinkInfo])]）"""
+    return [
+        (label, [link for link in snapshot.links if text in link.text])
+        for label, text in BOOKING_LINK_CATEGORIES
+    ]
+
+def check_booking_availability(now=None, emit=print):
+    """Web予約の受付時間内かチェック（祝日・休診日を含む）"""
+    now = now or datetime.now()
+    weekday = now.strftime("%A").lower()
+    calendar = get_reception_calendar()
+
+    emit(f"\n=== 現在時刻: {now.strftime('%Y年%m月%d日 %H:%M:%S')} ===")
+    emit(f"曜日: {WEEKDAY_JP.get(weekday, weekday)}")
+
+    hours = calendar.booking_hours.get(weekday, {})
+    emit(f"診察時間: 午前 {hours.get('morning')}, 午後 {hours.get('afternoon')}")
+    emit(f"Web予約受付: {hours.get('web')}")
+
+    if calendar.is_closed_day(now, 'web'):
+        emit("❌ 本日はWeb予約受付不可（休診日・祝日）")
+        return False
+
+    start, end = calendar.next_window(now, 'web')
+    if calendar.is_open(now, 'web'):
+        emit(f"✅ Web予約受付可能（{end.strftime('%H:%M')}まで）")
+        return True
+    if start is not None and start.date() == now.date():
+        emit(f"⏳ Web予約受付開始まで待機中（{start.strftime('%H:%M')}開始）")
+        return False
+    emit(f"❌ 本日のWeb予約受付は終了しました（次回: {start.strftime('%m/%d %H:%M') if start else 'なし'}）")
+    return False
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析項目（プローブ） - かよ皮膚科予約管理システム
+ページへの問い合わせはPageContextで1回ずつにまとめてキャッシュし、各プローブはその結果から表示内容を作る
+プローブは@probe("名前")で登録し、run_probesで並列に実行して登録順ではなく指定順に出力する
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dom_snapshot import form_inputs, is_patient_related_input
+from analyzers.common import booking_links
+
+# 登録済みのプローブ（名前 → 関数）
+PROBES = {}
+
+class PageContext:
+    """解析中のページ（スナップショット・ページソース・テキスト検索の結果をキャッシュ）"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self._snapshot = None
+        self._page_source = None
+        self._text_matches = {}
+
+    @property
+    def snapshot(self):
+        with self.lock:
+            if self._snapshot is None:
+                self._snapshot = self.backend.snapshot()
+            return self._snapshot
+
+    @property
+    def page_source(self):
+        with self.lock:
+            if self._page_source is None:
+                self._page_source = self.backend.page_source()
+            return self._page_source
+
+    def find_text(self, keywords, limit=3):
+        """文字列ごとに(件数, 先頭limit件の要素)を取得（取得済みの文字列は再検索しない）"""
+        with self.lock:
+            missing = [keyword for keyword in keywords if (keyword, limit) not in self._text_matches]
+            if missing:
+                for keyword, result in self.backend.find_text(missing, limit=limit).items():
+                    self._text_matches[(keyword, limit)] = result
+            return {keyword: self._text_matches[(keyword, limit)] for keyword in keywords}
+
+def probe(name):
+    """プローブを登録するデコレーター（関数は(context, **options)を受け取り、表示する行のリストを返す）"""
+    def register(function):
+        PROBES[name] = function
+        return function
+    return register
+
+@probe("page_info")
+def probe_page_info(context):
+    """ページタイトルとURL"""
+    snapshot = context.snapshot
+    return [f"ページタイトル: {snapshot.title}", f"現在のURL: {snapshot.url}"]
+
+@probe("booking_links")
+def probe_booking_links(context, numbered=False):
+    """予約関連リンク（順番受付・予約確認・呼出状況）"""
+    lines = ["=== 予約関連リンクの検索 ==="]
+    number = 0
+    total = 0
+    for label, links in booking_links(context.snapshot):
+        total += len(links)
+        if not numbered:
+            lines.append(f"{label}リンク: {len(links)}個")
+        for i, link in enumerate(links):
+            number += 1
+            if numbered:
+                lines.append(f"{number}. {label}: '{link.text}' -> {link.href}")
+            else:
+                lines.append(f"  {i+1}. '{link.text}' -> {link.href}")
+                lines.append(f"     親要素: {link.parent_tag}, クラス: {link.parent_class}")
+
+    if numbered:
+        return lines
+
+    lines.append(f"総予約関連リンク数: {total}個")
+    if total == 0:
+        lines.append("⚠️  予約関連リンクが見つかりません。")
+        lines.append("    - 受付時間外の可能性")
+        lines.append("    - ページの読み込みが完了していない可能性")
+        lines.append("    - システムメンテナンス中の可能性")
+    else:
+        lines.append("✅ 予約関連リンクが正常に表示されています。")
+    return lines
+
+@probe("forms")
+def probe_forms(context, show_values=False):
+    """フォームとフォーム内の入力欄"""
+    snapshot = context.snapshot
+    lines = [f"フォームの数: {len(snapshot.forms)}"]
+    for i, form in enumerate(snapshot.forms):
+        lines.append(f"フォーム{i+1}: action={form.action}, method={form.method}, id={form.id}, class={form.css_class}")
+
+        inputs = form_inputs(snapshot, form)
+        lines.append(f"  入力要素: {len(inputs)}個")
+        for inp in inputs:
+            line = f"    - タイプ: {inp.type}, 名前: {inp.name}, ID: {inp.id}, プレースホルダー: {inp.placeholder}"
+            lines.append(f"{line}, 値: {inp.value}" if show_values else line)
+    return lines
+
+@probe("inputs")
+def probe_inputs(context):
+    """入力欄（フォーム外も含む、患者番号関連の可能性があるものに印を付ける）"""
+    snapshot = context.snapshot
+    lines = [f"全入力要素: {len(snapshot.inputs)}個"]
+    for i, inp in enumerate(snapshot.inputs):
+        label = "[患者番号関連] " if is_patient_related_input(inp) else ""
+        lines.append(f"  {i+1}. {label}タイプ={inp.type}, 名前={inp.name}, ID={inp.id}, プレースホルダー={inp.placeholder}")
+    return lines
+
+@probe("buttons")
+def probe_buttons(context):
+    """ボタン（テキストのあるもの）"""
+    snapshot = context.snapshot
+    lines = [f"ボタンの数: {len(snapshot.buttons)}"]
+    for i, button in enumerate(snapshot.buttons):
+        if button.text:
+            lines.append(f"  {i+1}. テキスト='{button.text}', タイプ={button.type}, ID={button.id}, クラス={button.css_class}")
+    return lines
+
+@probe("links")
+def probe_links(context, limit=20):
+    """リンク（先頭limit件）"""
+    snapshot = context.snapshot
+    lines = [f"リンクの数: {len(snapshot.links)}"]
+    for i, link in enumerate(snapshot.links[:limit]):
+        if link.text and link.href:
+            lines.append(f"  {i+1}. テキスト: '{link.text}' -> URL: {link.href}")
+    return lines
+
+@probe("text_search")
+def probe_text_search(context, keywords=("予約", "reserve", "booking", "appointment", "受診", "診察"), limit=3):
+    """文字列を含む要素"""
+    lines = ["=== 文字列を含む要素の検索 ==="]
+    for keyword, (count, matches) in context.find_text(list(keywords), limit=limit).items():
+        if count:
+            lines.append(f"'{keyword}'を含む要素: {count}個")
+            for match in matches:
+                lines.append(f"  - {match.tag}: {match.text}")
+    return lines
+
+@probe("source_keywords")
+def probe_source_keywords(context, keywords=("予約", "reserve", "booking", "appointment", "患者番号", "patient", "number")):
+    """ページソースでの文字列の出現回数"""
+    page_source = context.page_source
+    lines = ["=== ページソースの文字列 ==="]
+    for keyword in keywords:
+        count = page_source.count(keyword)
+        if count:
+            lines.append(f"'{keyword}'の出現回数: {count}")
+    return lines
+
+def _normalize(item):
+    """プローブの指定（"名前" または ("名前", {オプション})）"""
+    if isinstance(item, str):
+        return item, {}
+    name, options = item
+    return name, dict(options or {})
+
+def _run_one(context, name, options):
+    try:
+        return PROBES[name](context, **options)
+    except Exception as e:
+        return [f"{name}の解析エラー: {e}"]
+
+def run_probes(context, probes, emit=print, concurrent=True):
+    """プローブを実行して結果を指定順に出力（{名前: 行のリスト}を返す）"""
+    items = [_normalize(item) for item in probes]
+    unknown = [name for name, _ in items if name not in PROBES]
+    if unknown:
+        raise ValueError(f"不明なプローブです: {', '.join(unknown)}（{', '.join(PROBES)}）")
+
+    # ブラウザへの問い合わせはまとめて1回だけ行い、以降のプローブはキャッシュを使う
+    context.snapshot
+
+    if concurrent and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=len(items), thread_name_prefix='analyzer-probe') as executor:
+            futures = [executor.submit(_run_one, context, name, options) for name, options in items]
+            outputs = [future.result() for future in futures]
+    else:
+        outputs = [_run_one(context, name, options) for name, options in items]
+
+    results = {}
+    for (name, _), lines in zip(items, outputs):
+        emit("")
+        for line in lines:
+            emit(line)
+        results[name] = lines
+    return results
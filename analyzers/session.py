@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析セッション - かよ皮膚科予約管理システム
+取得方式（SeleniumまたはHTMLのみ）を1つ起動し、ページの移動とプローブの実行を行う
+各解析ツールはこのクラスを使う薄い入口になっている
+"""
+
+from analyzers.backends import create_backend
+from analyzers.probes import PageContext, run_probes
+
+class AnalyzerSession:
+    """1つの取得方式でページを移動しながら解析するクラス"""
+
+    def __init__(self, backend='selenium', emit=print, **backend_options):
+        self.backend = create_backend(backend, **backend_options)
+        self.emit = emit
+        self.context = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def start(self):
+        """取得方式を起動（Seleniumの場合はブラウザプールから借りる）"""
+        self.backend.start()
+
+    def close(self):
+        """取得方式を終了（Seleniumの場合はブラウザをプールに返却）"""
+        self.backend.close()
+
+    def open(self, url):
+        """ページを開く"""
+        self.backend.open(url)
+        self.context = PageContext(self.backend)
+        return self.context
+
+    def click_link(self, link):
+        """リンクをクリックして遷移先を開く"""
+        self.backend.click_link(link)
+        self.context = PageContext(self.backend)
+        return self.context
+
+    def back(self):
+        """前のページに戻る"""
+        self.backend.back()
+        self.context = PageContext(self.backend)
+        return self.context
+
+    def analyze(self, probes, concurrent=True):
+        """現在のページでプローブを実行"""
+        if self.context is None:
+            self.context = PageContext(self.backend)
+        return run_probes(self.context, probes, emit=self.emit, concurrent=concurrent)
+
+    def screenshot(self, filename):
+        """スクリーンショットを保存（HTMLのみの取得方式ではFalse）"""
+        saved = self.backend.screenshot(filename)
+        if saved:
+            self.emit(f"スクリーンショットを保存しました: {filename}")
+        return saved
@@ -6,7 +6,7 @@
 かよ皮膚科の予約を簡単に行い、Googleカレンダーに自動登録するWebアプリ
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
+from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory, Response, stream_with_context
 from flask_mail import Mail
 import json
 import logging
@@ -19,6 +19,13 @@ from pathlib import Path
 import sys
 sys.path.append('..')
 from hospital_booking_automation_v3 import HospitalBookingAutomationV3
+from booking_events import get_event_broker
+from booking_logging import configure_logging, booking_log_context
+from booking_metrics import track_step, get_metrics_registry
+from deadline_waiter import get_deadline_scheduler
+from reception_calendar import get_reception_calendar, SEARCH_DAYS
+from request_governor import get_request_governor
+from booking_state import get_booking_checkpoint_store
 
 app = Flask(__name__)
 
@@ -32,16 +39,15 @@ import os
 if not os.path.exists('logs'):
     os.makedirs('logs')
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/app.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+configure_logging('logs/app.log')
 logger = logging.getLogger(__name__)
 
+# 予約イベント配信（SSE）の初期化
+event_broker = get_event_broker()
+
+# 家族の予約で一度に予約できる人数
+MAX_BATCH_PATIENTS = 6
+
 # データベース接続関数
 def get_db_connection():
     """データベース接続を取得（環境変数対応）"""
@@ -66,6 +72,31 @@ def get_db_connection():
         import sqlite3
         return sqlite3.connect('database/bookings.db')
 
+# プッシュ通知送信機能の初期化
+from config.push_config import get_push_manager
+push_manager = get_push_manager(get_db_connection)
+
+# 待ち人数の時系列保存の初期化
+from wait_count_collector import get_wait_count_store, WaitCountCollector
+wait_count_store = get_wait_count_store(get_db_connection)
+
+# ページ構造の変化（受付フォームの入力欄・action）の通知
+from page_archive import get_page_archive
+
+def notify_markup_change(step, changes):
+    """受付フォームの変更を画面とプッシュ通知で知らせる"""
+    event_broker.publish('markup_changed', {'step': step, 'changes': changes})
+    try:
+        push_manager.send_notification(
+            '予約サイトの画面が変更されました',
+            '受付フォームの入力欄または送信先が変わりました。自動予約が失敗する可能性があります。',
+            {'step': step}
+        )
+    except Exception as e:
+        logger.error(f"画面変更の通知エラー: {e}")
+
+get_page_archive().add_alert_handler(notify_markup_change)
+
 # 設定ファイル読み込み
 def load_config():
     """設定ファイルを読み込む"""
@@ -166,6 +197,12 @@ def init_database():
             )
         ''')
         
+        # プッシュ通知購読テーブルの作成（endpointの一意インデックス付き）
+        push_manager.ensure_table(conn)
+        
+        # 待ち人数の時系列テーブルとロールアップテーブルの作成
+        wait_count_store.ensure_tables(conn)
+        
         conn.commit()
         conn.close()
         logger.info("データベースの初期化が完了しました")
@@ -211,6 +248,25 @@ def test_email_page():
         logger.error(f"メール送信機能テストページ表示エラー: {e}")
         return "エラーが発生しました", 500
 
+@app.route('/api/events')
+def stream_events():
+    """予約の進捗と状態変化をServer-Sent Eventsで配信するAPI"""
+    subscriber = event_broker.subscribe()
+    return Response(
+        stream_with_context(event_broker.stream(subscriber)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def make_progress_publisher(**identifiers):
+    """予約処理の進捗をSSEで配信するコールバックを作成"""
+    def publish_progress(step, details):
+        event_broker.publish('booking_progress', {**identifiers, 'step': step, **details})
+    return publish_progress
+
 @app.route('/booking')
 def booking_form():
     """予約フォームページ"""
@@ -241,6 +297,7 @@ def create_booking():
         birth_date = data['birth_date']
         booking_date = data['booking_date']
         booking_time = data.get('booking_time', '09:15')
+        progress_id = data.get('progress_id')
         
         logger.info(f"受信したデータ: patient_number={patient_number}, birth_date={birth_date}, booking_date={booking_date}, booking_time={booking_time}")
         
@@ -274,8 +331,13 @@ def create_booking():
             automation.config['patient_info']['patient_number'] = patient_number
             automation.config['patient_info']['birth_date'] = birth_date
             
+            # 進捗をSSEで配信（クライアントが進捗IDを指定した場合）
+            if progress_id:
+                automation.progress_callback = make_progress_publisher(progress_id=progress_id)
+            
             # 軽量版の予約を実行
-            result = automation.execute_lightweight_booking()
+            with booking_log_context(progress_id or f"direct-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"):
+                result = automation.book()
             
         except ImportError as e:
             logger.error(f"予約プログラムのインポートエラー: {e}")
@@ -315,46 +377,8 @@ def create_booking():
                 'message': '予約が完了しました'
             }
             
-            # データベースに保存
-            booking_id = save_booking_to_db(booking_data)
-            
-            # Googleカレンダーに登録（設定が有効な場合）
-            config = load_config()
-            if config['google_calendar']['enabled']:
-                try:
-                    calendar_result = add_to_google_calendar(booking_data)
-                    if calendar_result[0]:  # 成功
-                        logger.info(f"Googleカレンダーへの登録が完了しました: {booking_id}")
-                    else:
-                        logger.warning(f"Googleカレンダーへの登録に失敗: {calendar_result[1]}")
-                except Exception as e:
-                    logger.error(f"Googleカレンダー登録エラー: {e}")
-            
-            # メール送信（設定が有効な場合）
-            email_message = ""
-            if config.get('email', {}).get('enabled', False):
-                try:
-                    # メール送信先の設定（設定ファイルから取得またはデフォルト）
-                    recipient_email = config.get('email', {}).get('default_recipient', None)
-                    
-                    # 予約完了確認メールを送信
-                    email_success, email_result = email_manager.send_booking_confirmation(
-                        {'id': booking_id, **booking_data}, 
-                        recipient_email
-                    )
-                    
-                    if email_success:
-                        email_message = "確認メールも送信されました"
-                        logger.info(f"予約完了確認メールを送信しました: {recipient_email}")
-                    else:
-                        email_message = f"メール送信に失敗: {email_result}"
-                        logger.warning(f"予約完了確認メール送信失敗: {email_result}")
-                        
-                except Exception as e:
-                    email_message = f"メール送信エラー: {str(e)}"
-                    logger.error(f"予約完了確認メール送信エラー: {e}")
-            else:
-                email_message = "メール送信機能は無効です"
+            # データベースに保存し、カレンダー登録・確認メールを送信
+            booking_id, email_message = record_successful_booking(booking_data)
             
             return jsonify({
                 'success': True,
@@ -387,6 +411,122 @@ def create_booking():
         logger.error(f"予約実行エラー: {e}")
         return jsonify({'success': False, 'message': f'システムエラーが発生しました: {str(e)}'}), 500
 
+def record_successful_booking(booking_data):
+    """成功した予約をデータベースに保存し、Googleカレンダー登録・確認メール送信を行う（予約ID, メール送信結果）"""
+    # データベースに保存
+    booking_id = save_booking_to_db(booking_data)
+    
+    # Googleカレンダーに登録（設定が有効な場合）
+    config = load_config()
+    if config['google_calendar']['enabled']:
+        try:
+            calendar_result = add_to_google_calendar(booking_data)
+            if calendar_result[0]:  # 成功
+                logger.info(f"Googleカレンダーへの登録が完了しました: {booking_id}")
+            else:
+                logger.warning(f"Googleカレンダーへの登録に失敗: {calendar_result[1]}")
+        except Exception as e:
+            logger.error(f"Googleカレンダー登録エラー: {e}")
+    
+    # メール送信（設定が有効な場合）
+    email_message = ""
+    if config.get('email', {}).get('enabled', False):
+        try:
+            # メール送信先の設定（設定ファイルから取得またはデフォルト）
+            recipient_email = config.get('email', {}).get('default_recipient', None)
+            
+            # 予約完了確認メールを送信
+            email_success, email_result = email_manager.send_booking_confirmation(
+                {'id': booking_id, **booking_data}, 
+                recipient_email
+            )
+            
+            if email_success:
+                email_message = "確認メールも送信されました"
+                logger.info(f"予約完了確認メールを送信しました: {recipient_email}")
+            else:
+                email_message = f"メール送信に失敗: {email_result}"
+                logger.warning(f"予約完了確認メール送信失敗: {email_result}")
+                
+        except Exception as e:
+            email_message = f"メール送信エラー: {str(e)}"
+            logger.error(f"予約完了確認メール送信エラー: {e}")
+    else:
+        email_message = "メール送信機能は無効です"
+    
+    return booking_id, email_message
+
+@app.route('/api/batch-booking', methods=['POST'])
+def create_batch_booking():
+    """家族（複数の患者）の予約をまとめて作成するAPI"""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'リクエストの形式が正しくありません'}), 400
+        patients = data.get('patients') or []
+        booking_date = data.get('booking_date')
+        progress_id = data.get('progress_id')
+        
+        # 入力値の検証
+        if not patients or not booking_date:
+            return jsonify({'success': False, 'message': 'patientsとbooking_dateは必須項目です'}), 400
+        if not isinstance(patients, list) or not all(isinstance(patient, dict) for patient in patients):
+            return jsonify({'success': False, 'message': 'patientsは患者情報（patient_number・birth_date）の配列で指定してください'}), 400
+        
+        logger.info(f"家族の予約リクエストを受信: {len(patients)}人, booking_date={booking_date}")
+        
+        if len(patients) > MAX_BATCH_PATIENTS:
+            return jsonify({'success': False, 'message': f'一度に予約できるのは{MAX_BATCH_PATIENTS}人までです'}), 400
+        
+        try:
+            booking_date_obj = datetime.strptime(booking_date, '%Y-%m-%d').date()
+            for patient in patients:
+                datetime.strptime(patient.get('birth_date') or '', '%Y-%m-%d')
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': '日付の形式が正しくありません'}), 400
+        
+        if any(not str(patient.get('patient_number', '')).isdigit() for patient in patients):
+            return jsonify({'success': False, 'message': '患者番号は数字のみ入力してください'}), 400
+        if len({str(patient['patient_number']) for patient in patients}) != len(patients):
+            return jsonify({'success': False, 'message': '同じ患者番号が複数含まれています'}), 400
+        if booking_date_obj < datetime.now().date():
+            return jsonify({'success': False, 'message': '予約日は今日以降の日付を選択してください'}), 400
+        
+        # 1つのセッションで続けて予約
+        automation = HospitalBookingAutomationV3()
+        if progress_id:
+            automation.progress_callback = make_progress_publisher(progress_id=progress_id)
+        
+        with booking_log_context(progress_id or f"batch-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"):
+            results = automation.book_batch(patients)
+        
+        # 患者ごとに結果を保存
+        birth_dates = {str(patient['patient_number']): patient['birth_date'] for patient in patients}
+        for result in results:
+            booking_data = {
+                'patient_number': result['patient_number'],
+                'birth_date': birth_dates[result['patient_number']],
+                'booking_date': booking_date,
+                'status': 'success' if result['success'] else 'failed',
+                'message': '予約が完了しました' if result['success'] else (result['reason'] or '予約に失敗しました')
+            }
+            if result['success']:
+                result['booking_id'], result['email_message'] = record_successful_booking(booking_data)
+            else:
+                result['booking_id'] = save_booking_to_db(booking_data)
+        
+        succeeded = sum(1 for result in results if result['success'])
+        return jsonify({
+            'success': succeeded == len(results),
+            'message': f'{len(results)}人中{succeeded}人の予約が完了しました',
+            'results': results
+        }), 200 if succeeded else 500
+        
+    except Exception as e:
+        logger.error(f"家族の予約実行エラー: {e}")
+        return jsonify({'success': False, 'message': f'システムエラーが発生しました: {str(e)}'}), 500
+
+@track_step('save_booking_to_db', 'db')
 def save_booking_to_db(booking_data):
     """予約データをデータベースに保存"""
     try:
@@ -411,6 +551,8 @@ def save_booking_to_db(booking_data):
         conn.close()
         logger.info(f"予約データをデータベースに保存しました: ID={booking_id}, {booking_data}")
         
+        event_broker.publish('bookings_changed', {'action': 'created', 'id': booking_id, 'status': booking_data['status']})
+        
         return booking_id
         
     except Exception as e:
@@ -512,6 +654,13 @@ def create_advance_booking():
         if execution_date_obj >= target_date_obj:
             return jsonify({'success': False, 'message': '実行日は予約日より前の日付を設定してください'}), 400
         
+        # 実行日が休診日（祝日）でないかチェック
+        reception_calendar = get_reception_calendar()
+        if reception_calendar.is_closed_day(execution_date_obj, 'morning'):
+            holidays = reception_calendar.holidays_between(execution_date_obj, execution_date_obj)
+            reason = f"（{holidays[0][1]}）" if holidays else ''
+            return jsonify({'success': False, 'message': f'実行日は休診日です{reason}。受付のある日を選択してください'}), 400
+        
         # 事前予約をデータベースに保存
         advance_booking_id = save_advance_booking_to_db({
             'patient_number': patient_number,
@@ -668,6 +817,10 @@ def create_scheduled_booking():
         if execution_datetime <= datetime.now():
             return jsonify({'success': False, 'message': '実行時刻は現在時刻より後の時刻を設定してください'}), 400
         
+        # 実行日が休診日（祝日）でないかチェック
+        if get_reception_calendar().is_closed_day(execution_datetime, 'morning'):
+            return jsonify({'success': False, 'message': '実行日は休診日です。受付のある日を選択してください'}), 400
+        
         # スケジュール予約をデータベースに保存
         scheduled_booking_id = save_scheduled_booking_to_db({
             'patient_number': patient_number,
@@ -698,6 +851,7 @@ def create_scheduled_booking():
         logger.error(f"スケジュール予約作成エラー: {e}")
         return jsonify({'success': False, 'message': f'システムエラーが発生しました: {str(e)}'}), 500
 
+@track_step('save_advance_booking_to_db', 'db')
 def save_advance_booking_to_db(advance_booking_data):
     """事前予約データをデータベースに保存"""
     try:
@@ -724,12 +878,15 @@ def save_advance_booking_to_db(advance_booking_data):
         conn.close()
         logger.info(f"事前予約データをデータベースに保存しました: ID={advance_booking_id}")
         
+        event_broker.publish('advance_bookings_changed', {'action': 'created', 'id': advance_booking_id})
+        
         return advance_booking_id
         
     except Exception as e:
         logger.error(f"事前予約データベース保存エラー: {e}")
         return None
 
+@track_step('save_scheduled_booking_to_db', 'db')
 def save_scheduled_booking_to_db(scheduled_booking_data):
     """スケジュール予約データをデータベースに保存"""
     try:
@@ -756,6 +913,8 @@ def save_scheduled_booking_to_db(scheduled_booking_data):
         conn.close()
         logger.info(f"スケジュール予約データをデータベースに保存しました: ID={scheduled_booking_id}")
         
+        event_broker.publish('scheduled_bookings_changed', {'action': 'created', 'id': scheduled_booking_id})
+        
         return scheduled_booking_id
         
     except Exception as e:
@@ -765,11 +924,6 @@ def save_scheduled_booking_to_db(scheduled_booking_data):
 def schedule_advance_booking_task(advance_booking_id, execution_date):
     """事前予約タスクをスケジュールに追加"""
     try:
-        # 既存のスケジュールライブラリを使用
-        import schedule
-        import threading
-        import time
-        
         def execute_advance_booking():
             """事前予約を実行"""
             try:
@@ -798,8 +952,12 @@ def schedule_advance_booking_task(advance_booking_id, execution_date):
                 automation = HospitalBookingAutomationV3()
                 automation.config['patient_info']['patient_number'] = advance_booking_dict['patient_number']
                 automation.config['patient_info']['birth_date'] = advance_booking_dict['birth_date']
+                automation.progress_callback = make_progress_publisher(advance_booking_id=advance_booking_id)
+                # 処理が中断された場合は同じキーで途中の手順から再開する
+                automation.checkpoint_key = f"advance-{advance_booking_id}"
                 
-                result = automation.execute_lightweight_booking()
+                with booking_log_context(f"advance-{advance_booking_id}"):
+                    result = automation.book()
                 
                 # 結果を更新
                 update_advance_booking_status(advance_booking_id, 'completed' if result else 'failed')
@@ -813,20 +971,14 @@ def schedule_advance_booking_task(advance_booking_id, execution_date):
                 logger.error(f"事前予約実行エラー: {e}")
                 update_advance_booking_status(advance_booking_id, 'failed', str(e))
         
-        # 実行日時を設定（指定日の09:00に実行）
-        execution_datetime = datetime.strptime(execution_date, '%Y-%m-%d').replace(hour=9, minute=0)
+        # 実行日時を設定（指定日の午前の受付開始時刻、見つからなければ09:00に実行）
+        execution_day = datetime.strptime(execution_date, '%Y-%m-%d')
+        execution_datetime, _ = get_reception_calendar().next_window(execution_day, 'morning', search_days=1)
+        if execution_datetime is None or execution_datetime.date() != execution_day.date():
+            execution_datetime = execution_day.replace(hour=9, minute=0)
         
-        # スケジュールを設定
-        schedule.every().day.at(execution_datetime.strftime('%H:%M')).do(execute_advance_booking)
-        
-        # バックグラウンドでスケジューラーを実行
-        def run_scheduler():
-            while True:
-                schedule.run_pending()
-                time.sleep(60)  # 1分ごとにチェック
-        
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
+        # 受付開始時刻ちょうどに1回だけ実行（待機は全タスク共通の1スレッド）
+        get_deadline_scheduler().call_at(execution_datetime, execute_advance_booking)
         
         logger.info(f"事前予約タスクを設定しました: ID={advance_booking_id}, 実行日={execution_date}")
         
@@ -836,11 +988,6 @@ def schedule_advance_booking_task(advance_booking_id, execution_date):
 def schedule_booking_task(scheduled_booking_id, execution_datetime):
     """予約タスクをスケジュールに追加"""
     try:
-        # 既存のスケジュールライブラリを使用
-        import schedule
-        import threading
-        import time
-        
         def execute_scheduled_booking():
             """スケジュールされた予約を実行"""
             try:
@@ -869,8 +1016,12 @@ def schedule_booking_task(scheduled_booking_id, execution_datetime):
                 automation = HospitalBookingAutomationV3()
                 automation.config['patient_info']['patient_number'] = scheduled_booking_dict['patient_number']
                 automation.config['patient_info']['birth_date'] = scheduled_booking_dict['birth_date']
+                automation.progress_callback = make_progress_publisher(scheduled_booking_id=scheduled_booking_id)
+                # 処理が中断された場合は同じキーで途中の手順から再開する
+                automation.checkpoint_key = f"scheduled-{scheduled_booking_id}"
                 
-                result = automation.execute_lightweight_booking()
+                with booking_log_context(f"scheduled-{scheduled_booking_id}"):
+                    result = automation.book()
                 
                 # 結果を更新
                 update_scheduled_booking_status(scheduled_booking_id, 'completed' if result else 'failed')
@@ -884,23 +1035,15 @@ def schedule_booking_task(scheduled_booking_id, execution_datetime):
                 logger.error(f"スケジュール予約実行エラー: {e}")
                 update_scheduled_booking_status(scheduled_booking_id, 'failed', str(e))
         
-        # スケジュールを設定
-        schedule.every().day.at(execution_datetime.strftime('%H:%M')).do(execute_scheduled_booking)
-        
-        # バックグラウンドでスケジューラーを実行
-        def run_scheduler():
-            while True:
-                schedule.run_pending()
-                time.sleep(60)  # 1分ごとにチェック
-        
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
+        # 実行時刻ちょうどに1回だけ実行（待機は全タスク共通の1スレッド）
+        get_deadline_scheduler().call_at(execution_datetime, execute_scheduled_booking)
         
         logger.info(f"スケジュール予約タスクを設定しました: ID={scheduled_booking_id}, 実行時刻={execution_datetime}")
         
     except Exception as e:
         logger.error(f"スケジュールタスク設定エラー: {e}")
 
+@track_step('update_advance_booking_status', 'db')
 def update_advance_booking_status(advance_booking_id, status, message=None):
     """事前予約のステータスを更新"""
     try:
@@ -924,9 +1067,12 @@ def update_advance_booking_status(advance_booking_id, status, message=None):
         conn.close()
         logger.info(f"事前予約ステータスを更新しました: ID={advance_booking_id}, status={status}")
         
+        event_broker.publish('advance_bookings_changed', {'action': 'status', 'id': advance_booking_id, 'status': status, 'message': message})
+        
     except Exception as e:
         logger.error(f"事前予約ステータス更新エラー: {e}")
 
+@track_step('update_scheduled_booking_status', 'db')
 def update_scheduled_booking_status(scheduled_booking_id, status, message=None):
     """スケジュール予約のステータスを更新"""
     try:
@@ -950,6 +1096,8 @@ def update_scheduled_booking_status(scheduled_booking_id, status, message=None):
         conn.close()
         logger.info(f"スケジュール予約ステータスを更新しました: ID={scheduled_booking_id}, status={status}")
         
+        event_broker.publish('scheduled_bookings_changed', {'action': 'status', 'id': scheduled_booking_id, 'status': status, 'message': message})
+        
     except Exception as e:
         logger.error(f"スケジュール予約ステータス更新エラー: {e}")
 
@@ -1146,41 +1294,36 @@ def test_email():
             'message': f'エラーが発生しました: {str(e)}'
         }), 500
 
+@app.route('/api/push/vapid-public-key')
+def get_vapid_public_key():
+    """プッシュ通知購読用のVAPID公開鍵を取得するAPI"""
+    public_key = push_manager.get_public_key()
+    if not public_key:
+        return jsonify({
+            'success': False,
+            'message': 'プッシュ通知機能は無効です'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'public_key': public_key
+    })
+
 @app.route('/api/push-subscription', methods=['POST'])
 def save_push_subscription():
     """プッシュ通知の購読情報を保存するAPI"""
     try:
         data = request.get_json()
-        logger.info(f"プッシュ通知購読情報を受信: {data}")
-        
-        # 購読情報をデータベースに保存（簡易版）
-        # 実際の実装では、より詳細な管理が必要
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # プッシュ通知テーブルの作成（存在しない場合）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS push_subscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                endpoint TEXT NOT NULL,
-                p256dh TEXT,
-                auth TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        logger.info(f"プッシュ通知購読情報を受信: {data.get('endpoint', '')}")
         
-        # 購読情報を保存
-        cursor.execute('''
-            INSERT INTO push_subscriptions (endpoint, p256dh, auth)
-            VALUES (?, ?, ?)
-        ''', (
-            data.get('endpoint', ''),
-            data.get('keys', {}).get('p256dh', ''),
-            data.get('keys', {}).get('auth', '')
-        ))
+        # 同じendpointの購読は鍵のみ更新（重複登録しない）
+        success, result = push_manager.save_subscription(data)
         
-        conn.commit()
-        conn.close()
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': result
+            }), 400
         
         logger.info("プッシュ通知購読情報を保存しました")
         
@@ -1204,13 +1347,19 @@ def send_notification():
         title = data.get('title', 'かよ皮膚科予約管理')
         body = data.get('body', '新しい通知があります')
         
-        # プッシュ通知の送信処理
-        # 実際の実装では、web-pushライブラリを使用してプッシュ通知を送信
-        logger.info(f"プッシュ通知送信: {title} - {body}")
+        # すべての購読者へVAPID署名付きで送信（期限切れの購読は削除）
+        success, result = push_manager.send_notification(title, body, data.get('data'))
+        
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': result
+            }), 503
         
         return jsonify({
             'success': True,
-            'message': '通知を送信しました'
+            'message': '通知を送信しました',
+            'result': result
         })
         
     except Exception as e:
@@ -1243,6 +1392,8 @@ def delete_advance_booking(booking_id):
         conn.commit()
         conn.close()
         
+        event_broker.publish('advance_bookings_changed', {'action': 'deleted', 'id': booking_id})
+        
         # Google Calendarのイベントも削除を試行
         calendar_message = ""
         try:
@@ -1318,6 +1469,8 @@ def delete_scheduled_booking(booking_id):
         conn.commit()
         conn.close()
         
+        event_broker.publish('scheduled_bookings_changed', {'action': 'deleted', 'id': booking_id})
+        
         return jsonify({
             'success': True,
             'message': 'スケジュール予約を削除しました'
@@ -1484,6 +1637,8 @@ def delete_booking(booking_id):
         conn.commit()
         conn.close()
         
+        event_broker.publish('bookings_changed', {'action': 'deleted', 'id': booking_id})
+        
         # Google Calendarからも削除（イベントIDがある場合）
         if event_id:
             try:
@@ -1506,6 +1661,254 @@ def delete_booking(booking_id):
             'message': f'エラーが発生しました: {str(e)}'
         }), 500
 
+@app.route('/api/wait-counts')
+def get_wait_counts():
+    """待ち人数の時系列を取得するAPI"""
+    try:
+        resolution = request.args.get('resolution', 'raw')
+        end_str = request.args.get('end')
+        start_str = request.args.get('start')
+        
+        end = datetime.fromisoformat(end_str) if end_str else datetime.now()
+        start = datetime.fromisoformat(start_str) if start_str else end - timedelta(days=1)
+        
+        samples = wait_count_store.query(start, end, resolution)
+        
+        return jsonify({
+            'success': True,
+            'resolution': resolution,
+            'start': start.strftime('%Y-%m-%d %H:%M:%S'),
+            'end': end.strftime('%Y-%m-%d %H:%M:%S'),
+            'latest': wait_count_store.latest(),
+            'samples': samples
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'パラメータが不正です: {str(e)}'
+        }), 400
+        
+    except Exception as e:
+        logger.error(f"待ち人数取得エラー: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'エラーが発生しました: {str(e)}'
+        }), 500
+
+@app.route('/api/reception-windows')
+def get_reception_windows():
+    """受付時間の一覧（祝日・休診日を除く）を取得するAPI"""
+    try:
+        kind = request.args.get('kind', 'web')
+        start_str = request.args.get('start')
+        days = int(request.args.get('days', 14))
+        if days < 1:
+            raise ValueError('daysは1以上を指定してください')
+        
+        now = datetime.now()
+        start = datetime.fromisoformat(start_str) if start_str else now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=days)
+        
+        reception_calendar = get_reception_calendar()
+        starts, ends = reception_calendar.windows(start, end, kind)
+        next_start, next_end = reception_calendar.next_window(now, kind)
+        
+        return jsonify({
+            'success': True,
+            'kind': kind,
+            'open_now': reception_calendar.is_open(now, kind),
+            'next_window': {
+                'start': next_start.strftime('%Y-%m-%d %H:%M'),
+                'end': next_end.strftime('%Y-%m-%d %H:%M')
+            } if next_start else None,
+            'windows': [
+                {'start': str(s).replace('T', ' '), 'end': str(e).replace('T', ' ')}
+                for s, e in zip(starts, ends)
+            ],
+            'holidays': [
+                {'date': day.isoformat(), 'name': name}
+                for day, name in reception_calendar.holidays_between(start, end - timedelta(days=1))
+            ]
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'パラメータが不正です: {str(e)}'
+        }), 400
+        
+    except Exception as e:
+        logger.error(f"受付時間取得エラー: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'エラーが発生しました: {str(e)}'
+        }), 500
+
+@app.route('/metrics')
+def metrics():
+    """手順ごとの所要時間（Prometheus形式）"""
+    return Response(get_metrics_registry().render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics')
+def get_metrics_summary():
+    """手順・実行方式ごとの所要時間の集計を取得するAPI"""
+    return jsonify({
+        'success': True,
+        'steps': get_metrics_registry().summary(),
+        'outbound': get_request_governor().status()
+    })
+
+@app.route('/api/booking/dry-run', methods=['POST'])
+def run_booking_dry_run():
+    """予約を送信せずに受付フォームまで進み、送信データと手順ごとの所要時間を確認するAPI"""
+    try:
+        automation = HospitalBookingAutomationV3()
+        with booking_log_context(f"dry-run-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"):
+            report = automation.dry_run_booking()
+        return jsonify(report), 500 if report['status'] == 'failed' else 200
+
+    except Exception as e:
+        logger.error(f"ドライランエラー: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'エラーが発生しました: {str(e)}'
+        }), 500
+
+def notify_dry_run_failure(report):
+    """ドライランの失敗を画面とプッシュ通知で知らせる"""
+    event_broker.publish('dry_run_failed', report)
+    try:
+        push_manager.send_notification(
+            '予約処理の事前確認に失敗しました',
+            f"受付フォームまでの確認に失敗しました: {report.get('reason') or '送信データに問題があります'}",
+            {'missing_fields': report.get('missing_fields'), 'unexpected_values': report.get('unexpected_values')}
+        )
+    except Exception as e:
+        logger.error(f"ドライランの通知エラー: {e}")
+
+def start_dry_run_probe():
+    """設定が有効な場合、受付日の午前の受付開始からoffset_minutes後に毎日ドライランを実行（失敗時は通知）
+
+    受付開始前は順番受付ページに受付中ボタンがない（準備中）ため、受付時間内に実行する
+    """
+    probe_config = load_config().get('dry_run_probe', {})
+    if not probe_config.get('enabled', False):
+        logger.info("ドライランの定期実行は無効です")
+        return None
+
+    offset = timedelta(minutes=probe_config.get('offset_minutes', 30))
+    calendar = get_reception_calendar()
+
+    def next_run(now):
+        starts, ends = calendar.windows(now, now + timedelta(days=SEARCH_DAYS), 'morning')
+        for start, end in zip(starts, ends):
+            run_at = start.astype(datetime) + offset
+            if now < run_at < end.astype(datetime):
+                return run_at
+        return None
+
+    def schedule(now):
+        run_at = next_run(now)
+        if run_at is None:
+            logger.warning("受付時間が見つからないため、ドライランの定期実行を終了します")
+            return None
+        get_deadline_scheduler().call_at(run_at, probe)
+        return run_at
+
+    def probe():
+        try:
+            with booking_log_context(f"dry-run-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"):
+                report = HospitalBookingAutomationV3().dry_run_booking()
+            if report['status'] == 'ok':
+                logger.info(f"ドライラン成功（{report['total_ms']}ms）")
+            elif report['status'] == 'reception_closed':
+                logger.info(f"ドライラン: 受付時間外のため確認できませんでした（受付状況: {report['reception_status']}）")
+            else:
+                logger.warning(f"ドライラン失敗: {report.get('reason')}")
+                notify_dry_run_failure(report)
+        except Exception as e:
+            logger.error(f"ドライランの定期実行エラー: {e}")
+        finally:
+            schedule(datetime.now())
+
+    run_at = schedule(datetime.now())
+    if run_at is not None:
+        logger.info(f"ドライランを定期実行します（次回: {run_at.strftime('%Y-%m-%d %H:%M')}）")
+    return run_at
+
+def start_wait_count_collector():
+    """設定が有効な場合、待ち人数の定期収集を開始"""
+    collector_config = load_config().get('wait_count_collector', {})
+    if not collector_config.get('enabled', False):
+        logger.info("待ち人数の収集は無効です")
+        return None
+    
+    automation = HospitalBookingAutomationV3()
+    collector = WaitCountCollector(
+        wait_count_store,
+        automation.fetch_waiting_count_lightweight,
+        interval_seconds=collector_config.get('interval_seconds', 120),
+        retention_days=collector_config.get('retention_days', 90)
+    )
+    collector.start()
+    return collector
+
+def warm_up_browser_pool():
+    """設定が有効な場合、Seleniumでの予約に備えてブラウザを事前起動"""
+    automation = HospitalBookingAutomationV3()
+    if not automation.config.get('browser_pool', {}).get('warm_up', False):
+        return None
+    
+    logger.info("ブラウザプールの事前起動を開始します")
+    pool = automation.get_driver_pool()
+    pool.warm_up()
+    return pool
+
+def resume_interrupted_bookings():
+    """前回の起動中に中断された事前予約・スケジュール予約を保存済みの手順から再開
+
+    送信・確定のPOSTの途中で中断したものは二重予約を避けるため再開せず、確認が必要な失敗にする
+    """
+    store = get_booking_checkpoint_store()
+    for key, reason in store.needs_review():
+        try:
+            kind, booking_id = key.rsplit('-', 1)
+            update_status = {'advance': update_advance_booking_status, 'scheduled': update_scheduled_booking_status}[kind]
+            logger.warning(f"送信中に中断された予約処理は再開しません: {key}")
+            update_status(int(booking_id), 'failed', reason)
+            store.delete(key)
+        except Exception as e:
+            logger.error(f"送信中に中断された予約処理の更新エラー（{key}）: {e}")
+    
+    resumed = 0
+    for key in store.pending():
+        try:
+            kind, booking_id = key.rsplit('-', 1)
+            table = {'advance': 'advance_bookings', 'scheduled': 'scheduled_bookings'}[kind]
+            booking_id = int(booking_id)
+            
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT status, {"execution_date" if kind == "advance" else "execution_time"} FROM {table} WHERE id = ?', (booking_id,))
+            row = cursor.fetchone()
+            conn.close()
+            
+            if not row or row[0] != 'pending':
+                store.delete(key)
+                continue
+            
+            logger.info(f"中断された予約処理を再開します: {key}")
+            if kind == 'advance':
+                schedule_advance_booking_task(booking_id, row[1])
+            else:
+                schedule_booking_task(booking_id, datetime.now())
+            resumed += 1
+            
+        except Exception as e:
+            logger.error(f"中断された予約処理の再開エラー（{key}）: {e}")
+    return resumed
+
 if __name__ == '__main__':
     # 必要なフォルダを作成
     os.makedirs('logs', exist_ok=True)
@@ -1515,8 +1918,21 @@ if __name__ == '__main__':
     # データベース初期化
     init_database()
     
+    # 中断された予約処理の再開
+    resume_interrupted_bookings()
+    
+    # 待ち人数の定期収集
+    start_wait_count_collector()
+
+    # 予約処理の事前確認（ドライラン）の定期実行
+    start_dry_run_probe()
+
+    # ブラウザの事前起動
+    warm_up_browser_pool()
+    
     # アプリケーション起動
     logger.info("予約管理アプリを起動します")
     # 本番環境では環境変数からポートを取得
     port = int(os.environ.get('PORT', 5000))
-    app.run(debug=False, host='0.0.0.0', port=port)
+    # SSE接続を保持するためスレッドモードで起動
+    app.run(debug=False, host='0.0.0.0', port=port, threaded=True)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+予約処理のベンチマーク - かよ皮膚科予約管理システム
+スタンドインサーバーに対して軽量版の予約処理を繰り返し実行し、全体と手順ごとの所要時間を表示・保存する
+（待ち人数・スナップショット・計測結果は本番のデータと分けて一時フォルダに保存する）
+
+使用方法:
+  python benchmark_booking.py [実行回数] [遅延(ミリ秒)] [サーバーエラーの割合(0-1)]
+"""
+
+import os
+import sys
+import json
+import time
+import statistics
+from datetime import datetime
+
+from reception_stub_server import start_stub_server
+from hospital_booking_automation_v3 import HospitalBookingAutomationV3
+from booking_metrics import get_metrics_registry
+
+def percentile(values, q):
+    """パーセンタイル（値がない場合はNone）"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def main():
+    """メイン関数"""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+    server = start_stub_server(pages_dir=os.path.dirname(os.path.abspath(__file__)),
+                               latency=latency, error_rate=error_rate)
+
+    automation = HospitalBookingAutomationV3()
+    automation.set_site_base_url(server.site.base_url)
+
+    durations = []
+    succeeded = 0
+    try:
+        for i in range(runs):
+            started = time.perf_counter()
+            result = automation.book()
+            durations.append(time.perf_counter() - started)
+            succeeded += 1 if result else 0
+            print(f"{i + 1}/{runs}: {'成功' if result else '失敗'} {durations[-1] * 1000:.1f}ms")
+    finally:
+        server.shutdown()
+
+    report = {
+        'measured_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'runs': runs,
+        'latency_ms': latency * 1000,
+        'error_rate': error_rate,
+        'succeeded': succeeded,
+        'total_ms': {
+            'p50': round(percentile(durations, 0.5) * 1000, 1),
+            'p95': round(percentile(durations, 0.95) * 1000, 1),
+            'p99': round(percentile(durations, 0.99) * 1000, 1),
+            'mean': round(statistics.mean(durations) * 1000, 1)
+        },
+        'steps': get_metrics_registry().summary(),
+        'server': server.site.stats()
+    }
+
+    print("")
+    print(f"=== 予約処理の所要時間（{runs}回, 遅延{latency * 1000:.0f}ms, 成功{succeeded}回） ===")
+    print(f"全体: p50={report['total_ms']['p50']}ms p95={report['total_ms']['p95']}ms p99={report['total_ms']['p99']}ms")
+    print(f"{'手順':<24}{'方式':<12}{'回数':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for step in report['steps']:
+        print(f"{step['step']:<24}{step['engine']:<12}{step['count']:>6}"
+              f"{(step.get('p50_seconds') or 0) * 1000:>10.1f}{(step.get('p95_seconds') or 0) * 1000:>10.1f}"
+              f"{(step.get('p99_seconds') or 0) * 1000:>10.1f}")
+
+    # 計測結果も検証用のデータと同じ一時フォルダに保存（作業フォルダを汚さない）
+    filename = os.path.join(automation.sandbox_dir, f"benchmark_booking_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n計測結果を保存しました: {filename}")
+
+if __name__ == "__main__":
+    main()
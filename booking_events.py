@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+予約イベント配信 - かよ皮膚科予約管理システム
+予約処理の進捗やスケジュール予約の状態変化をServer-Sent Eventsで配信する
+"""
+
+import json
+import logging
+import queue
+import threading
+import itertools
+
+logger = logging.getLogger(__name__)
+
+class BookingEventBroker:
+    """プロセス内のイベントを購読中のクライアントへ配信するクラス"""
+
+    def __init__(self, max_queue_size=100, heartbeat_interval=15):
+        self.max_queue_size = max_queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.event_ids = itertools.count(1)
+
+    def subscribe(self):
+        """購読用のキューを作成"""
+        subscriber = queue.Queue(maxsize=self.max_queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        logger.info(f"イベント購読を開始しました（購読数: {len(self.subscribers)}）")
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """購読を解除"""
+        with self.lock:
+            self.subscribers.discard(subscriber)
+        logger.info(f"イベント購読を終了しました（購読数: {len(self.subscribers)}）")
+
+    def publish(self, event, data):
+        """すべての購読者にイベントを配信"""
+        message = (next(self.event_ids), event, data)
+
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # 受信が遅いクライアントは古いイベントを捨てて最新を優先
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def stream(self, subscriber):
+        """SSE形式の文字列を順次返すジェネレーター"""
+        try:
+            # 接続直後にクライアントの再接続間隔を指定
+            yield "retry: 3000\n\n"
+
+            while True:
+                try:
+                    event_id, event, data = subscriber.get(timeout=self.heartbeat_interval)
+                except queue.Empty:
+                    # プロキシに切断されないようにコメント行を送信
+                    yield ": keep-alive\n\n"
+                    continue
+
+                payload = json.dumps(data, ensure_ascii=False, default=str)
+                yield f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+# シングルトンインスタンス
+_event_broker = None
+
+def get_event_broker():
+    """BookingEventBrokerのインスタンスを取得"""
+    global _event_broker
+    if _event_broker is None:
+        _event_broker = BookingEventBroker()
+    return _event_broker
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ログ設定 - かよ皮膚科予約管理システム
+ログはキューに入れるだけにして、書式化とファイル書き込みはバックグラウンドのスレッドで行う
+予約IDをJSON形式のログに記録し、1件の予約で出力するログの件数に上限を設ける
+"""
+
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# 予約ごとのJSON形式のログ
+JSON_LOG_FILE = 'logs/booking.jsonl'
+
+# 1件の予約で出力するINFO以下のログの上限（WARNING以上は常に出力）
+MAX_RECORDS_PER_BOOKING = 2000
+
+# ログファイルのローテーション
+MAX_LOG_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# 実行中の予約ID
+_booking_id = contextvars.ContextVar('booking_id', default=None)
+
+class BookingContextFilter(logging.Filter):
+    """ログに予約IDを付与し、予約ごとの件数の上限を超えたものを捨てる"""
+
+    def __init__(self, max_records_per_booking=MAX_RECORDS_PER_BOOKING):
+        super().__init__()
+        self.max_records_per_booking = max_records_per_booking
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        booking_id = _booking_id.get()
+        record.booking_id = booking_id
+        if booking_id is None or record.levelno >= logging.WARNING:
+            return True
+
+        with self.lock:
+            count = self.counts.get(booking_id, 0) + 1
+            self.counts[booking_id] = count
+
+        if count <= self.max_records_per_booking:
+            return True
+
+        if count == self.max_records_per_booking + 1:
+            # 上限に達したことを1回だけ記録
+            record.msg = "ログの件数が上限（%d件）に達したため、この予約のINFO以下のログを省略します"
+            record.args = (self.max_records_per_booking,)
+            record.levelno = logging.WARNING
+            record.levelname = logging.getLevelName(logging.WARNING)
+            return True
+
+        return False
+
+    def forget(self, booking_id):
+        """終了した予約の件数を破棄"""
+        with self.lock:
+            self.counts.pop(booking_id, None)
+
+class DeferredQueueHandler(QueueHandler):
+    """レコードを書式化せずにキューへ渡すハンドラー（同一プロセス内のキュー専用）"""
+
+    def prepare(self, record):
+        # メッセージの組み立ては書き込みスレッドのフォーマッターで行う
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """1行1件のJSON形式で出力するフォーマッター"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%d %H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'booking_id': getattr(record, 'booking_id', None),
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+_log_queue = queue.SimpleQueue()
+_context_filter = BookingContextFilter()
+_handlers = []
+_queue_handler = None
+_listener = None
+_lock = threading.Lock()
+
+def _file_handler(path, formatter):
+    """ローテーションするファイルハンドラーを作成"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    handler.setFormatter(formatter)
+    return handler
+
+def configure_logging(log_file, level=logging.INFO, json_file=JSON_LOG_FILE):
+    """ログの出力先を設定（logging.basicConfigと同様に、設定済みの場合は何もしない）"""
+    global _queue_handler, _listener
+
+    with _lock:
+        if _listener is not None:
+            return
+
+        if _queue_handler is None:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            _handlers.append(stream_handler)
+            _handlers.append(_file_handler(log_file, logging.Formatter(LOG_FORMAT)))
+            if json_file:
+                _handlers.append(_file_handler(json_file, JsonFormatter()))
+
+            _queue_handler = DeferredQueueHandler(_log_queue)
+            _queue_handler.addFilter(_context_filter)
+            root = logging.getLogger()
+            root.setLevel(level)
+            root.addHandler(_queue_handler)
+            atexit.register(stop_logging)
+
+        _listener = QueueListener(_log_queue, *_handlers, respect_handler_level=True)
+        _listener.start()
+
+def stop_logging():
+    """キューに残ったログを書き込んで書き込みスレッドを終了"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+@contextmanager
+def booking_log_context(booking_id):
+    """このブロック内のログに予約IDを付与"""
+    booking_id = str(booking_id)
+    token = _booking_id.set(booking_id)
+    try:
+        yield
+    finally:
+        _booking_id.reset(token)
+        _context_filter.forget(booking_id)
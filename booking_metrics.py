@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+処理時間の計測 - かよ皮膚科予約管理システム
+予約処理の手順・DB書き込み・メール送信・カレンダー連携の所要時間を手順と実行方式ごとのヒストグラムに記録し、
+Prometheus形式のテキストで出力する
+"""
+
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# ヒストグラムのバケット（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, float('inf'))
+
+# パーセンタイルの計算に使う直近の計測値の数
+RESERVOIR_SIZE = 1024
+
+# 出力するパーセンタイル
+QUANTILES = (0.5, 0.95, 0.99)
+
+class StepHistogram:
+    """1つの手順・実行方式の所要時間の分布"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, seconds):
+        """計測値を追加"""
+        self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def quantiles(self):
+        """直近の計測値のパーセンタイル"""
+        values = sorted(self.recent)
+        if not values:
+            return {}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in QUANTILES}
+
+class MetricsRegistry:
+    """手順ごとの所要時間を集計するクラス"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, step, engine, seconds):
+        """所要時間を記録"""
+        with self.lock:
+            histogram = self.histograms.get((step, engine))
+            if histogram is None:
+                histogram = self.histograms[(step, engine)] = StepHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def track(self, step, engine):
+        """ブロックの所要時間を記録（デコレーターとしても使用可能）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(step, engine, time.perf_counter() - started)
+
+    def summary(self):
+        """手順・実行方式ごとの件数・平均・パーセンタイル"""
+        with self.lock:
+            items = sorted(self.histograms.items())
+            return [
+                {
+                    'step': step,
+                    'engine': engine,
+                    'count': histogram.count,
+                    'average_seconds': round(histogram.total / histogram.count, 4) if histogram.count else None,
+                    **{f"p{int(q * 100)}_seconds": round(value, 4) for q, value in histogram.quantiles().items()}
+                }
+                for (step, engine), histogram in items
+            ]
+
+    def render_prometheus(self):
+        """Prometheusのテキスト形式で出力"""
+        lines = [
+            '# HELP booking_step_duration_seconds 予約処理の手順ごとの所要時間',
+            '# TYPE booking_step_duration_seconds histogram'
+        ]
+        quantile_lines = [
+            '# HELP booking_step_duration_quantile_seconds 直近の所要時間のパーセンタイル',
+            '# TYPE booking_step_duration_quantile_seconds gauge'
+        ]
+
+        with self.lock:
+            for (step, engine), histogram in sorted(self.histograms.items()):
+                labels = f'step="{step}",engine="{engine}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'booking_step_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f'booking_step_duration_seconds_sum{{{labels}}} {histogram.total:.6f}')
+                lines.append(f'booking_step_duration_seconds_count{{{labels}}} {histogram.count}')
+
+                for q, value in histogram.quantiles().items():
+                    quantile_lines.append(f'booking_step_duration_quantile_seconds{{{labels},quantile="{q}"}} {value:.6f}')
+
+        return '\n'.join(lines + quantile_lines) + '\n'
+
+# シングルトンインスタンス
+_metrics_registry = None
+_metrics_registry_lock = threading.Lock()
+
+def get_metrics_registry():
+    """MetricsRegistryのインスタンスを取得"""
+    global _metrics_registry
+    with _metrics_registry_lock:
+        if _metrics_registry is None:
+            _metrics_registry = MetricsRegistry()
+        return _metrics_registry
+
+def track_step(step, engine):
+    """所要時間を記録するコンテキストマネージャー／デコレーター"""
+    return get_metrics_registry().track(step, engine)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+軽量版の予約処理の状態 - かよ皮膚科予約管理システム
+予約処理を手順（TOP → RECEPTION → FORM → SUBMIT → CONFIRM → DONE）ごとに進め、
+各手順の結果（クッキー・URL・隠しフィールド）をJSONに保存できる形で持つ
+保存した状態からは失敗した手順・中断した手順から再開できる
+（送信・確定のPOSTの途中で中断した場合は二重予約を避けるため再開せず、確認が必要な失敗として終了する）
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 手順
+TOP = 'top'
+RECEPTION = 'reception'
+FORM = 'form'
+SUBMIT = 'submit'
+CONFIRM = 'confirm'
+DONE = 'done'
+FAILED = 'failed'
+
+STEPS = [TOP, RECEPTION, FORM, SUBMIT, CONFIRM, DONE]
+TERMINAL_STEPS = {DONE, FAILED}
+
+# 予約サイトに受付を記録させるPOSTの手順（送信中に中断した場合は再送しない）
+POST_STEPS = {SUBMIT, CONFIRM}
+
+# 保存先
+DEFAULT_CHECKPOINT_DIR = 'booking_checkpoints'
+
+# これより古い保存済みの状態は再開しない（予約サイトのセッションが切れているため）
+DEFAULT_MAX_AGE_SECONDS = 1800
+
+def cookies_to_list(cookie_jar):
+    """クッキーをJSONに保存できる形にする"""
+    return [
+        {
+            'name': cookie.name,
+            'value': cookie.value,
+            'domain': cookie.domain,
+            'path': cookie.path,
+            'secure': cookie.secure,
+            'expires': cookie.expires
+        }
+        for cookie in cookie_jar
+    ]
+
+def session_from_cookies(cookies):
+    """保存したクッキーを持つセッションを作成"""
+    session = requests.Session()
+    for cookie in cookies or []:
+        session.cookies.set(
+            cookie['name'], cookie['value'],
+            domain=cookie.get('domain') or '', path=cookie.get('path') or '/',
+            secure=cookie.get('secure', False), expires=cookie.get('expires')
+        )
+    return session
+
+class BookingState:
+    """1回の軽量版の予約処理の状態（次に実行する手順と、これまでの手順の結果）"""
+
+    def __init__(self, step=TOP, urls=None, hidden_fields=None, form_data=None, cookies=None,
+                 wait_count=None, failures=None, result=None, reason=None, needs_review=False,
+                 started_at=None, updated_at=None, patient=None, reception_status=None, in_flight=None):
+        self.step = step
+        # 予約する患者（patient_number・birth_date、Noneの場合は設定ファイルの患者）
+        self.patient = patient
+        self.urls = urls or {}
+        self.hidden_fields = hidden_fields or {}
+        self.form_data = form_data or {}
+        self.cookies = cookies or []
+        self.wait_count = wait_count
+        # 受付中ボタンがなかったときの受付状況の表示（準備中・休診など）
+        self.reception_status = reception_status
+        # 送信中のPOSTの手順（送信前に記録し、次の手順に進むと消す）
+        self.in_flight = in_flight
+        self.failures = failures or {}
+        self.result = result
+        self.reason = reason
+        self.needs_review = needs_review
+        self.started_at = started_at or time.time()
+        self.updated_at = updated_at or self.started_at
+
+    @property
+    def finished(self):
+        return self.step in TERMINAL_STEPS
+
+    def advance(self, step, session=None):
+        """次の手順に進む（セッションのクッキーを記録）"""
+        self.step = step
+        self.in_flight = None
+        self.updated_at = time.time()
+        if session is not None:
+            self.cookies = cookies_to_list(session.cookies)
+
+    def finish(self, result, reason=None, needs_review=False):
+        """終了（result: 'confirmed' または 'failed'）"""
+        self.advance(DONE if result == 'confirmed' else FAILED)
+        self.result = result
+        self.reason = reason
+        self.needs_review = needs_review
+
+    def begin_post(self):
+        """現在の手順のPOSTを送信する（保存してから送信すると、送信中に中断したことが分かる）"""
+        self.in_flight = self.step
+        self.updated_at = time.time()
+
+    @property
+    def interrupted_post(self):
+        """送信・確定のPOSTの途中で中断したか"""
+        return not self.finished and self.step in POST_STEPS and self.in_flight == self.step
+
+    def record_failure(self):
+        """現在の手順の失敗回数を記録して返す"""
+        self.failures[self.step] = self.failures.get(self.step, 0) + 1
+        self.updated_at = time.time()
+        return self.failures[self.step]
+
+    def restart(self):
+        """トップページからやり直す（クッキー・手順の結果を破棄）"""
+        self.step = TOP
+        self.in_flight = None
+        self.urls = {}
+        self.hidden_fields = {}
+        self.form_data = {}
+        self.cookies = []
+        self.failures = {}
+        self.updated_at = time.time()
+
+    def session(self):
+        """保存したクッキーを持つセッション"""
+        return session_from_cookies(self.cookies)
+
+    def to_dict(self):
+        return {
+            'step': self.step,
+            'urls': self.urls,
+            'hidden_fields': self.hidden_fields,
+            'form_data': self.form_data,
+            'cookies': self.cookies,
+            'wait_count': self.wait_count,
+            'reception_status': self.reception_status,
+            'failures': self.failures,
+            'result': self.result,
+            'reason': self.reason,
+            'needs_review': self.needs_review,
+            'started_at': self.started_at,
+            'updated_at': self.updated_at,
+            'patient': self.patient,
+            'in_flight': self.in_flight
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('step') not in STEPS + [FAILED]:
+            raise ValueError(f"不明な手順です: {data.get('step')}")
+        return cls(**data)
+
+class BookingCheckpointStore:
+    """予約処理の状態をキー（例: advance-12）ごとにJSONファイルに保存するクラス"""
+
+    def __init__(self, directory=DEFAULT_CHECKPOINT_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        safe_key = ''.join(c if c.isalnum() or c in '-_' else '_' for c in key)
+        return os.path.join(self.directory, f"{safe_key}.json")
+
+    def save(self, key, state):
+        """状態を保存（書き込み途中で中断しても前回の状態が残るように置き換える）"""
+        path = self._path(key)
+        temp_path = f"{path}.tmp"
+        with self.lock:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(state.to_dict(), key=key), f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+
+    def load(self, key, max_age=DEFAULT_MAX_AGE_SECONDS):
+        """保存した状態（ない場合・古い場合・読めない場合はNone）"""
+        path = self._path(key)
+        try:
+            with self.lock, open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            data.pop('key', None)
+            state = BookingState.from_dict(data)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"予約処理の状態を読み込めません（{key}）: {e}")
+            return None
+
+        if max_age is not None and time.time() - state.updated_at > max_age:
+            logger.info(f"予約処理の状態が古いため再開しません（{key}、最終更新: {datetime.fromtimestamp(state.updated_at)}）")
+            return None
+
+        if state.interrupted_post:
+            # 送信が予約サイトで処理された可能性があるため、再送せずに確認が必要な失敗として終了
+            step = state.step
+            logger.warning(f"送信中（手順: {step}）に中断された予約処理です。再送せずに終了します（{key}）")
+            state.finish('failed', reason=f"送信中（手順: {step}）に中断されました。予約が受け付けられている可能性があるため、予約サイトで受付状況を確認してください",
+                         needs_review=True)
+            self.save(key, state)
+        return state
+
+    def delete(self, key):
+        with self.lock:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _states(self, max_age):
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith('.json'):
+                continue
+            key = filename[:-len('.json')]
+            state = self.load(key, max_age)
+            if state is not None:
+                yield key, state
+
+    def pending(self, max_age=DEFAULT_MAX_AGE_SECONDS):
+        """再開できる状態のキー（終了していないもの）"""
+        return [key for key, state in self._states(max_age) if not state.finished]
+
+    def needs_review(self, max_age=DEFAULT_MAX_AGE_SECONDS):
+        """送信中に中断したため確認が必要な状態のキーと理由（[(キー, 理由)]）"""
+        return [
+            (key, state.reason) for key, state in self._states(max_age)
+            if state.result == 'failed' and state.needs_review
+        ]
+
+# シングルトンインスタンス
+_checkpoint_store = None
+_checkpoint_store_lock = threading.Lock()
+
+def get_booking_checkpoint_store(directory=DEFAULT_CHECKPOINT_DIR):
+    """BookingCheckpointStoreのインスタンスを取得"""
+    global _checkpoint_store
+    with _checkpoint_store_lock:
+        if _checkpoint_store is None:
+            _checkpoint_store = BookingCheckpointStore(directory)
+        return _checkpoint_store
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ブラウザプール - かよ皮膚科予約管理システム
+起動済みのChromeを使い回し、Seleniumでの予約・解析ごとの起動待ちをなくす
+"""
+
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+logger = logging.getLogger(__name__)
+
+# 解決済みのChromeDriverのパス（次回以降はネットワークに問い合わせない）
+CHROMEDRIVER_CACHE_FILE = 'config/chromedriver_cache.json'
+
+# 返却時に保存データを消去するオリジン
+SITE_ORIGINS = [
+    "https://www5.tandt.co.jp",
+    "https://www4.tandt.co.jp"
+]
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# 高速プロファイルで読み込まないリソース（画像・フォント・スタイルシート・解析タグ）
+FAST_PROFILE_BLOCKED_URLS = [
+    "*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*",
+    "*.woff*", "*.woff2*", "*.ttf*", "*.otf*",
+    "*.css*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*"
+]
+
+_chromedriver_lock = threading.Lock()
+
+def resolve_chromedriver_path(refresh=False):
+    """ChromeDriverのパスを取得（キャッシュがあればオフラインで解決）"""
+    with _chromedriver_lock:
+        if not refresh:
+            try:
+                with open(CHROMEDRIVER_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    path = json.load(f).get('path')
+                if path and os.path.isfile(path) and os.access(path, os.X_OK):
+                    return path
+            except (FileNotFoundError, ValueError):
+                pass
+
+        try:
+            from webdriver_manager.chrome import ChromeDriverManager
+            path = ChromeDriverManager().install()
+        except Exception as e:
+            logger.warning(f"ChromeDriverのダウンロードに失敗しました: {e}")
+            return None
+
+        try:
+            os.makedirs(os.path.dirname(CHROMEDRIVER_CACHE_FILE), exist_ok=True)
+            with open(CHROMEDRIVER_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'path': path,
+                    'resolved_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.warning(f"ChromeDriverのパスを保存できませんでした: {e}")
+
+        logger.info(f"ChromeDriverのパスを解決しました: {path}")
+        return path
+
+def build_chrome_options(headless=True, user_agent=None, fast=False):
+    """プール用のChromeオプションを作成"""
+    chrome_options = Options()
+
+    if fast:
+        # 画像はコンテンツ設定でも無効化（CDPのブロックより前の段階で止まる）
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2
+        })
+
+    if headless:
+        chrome_options.add_argument("--headless=new")
+
+    chrome_options.add_argument(f"--user-agent={user_agent or DEFAULT_USER_AGENT}")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    return chrome_options
+
+class BrowserPool:
+    """起動済みのChromeを貸し出すプール"""
+
+    def __init__(self, size=2, headless=True, user_agent=None, implicit_wait=10, fast=False, blocked_urls=None):
+        self.size = max(1, int(size))
+        self.headless = headless
+        self.user_agent = user_agent
+        self.fast = fast
+        self.blocked_urls = list(blocked_urls or FAST_PROFILE_BLOCKED_URLS)
+        self.implicit_wait = implicit_wait
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.closed = False
+
+    def _create_driver(self):
+        """Chromeを起動"""
+        chrome_options = build_chrome_options(self.headless, self.user_agent, self.fast)
+        driver_path = resolve_chromedriver_path()
+
+        try:
+            if driver_path:
+                driver = webdriver.Chrome(service=Service(driver_path), options=chrome_options)
+            else:
+                # Selenium Manager / システムのChromeDriverで起動
+                driver = webdriver.Chrome(options=chrome_options)
+        except Exception as e:
+            if not driver_path:
+                raise
+            # Chromeの更新でキャッシュしたドライバーが合わなくなった場合は再解決
+            logger.warning(f"キャッシュしたChromeDriverで起動できませんでした: {e}")
+            driver_path = resolve_chromedriver_path(refresh=True)
+            service = Service(driver_path) if driver_path else None
+            driver = webdriver.Chrome(service=service, options=chrome_options) if service else webdriver.Chrome(options=chrome_options)
+
+        # 新しいドキュメントごとにwebdriverフラグを隠す
+        try:
+            driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+                'source': "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+            })
+        except Exception:
+            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+
+        if self.fast:
+            self.apply_resource_blocking(driver)
+
+        driver.implicitly_wait(self.implicit_wait)
+        return driver
+
+    def apply_resource_blocking(self, driver):
+        """CDPで不要なリソースの読み込みを遮断"""
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+        except Exception as e:
+            logger.warning(f"リソースの遮断を設定できませんでした: {e}")
+
+    def _spawn(self):
+        """起動数の上限内で新しいChromeを起動"""
+        with self.lock:
+            if self.created >= self.size:
+                return None
+            self.created += 1
+
+        try:
+            driver = self._create_driver()
+            logger.info(f"ブラウザを起動しました（{self.created}/{self.size}）")
+            return driver
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def _discard(self, driver):
+        """Chromeを終了して起動数から外す"""
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self.lock:
+            self.created -= 1
+
+    def is_healthy(self, driver):
+        """Chromeが応答するかチェック"""
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def warm_up(self):
+        """プールの上限までChromeを事前に起動"""
+        def start_one():
+            try:
+                driver = self._spawn()
+                if driver is not None:
+                    self.idle.put(driver)
+            except Exception as e:
+                logger.error(f"ブラウザの事前起動エラー: {e}")
+
+        threads = [threading.Thread(target=start_one, daemon=True) for _ in range(self.size - self.created)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def acquire(self, timeout=60):
+        """Chromeを借りる（空きがなければ起動、上限なら返却を待つ）"""
+        if self.closed:
+            raise RuntimeError("ブラウザプールは終了しています")
+
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                driver = self._spawn()
+                if driver is None:
+                    try:
+                        driver = self.idle.get(timeout=timeout)
+                    except queue.Empty:
+                        raise TimeoutError("空いているブラウザがありません")
+
+            if self.is_healthy(driver):
+                return driver
+
+            logger.warning("応答しないブラウザを破棄しました")
+            self._discard(driver)
+
+    def _reset(self, driver):
+        """次の利用者に状態が残らないようにクッキー・ストレージ・タブを消去"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+
+        driver.delete_all_cookies()
+        for origin in SITE_ORIGINS:
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        driver.get("about:blank")
+        driver.implicitly_wait(self.implicit_wait)
+
+    def release(self, driver, discard=False):
+        """Chromeを返却（状態を消去できない場合は破棄）"""
+        if driver is None:
+            return
+
+        if discard or self.closed:
+            self._discard(driver)
+            return
+
+        try:
+            self._reset(driver)
+        except Exception as e:
+            logger.warning(f"ブラウザの状態を消去できないため破棄します: {e}")
+            self._discard(driver)
+            return
+
+        self.idle.put(driver)
+
+    def shutdown(self):
+        """すべてのChromeを終了"""
+        self.closed = True
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+def measure_page_load(driver):
+    """Navigation Timing APIで現在のページの読み込み時間を取得（ミリ秒）"""
+    return driver.execute_script("""
+        var nav = performance.getEntriesByType('navigation')[0];
+        var resources = performance.getEntriesByType('resource');
+        var transferred = 0;
+        for (var i = 0; i < resources.length; i++) {
+            transferred += resources[i].transferSize || 0;
+        }
+        if (!nav) {
+            return null;
+        }
+        return {
+            'url': location.href,
+            'dom_content_loaded_ms': Math.round(nav.domContentLoadedEventEnd),
+            'load_ms': Math.round(nav.loadEventEnd),
+            'resource_count': resources.length,
+            'transfer_bytes': transferred + (nav.transferSize || 0)
+        };
+    """)
+
+# プロファイル（ヘッドレス、ユーザーエージェント、高速化）ごとのインスタンス
+_browser_pools = {}
+_browser_pools_lock = threading.Lock()
+
+def get_browser_pool(headless=True, user_agent=None, size=2, fast=False, blocked_urls=None):
+    """BrowserPoolのインスタンスを取得"""
+    key = (bool(headless), user_agent, bool(fast), tuple(blocked_urls or ()))
+    with _browser_pools_lock:
+        if key not in _browser_pools:
+            _browser_pools[key] = BrowserPool(
+                size=size, headless=headless, user_agent=user_agent,
+                fast=fast, blocked_urls=blocked_urls
+            )
+        return _browser_pools[key]
+
+def shutdown_browser_pools():
+    """すべてのプールのChromeを終了"""
+    with _browser_pools_lock:
+        pools = list(_browser_pools.values())
+    for pool in pools:
+        pool.shutdown()
+
+atexit.register(shutdown_browser_pools)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ブラウザプロファイル比較 - かよ皮膚科予約管理システム
+標準プロファイルと高速プロファイル（画像・フォント・CSS等を遮断）で
+トップページと順番受付ページの読み込み時間を計測し、結果を表示・保存する
+高速プロファイルは既定では無効（config_v3.jsonのchrome_options.fast_profile）
+この計測で受付リンクの検出・クリックが動作することを確認してから有効にする
+
+使用方法:
+  python browser_profile_report.py [計測回数]
+"""
+
+import sys
+import json
+import time
+import statistics
+from datetime import datetime
+
+from selenium.webdriver.common.by import By
+
+from browser_pool import BrowserPool, measure_page_load
+
+TOP_URL = "https://www5.tandt.co.jp/cti/hs713/index_p.html"
+RECEPTION_LINK_XPATH = "//a[contains(@href, 'rsvmodG01')]"
+
+def measure_profile(fast, runs):
+    """指定プロファイルで各ページを計測"""
+    pool = BrowserPool(size=1, headless=True, fast=fast)
+    results = {'top': [], 'reception': []}
+
+    try:
+        for _ in range(runs):
+            driver = pool.acquire()
+            try:
+                started = time.perf_counter()
+                driver.get(TOP_URL)
+                timing = measure_page_load(driver) or {}
+                timing['wall_ms'] = round((time.perf_counter() - started) * 1000)
+                results['top'].append(timing)
+
+                link = driver.find_element(By.XPATH, RECEPTION_LINK_XPATH)
+                started = time.perf_counter()
+                driver.get(link.get_attribute('href'))
+                timing = measure_page_load(driver) or {}
+                timing['wall_ms'] = round((time.perf_counter() - started) * 1000)
+                results['reception'].append(timing)
+            finally:
+                pool.release(driver)
+    finally:
+        pool.shutdown()
+
+    return results
+
+def summarize(samples):
+    """計測値の中央値"""
+    summary = {}
+    for key in ('wall_ms', 'dom_content_loaded_ms', 'load_ms', 'resource_count', 'transfer_bytes'):
+        values = [sample[key] for sample in samples if sample.get(key) is not None]
+        summary[key] = statistics.median(values) if values else None
+    return summary
+
+def main():
+    """メイン関数"""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    report = {'measured_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'runs': runs, 'profiles': {}}
+    for name, fast in (('standard', False), ('fast', True)):
+        print(f"{name}プロファイルを計測中...")
+        results = measure_profile(fast, runs)
+        report['profiles'][name] = {page: summarize(samples) for page, samples in results.items()}
+
+    print("")
+    print(f"=== ページ読み込み時間（中央値, {runs}回） ===")
+    print(f"{'ページ':<12}{'プロファイル':<12}{'実測':>8}{'DCL':>8}{'load':>8}{'リソース':>8}{'転送量':>10}")
+    for page in ('top', 'reception'):
+        for name in ('standard', 'fast'):
+            summary = report['profiles'][name][page]
+            print(f"{page:<12}{name:<12}{summary['wall_ms']!s:>8}{summary['dom_content_loaded_ms']!s:>8}"
+                  f"{summary['load_ms']!s:>8}{summary['resource_count']!s:>8}{summary['transfer_bytes']!s:>10}")
+
+    filename = f"browser_profile_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n計測結果を保存しました: {filename}")
+
+if __name__ == "__main__":
+    main()
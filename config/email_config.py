@@ -9,6 +9,7 @@ import logging
 import json
 from flask_mail import Mail, Message
 from datetime import datetime
+from booking_metrics import track_step
 
 logger = logging.getLogger(__name__)
 
@@ -83,7 +84,8 @@ class EmailManager:
             )
             
             # メールを送信
-            self.mail.send(msg)
+            with track_step('booking_confirmation', 'smtp'):
+                self.mail.send(msg)
             
             logger.info(f"予約完了確認メールを送信しました: {recipient_email}")
             return True, "メール送信が完了しました"
@@ -117,7 +119,8 @@ class EmailManager:
             )
             
             # メールを送信
-            self.mail.send(msg)
+            with track_step('advance_booking_confirmation', 'smtp'):
+                self.mail.send(msg)
             
             logger.info(f"事前予約作成確認メールを送信しました: {recipient_email}")
             return True, "メール送信が完了しました"
@@ -14,6 +14,7 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from booking_metrics import track_step
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +69,7 @@ class GoogleCalendarManager:
             logger.error(f"Google Calendar API認証エラー: {e}")
             return False
     
+    @track_step('create_booking_event', 'calendar')
     def create_booking_event(self, booking_data):
         """予約イベントをGoogleカレンダーに作成"""
         try:
@@ -142,6 +144,7 @@ class GoogleCalendarManager:
             logger.error(f"イベント作成エラー: {e}")
             return False, f"イベント作成エラー: {e}"
     
+    @track_step('create_advance_booking_event', 'calendar')
     def create_advance_booking_event(self, advance_booking_data):
         """事前予約イベントをGoogleカレンダーに作成"""
         try:
@@ -218,6 +221,7 @@ class GoogleCalendarManager:
             logger.error(f"事前予約イベント作成エラー: {e}")
             return False, f"事前予約イベント作成エラー: {e}"
     
+    @track_step('update_booking_event', 'calendar')
     def update_booking_event(self, event_id, booking_data):
         """既存の予約イベントを更新"""
         try:
@@ -262,6 +266,7 @@ class GoogleCalendarManager:
             logger.error(f"イベント更新エラー: {e}")
             return False, f"イベント更新エラー: {e}"
     
+    @track_step('delete_booking_event', 'calendar')
     def delete_booking_event(self, event_id):
         """予約イベントを削除"""
         try:
@@ -282,6 +287,7 @@ class GoogleCalendarManager:
             logger.error(f"イベント削除エラー: {e}")
             return False, f"イベント削除エラー: {e}"
     
+    @track_step('get_calendar_events', 'calendar')
     def get_calendar_events(self, start_date=None, end_date=None):
         """指定期間のカレンダーイベントを取得"""
         try:
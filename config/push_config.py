@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+プッシュ通知送信設定 - かよ皮膚科予約管理システム
+VAPID署名付きWeb Pushの送信と購読情報の管理
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 購読が無効になったことを示すHTTPステータス（Push Serviceの仕様）
+EXPIRED_STATUS_CODES = (404, 410)
+
+class PushNotificationManager:
+    """Web Pushの送信を管理するクラス"""
+
+    def __init__(self, db_connection_factory=None):
+        self.db_connection_factory = db_connection_factory
+        self.config = {}
+        self.executor = None
+        self.table_ready = False
+        self.load_settings()
+
+    def load_settings(self):
+        """設定ファイルからプッシュ通知の設定を読み込む"""
+        try:
+            with open('config/config.json', 'r', encoding='utf-8') as f:
+                self.config = json.load(f).get('push', {})
+        except Exception as e:
+            logger.error(f"プッシュ通知設定の読み込みエラー: {e}")
+            self.config = {}
+
+        # 同時送信数を制限したスレッドプール
+        max_workers = int(self.config.get('max_workers', 8))
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='webpush')
+
+    def is_enabled(self):
+        """プッシュ通知機能が有効かチェック"""
+        return (
+            self.config.get('enabled', False)
+            and bool(self.config.get('vapid_private_key'))
+            and bool(self.config.get('vapid_public_key'))
+        )
+
+    def get_public_key(self):
+        """クライアントの購読に使用するVAPID公開鍵を取得（無効な場合は空）"""
+        if not self.is_enabled():
+            return ''
+        return self.config.get('vapid_public_key', '')
+
+    def ensure_table(self, conn):
+        """購読テーブルとendpointの一意インデックスを作成"""
+        if self.table_ready:
+            return
+
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS push_subscriptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT NOT NULL,
+                p256dh TEXT,
+                auth TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # 一意インデックス作成前に、既存の重複行を最新の1件だけ残して削除
+        cursor.execute('''
+            DELETE FROM push_subscriptions
+            WHERE id NOT IN (
+                SELECT MAX(id) FROM push_subscriptions GROUP BY endpoint
+            )
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_push_subscriptions_endpoint
+            ON push_subscriptions (endpoint)
+        ''')
+        conn.commit()
+        self.table_ready = True
+
+    def save_subscription(self, subscription):
+        """購読情報を保存（同じendpointは鍵を更新）"""
+        endpoint = subscription.get('endpoint', '')
+        if not endpoint:
+            return False, "endpointが指定されていません"
+
+        keys = subscription.get('keys', {}) or {}
+
+        try:
+            conn = self.db_connection_factory()
+            self.ensure_table(conn)
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO push_subscriptions (endpoint, p256dh, auth)
+                VALUES (?, ?, ?)
+                ON CONFLICT(endpoint) DO UPDATE SET
+                    p256dh = excluded.p256dh,
+                    auth = excluded.auth
+            ''', (endpoint, keys.get('p256dh', ''), keys.get('auth', '')))
+            conn.commit()
+            conn.close()
+            return True, endpoint
+
+        except Exception as e:
+            logger.error(f"プッシュ通知購読情報の保存エラー: {e}")
+            return False, f"購読情報の保存エラー: {e}"
+
+    def get_subscriptions(self):
+        """保存されているすべての購読情報を取得"""
+        conn = self.db_connection_factory()
+        self.ensure_table(conn)
+        cursor = conn.cursor()
+        cursor.execute('SELECT endpoint, p256dh, auth FROM push_subscriptions')
+        rows = cursor.fetchall()
+        conn.close()
+
+        return [
+            {'endpoint': endpoint, 'keys': {'p256dh': p256dh, 'auth': auth}}
+            for endpoint, p256dh, auth in rows
+        ]
+
+    def delete_subscriptions(self, endpoints):
+        """期限切れの購読情報を削除"""
+        if not endpoints:
+            return
+
+        conn = self.db_connection_factory()
+        cursor = conn.cursor()
+        cursor.executemany(
+            'DELETE FROM push_subscriptions WHERE endpoint = ?',
+            [(endpoint,) for endpoint in endpoints]
+        )
+        conn.commit()
+        conn.close()
+        logger.info(f"期限切れのプッシュ通知購読を削除しました: {len(endpoints)}件")
+
+    def send_notification(self, title, body, data=None):
+        """すべての購読者にプッシュ通知を送信"""
+        if not self.is_enabled():
+            logger.warning("プッシュ通知機能が無効です")
+            return False, "プッシュ通知機能が無効です"
+
+        try:
+            subscriptions = self.get_subscriptions()
+        except Exception as e:
+            logger.error(f"プッシュ通知購読情報の取得エラー: {e}")
+            return False, f"購読情報の取得エラー: {e}"
+
+        payload = json.dumps({'title': title, 'body': body, 'data': data or {}}, ensure_ascii=False)
+
+        # 有界プールで全購読者へ並列送信
+        futures = [self.executor.submit(self._send_one, subscription, payload) for subscription in subscriptions]
+
+        sent = 0
+        failed = 0
+        expired = []
+        for subscription, future in zip(subscriptions, futures):
+            status = future.result()
+            if status == 'sent':
+                sent += 1
+            elif status == 'expired':
+                expired.append(subscription['endpoint'])
+            else:
+                failed += 1
+
+        try:
+            self.delete_subscriptions(expired)
+        except Exception as e:
+            logger.error(f"期限切れ購読の削除エラー: {e}")
+
+        result = {
+            'total': len(subscriptions),
+            'sent': sent,
+            'failed': failed,
+            'pruned': len(expired)
+        }
+        logger.info(f"プッシュ通知を送信しました: {title} - {result}")
+        return True, result
+
+    def _send_one(self, subscription, payload):
+        """1件の購読者にVAPID署名付きで送信"""
+        from pywebpush import webpush, WebPushException
+
+        try:
+            webpush(
+                subscription_info=subscription,
+                data=payload,
+                vapid_private_key=self.config['vapid_private_key'],
+                vapid_claims={'sub': self.config.get('vapid_subject', 'mailto:admin@example.com')},
+                ttl=int(self.config.get('ttl', 86400)),
+                timeout=int(self.config.get('timeout', 10))
+            )
+            return 'sent'
+
+        except WebPushException as e:
+            status_code = e.response.status_code if e.response is not None else None
+            if status_code in EXPIRED_STATUS_CODES:
+                logger.info(f"期限切れの購読を検出しました（{status_code}）: {subscription['endpoint']}")
+                return 'expired'
+            logger.warning(f"プッシュ通知送信失敗（{status_code}）: {e}")
+            return 'failed'
+
+        except Exception as e:
+            logger.warning(f"プッシュ通知送信エラー: {e}")
+            return 'failed'
+
+# シングルトンインスタンス
+_push_manager = None
+
+def get_push_manager(db_connection_factory=None):
+    """PushNotificationManagerのインスタンスを取得"""
+    global _push_manager
+    if _push_manager is None:
+        _push_manager = PushNotificationManager(db_connection_factory)
+    elif db_connection_factory is not None:
+        _push_manager.db_connection_factory = db_connection_factory
+    return _push_manager
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+期限までの待機 - かよ皮膚科予約管理システム
+1分ごとにsleepして確認する代わりに、次の実行時刻まで1回で待機して時刻ちょうどに起きる
+キャンセル・シグナル（Ctrl+C、SIGTERM）・新しい予定の追加で待機を中断できる
+"""
+
+import time
+import heapq
+import signal
+import logging
+import itertools
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 1回の待機の上限（秒）。時計の変更やスリープ復帰の後も期限を確認し直す
+MAX_WAIT_SLICE = 300
+
+# 予定の実行でエラーが起きた場合に次の確認まで空ける時間（秒）
+ERROR_BACKOFF_SECONDS = 60
+
+def _timestamp(deadline):
+    """datetime・UNIX時刻を比較用のUNIX時刻にする"""
+    if deadline is None:
+        return None
+    if isinstance(deadline, datetime):
+        return deadline.timestamp()
+    return float(deadline)
+
+class DeadlineWaiter:
+    """期限まで待機するクラス（期限に達するか、キャンセル・起床要求があるまでCPUを使わない）"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.cancelled = False
+        self.generation = 0
+
+    def cancel(self):
+        """待機を中止（以降の待機もすぐに戻る）"""
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
+
+    def wake(self):
+        """待機中の処理を起こして期限を確認し直させる（予定の追加時など）"""
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait_until(self, deadline, generation=None):
+        """期限まで待機（期限に達したらTrue、キャンセル・起床要求で中断したらFalse、Noneは期限なし）
+
+        generationを指定すると、その時点より後の起床要求で中断する（期限の計算中の追加を取りこぼさない）
+        """
+        deadline = _timestamp(deadline)
+        with self.condition:
+            if generation is None:
+                generation = self.generation
+            while not self.cancelled and self.generation == generation:
+                if deadline is None:
+                    self.condition.wait(MAX_WAIT_SLICE)
+                    continue
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return True
+                self.condition.wait(min(remaining, MAX_WAIT_SLICE))
+            return False
+
+    def sleep(self, seconds):
+        """指定した秒数だけ待機（キャンセルされた場合はFalse）"""
+        return self.wait_until(time.time() + seconds)
+
+    def install_signal_handlers(self, signals=(signal.SIGINT, signal.SIGTERM)):
+        """シグナルを受けたら待機を中止する（メインスレッドからのみ呼び出せる）"""
+        def handle(signum, frame):
+            logger.info(f"シグナルを受信しました: {signal.Signals(signum).name}")
+            self.cancel()
+
+        for signum in signals:
+            signal.signal(signum, handle)
+
+    def run_schedule(self, scheduler=None):
+        """scheduleライブラリの予定を次の実行時刻ごとに実行（キャンセルされるまで戻らない）"""
+        import schedule
+
+        scheduler = scheduler or schedule.default_scheduler
+        while not self.cancelled:
+            try:
+                scheduler.run_pending()
+            except Exception as e:
+                logger.error(f"スケジューラーエラー: {e}")
+                self.sleep(ERROR_BACKOFF_SECONDS)
+                continue
+
+            idle_seconds = scheduler.idle_seconds
+            self.wait_until(None if idle_seconds is None else time.time() + max(idle_seconds, 0))
+
+class DeadlineScheduler:
+    """複数の期限に関数を1回ずつ実行するクラス（1つのスレッドで待機し、期限に達した関数は別スレッドで実行）"""
+
+    def __init__(self, name='deadline-scheduler'):
+        self.name = name
+        self.waiter = DeadlineWaiter()
+        self.lock = threading.Lock()
+        self.entries = []
+        self.cancelled_ids = set()
+        self.counter = itertools.count(1)
+        self.thread = None
+
+    def call_at(self, when, function, *args, **kwargs):
+        """指定時刻に関数を実行（過ぎている場合はすぐに実行）し、取り消し用のIDを返す"""
+        entry_id = next(self.counter)
+        with self.lock:
+            heapq.heappush(self.entries, (_timestamp(when), entry_id, function, args, kwargs))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self.thread.start()
+        self.waiter.wake()
+        return entry_id
+
+    def cancel(self, entry_id):
+        """予定を取り消す（未実行の予定があればTrue）"""
+        with self.lock:
+            if any(entry[1] == entry_id for entry in self.entries):
+                self.cancelled_ids.add(entry_id)
+                return True
+            return False
+
+    def pending(self):
+        """未実行の予定（実行時刻, 関数名）"""
+        with self.lock:
+            return [
+                (datetime.fromtimestamp(when), getattr(function, '__name__', repr(function)))
+                for when, entry_id, function, _, _ in sorted(self.entries)
+                if entry_id not in self.cancelled_ids
+            ]
+
+    def shutdown(self):
+        """待機を終了（未実行の予定は実行しない）"""
+        self.waiter.cancel()
+
+    def _take_due(self):
+        """期限に達した予定と次の期限"""
+        due = []
+        now = time.time()
+        with self.lock:
+            while self.entries and self.entries[0][0] <= now:
+                when, entry_id, function, args, kwargs = heapq.heappop(self.entries)
+                if entry_id in self.cancelled_ids:
+                    self.cancelled_ids.discard(entry_id)
+                    continue
+                due.append((function, args, kwargs))
+            next_deadline = self.entries[0][0] if self.entries else None
+        return due, next_deadline
+
+    def _execute(self, function, args, kwargs):
+        try:
+            function(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"予定の実行エラー（{getattr(function, '__name__', function)}）: {e}")
+
+    def _run(self):
+        while not self.waiter.cancelled:
+            generation = self.waiter.generation
+            due, next_deadline = self._take_due()
+            # 時間のかかる予約処理が後の予定を遅らせないように別スレッドで実行
+            for function, args, kwargs in due:
+                threading.Thread(target=self._execute, args=(function, args, kwargs),
+                                 name=f"{self.name}-task", daemon=True).start()
+            self.waiter.wait_until(next_deadline, generation)
+
+# シングルトンインスタンス
+_deadline_scheduler = None
+_deadline_scheduler_lock = threading.Lock()
+
+def get_deadline_scheduler():
+    """DeadlineSchedulerのインスタンスを取得"""
+    global _deadline_scheduler
+    with _deadline_scheduler_lock:
+        if _deadline_scheduler is None:
+            _deadline_scheduler = DeadlineScheduler()
+        return _deadline_scheduler
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DOMスナップショット - かよ皮膚科予約管理システム
+ページ内のフォーム・入力欄・ボタン・リンクと属性を1回のexecute_scriptでまとめて取得する
+要素ごとにget_attributeを呼ぶとChromeDriverとの通信が要素数×属性数だけ発生するため、解析ツールはこれを使う
+保存済みのHTMLからも同じ形式で取得できる（ブラウザ不要、lxmlがあれば使用）
+"""
+
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+FormInfo = namedtuple('FormInfo', ['index', 'action', 'method', 'id', 'css_class', 'inputs'])
+InputInfo = namedtuple('InputInfo', ['index', 'type', 'name', 'id', 'placeholder', 'value', 'css_class', 'form_index'])
+ButtonInfo = namedtuple('ButtonInfo', ['index', 'text', 'type', 'id', 'css_class'])
+LinkInfo = namedtuple('LinkInfo', ['index', 'text', 'href', 'parent_tag', 'parent_class'])
+PageSnapshot = namedtuple('PageSnapshot', ['title', 'url', 'forms', 'inputs', 'buttons', 'links'])
+TextMatch = namedtuple('TextMatch', ['tag', 'text'])
+
+# フォーム・入力欄・ボタン・リンクの属性をまとめて取得
+SNAPSHOT_SCRIPT = """
+function attr(element, name) {
+    var value = element.getAttribute(name);
+    return value === null ? null : value;
+}
+
+var forms = Array.prototype.slice.call(document.forms);
+var inputs = Array.prototype.slice.call(document.getElementsByTagName('input'));
+var buttons = Array.prototype.slice.call(document.getElementsByTagName('button'));
+var links = Array.prototype.slice.call(document.getElementsByTagName('a'));
+
+return {
+    title: document.title,
+    url: location.href,
+    forms: forms.map(function (form, i) {
+        return {
+            action: form.action || attr(form, 'action'),
+            method: attr(form, 'method'),
+            id: attr(form, 'id'),
+            css_class: attr(form, 'class'),
+            inputs: inputs.reduce(function (indexes, input, j) {
+                if (input.form === form) {
+                    indexes.push(j);
+                }
+                return indexes;
+            }, [])
+        };
+    }),
+    inputs: inputs.map(function (input) {
+        return {
+            type: input.type || attr(input, 'type'),
+            name: attr(input, 'name'),
+            id: attr(input, 'id'),
+            placeholder: attr(input, 'placeholder'),
+            value: input.value,
+            css_class: attr(input, 'class'),
+            form_index: input.form ? forms.indexOf(input.form) : null
+        };
+    }),
+    buttons: buttons.map(function (button) {
+        return {
+            text: (button.innerText || '').trim(),
+            type: button.type || attr(button, 'type'),
+            id: attr(button, 'id'),
+            css_class: attr(button, 'class')
+        };
+    }),
+    links: links.map(function (link) {
+        var parent = link.parentElement;
+        return {
+            text: (link.innerText || '').trim(),
+            href: link.href || attr(link, 'href'),
+            parent_tag: parent ? parent.tagName.toLowerCase() : null,
+            parent_class: parent ? attr(parent, 'class') : null
+        };
+    })
+};
+"""
+
+# 指定した文字列を含む要素を文字列ごとにまとめて検索
+TEXT_SEARCH_SCRIPT = """
+var keywords = arguments[0];
+var limit = arguments[1];
+var results = {};
+for (var k = 0; k < keywords.length; k++) {
+    var xpath = "//*[contains(text(), " + JSON.stringify(keywords[k]) + ")]";
+    var snapshot = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var matches = [];
+    for (var i = 0; i < snapshot.snapshotLength && i < limit; i++) {
+        var node = snapshot.snapshotItem(i);
+        matches.push({tag: node.tagName.toLowerCase(), text: (node.innerText || node.textContent || '').trim().slice(0, 50)});
+    }
+    results[keywords[k]] = {count: snapshot.snapshotLength, matches: matches};
+}
+return results;
+"""
+
+# 患者番号の入力欄らしさを判定するキーワード
+PATIENT_NAME_KEYWORDS = ["patient", "no", "id", "number"]
+PATIENT_PLACEHOLDER_KEYWORDS = ["患者", "番号", "no", "id"]
+
+def take_dom_snapshot(driver):
+    """現在のページのフォーム・入力欄・ボタン・リンクを取得"""
+    raw = driver.execute_script(SNAPSHOT_SCRIPT)
+
+    forms = [
+        FormInfo(i, form['action'], form['method'], form['id'], form['css_class'], tuple(form['inputs']))
+        for i, form in enumerate(raw['forms'])
+    ]
+    inputs = [
+        InputInfo(i, item['type'], item['name'], item['id'], item['placeholder'], item['value'],
+                  item['css_class'], item['form_index'])
+        for i, item in enumerate(raw['inputs'])
+    ]
+    buttons = [
+        ButtonInfo(i, item['text'], item['type'], item['id'], item['css_class'])
+        for i, item in enumerate(raw['buttons'])
+    ]
+    links = [
+        LinkInfo(i, item['text'], item['href'], item['parent_tag'], item['parent_class'])
+        for i, item in enumerate(raw['links'])
+    ]
+    return PageSnapshot(raw['title'], raw['url'], forms, inputs, buttons, links)
+
+def find_text_elements(driver, keywords, limit=3):
+    """文字列ごとに(件数, 先頭limit件の要素)を取得"""
+    raw = driver.execute_script(TEXT_SEARCH_SCRIPT, list(keywords), limit)
+    return {
+        keyword: (result['count'], [TextMatch(match['tag'], match['text']) for match in result['matches']])
+        for keyword, result in raw.items()
+    }
+
+def form_inputs(snapshot, form):
+    """フォーム内の入力欄"""
+    return [snapshot.inputs[i] for i in form.inputs]
+
+def is_patient_related_input(item):
+    """患者番号の入力欄の可能性があるか"""
+    if any(keyword in str(item.name).lower() for keyword in PATIENT_NAME_KEYWORDS):
+        return True
+    if any(keyword in str(item.placeholder).lower() for keyword in PATIENT_PLACEHOLDER_KEYWORDS):
+        return True
+    return False
+
+def _resolve(url, value):
+    """ブラウザのhref・actionプロパティと同じく絶対URLにする"""
+    if value is None:
+        return None
+    return urljoin(url, value.strip()) if url else value.strip()
+
+def _normalize_text(text):
+    """連続する空白をまとめる（innerTextに近づける）"""
+    return ' '.join((text or '').split())
+
+def _snapshot_with_lxml(html, url):
+    """lxmlで解析"""
+    import lxml.html
+
+    document = lxml.html.fromstring(html)
+    form_elements = document.xpath('//form')
+    input_elements = document.xpath('//input')
+
+    inputs = []
+    form_input_indexes = {id(form): [] for form in form_elements}
+    for i, element in enumerate(input_elements):
+        form = next(element.iterancestors('form'), None)
+        form_index = form_elements.index(form) if form is not None else None
+        if form is not None:
+            form_input_indexes[id(form)].append(i)
+        inputs.append(InputInfo(
+            i, (element.get('type') or 'text').lower(), element.get('name'), element.get('id'),
+            element.get('placeholder'), element.get('value') or '', element.get('class'), form_index
+        ))
+
+    forms = [
+        FormInfo(i, _resolve(url, form.get('action') or ''), form.get('method'), form.get('id'), form.get('class'),
+                 tuple(form_input_indexes[id(form)]))
+        for i, form in enumerate(form_elements)
+    ]
+    buttons = [
+        ButtonInfo(i, _normalize_text(button.text_content()), (button.get('type') or 'submit').lower(),
+                   button.get('id'), button.get('class'))
+        for i, button in enumerate(document.xpath('//button'))
+    ]
+    links = []
+    for i, link in enumerate(document.xpath('//a')):
+        parent = link.getparent()
+        links.append(LinkInfo(
+            i, _normalize_text(link.text_content()), _resolve(url, link.get('href')),
+            parent.tag if parent is not None else None, parent.get('class') if parent is not None else None
+        ))
+
+    title = _normalize_text(document.findtext('.//title'))
+    return PageSnapshot(title, url, forms, inputs, buttons, links)
+
+class _SnapshotParser(HTMLParser):
+    """lxmlがない場合の標準ライブラリでの解析"""
+
+    def __init__(self, url):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.title = ''
+        self.forms = []
+        self.inputs = []
+        self.buttons = []
+        self.links = []
+        self.open_tags = []
+        self.current_form = None
+        self.current_button = None
+        self.current_link = None
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        parent = self.open_tags[-1] if self.open_tags else (None, None)
+        if tag not in ('input', 'br', 'img', 'meta', 'link', 'hr'):
+            self.open_tags.append((tag, attrs.get('class')))
+
+        if tag == 'title':
+            self.in_title = True
+        elif tag == 'form':
+            self.current_form = len(self.forms)
+            self.forms.append({'action': _resolve(self.url, attrs.get('action') or ''), 'method': attrs.get('method'),
+                               'id': attrs.get('id'), 'class': attrs.get('class'), 'inputs': []})
+        elif tag == 'input':
+            index = len(self.inputs)
+            if self.current_form is not None:
+                self.forms[self.current_form]['inputs'].append(index)
+            self.inputs.append(InputInfo(
+                index, (attrs.get('type') or 'text').lower(), attrs.get('name'), attrs.get('id'),
+                attrs.get('placeholder'), attrs.get('value') or '', attrs.get('class'), self.current_form
+            ))
+        elif tag == 'button':
+            self.current_button = {'type': (attrs.get('type') or 'submit').lower(), 'id': attrs.get('id'),
+                                   'class': attrs.get('class'), 'text': []}
+        elif tag == 'a':
+            self.current_link = {'href': _resolve(self.url, attrs.get('href')), 'parent_tag': parent[0],
+                                 'parent_class': parent[1], 'text': []}
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[i][0] == tag:
+                del self.open_tags[i:]
+                break
+
+        if tag == 'title':
+            self.in_title = False
+        elif tag == 'form':
+            self.current_form = None
+        elif tag == 'button' and self.current_button is not None:
+            button = self.current_button
+            self.buttons.append(ButtonInfo(len(self.buttons), _normalize_text(''.join(button['text'])),
+                                           button['type'], button['id'], button['class']))
+            self.current_button = None
+        elif tag == 'a' and self.current_link is not None:
+            link = self.current_link
+            self.links.append(LinkInfo(len(self.links), _normalize_text(''.join(link['text'])), link['href'],
+                                       link['parent_tag'], link['parent_class']))
+            self.current_link = None
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+        if self.current_button is not None:
+            self.current_button['text'].append(data)
+        if self.current_link is not None:
+            self.current_link['text'].append(data)
+
+def _snapshot_with_html_parser(html, url):
+    """標準ライブラリのHTMLParserで解析"""
+    parser = _SnapshotParser(url)
+    parser.feed(html)
+    parser.close()
+    forms = [
+        FormInfo(i, form['action'], form['method'], form['id'], form['class'], tuple(form['inputs']))
+        for i, form in enumerate(parser.forms)
+    ]
+    return PageSnapshot(_normalize_text(parser.title), url, forms, parser.inputs, parser.buttons, parser.links)
+
+def snapshot_from_html(html, url=None):
+    """保存済みのHTMLからtake_dom_snapshotと同じ形式のスナップショットを作成"""
+    try:
+        return _snapshot_with_lxml(html, url)
+    except ImportError:
+        return _snapshot_with_html_parser(html, url)
+
+def count_text_matches(html, keywords):
+    """保存済みのHTMLでの文字列ごとの出現回数"""
+    return {keyword: html.count(keyword) for keyword in keywords}
+
+def find_text_in_html(html, keywords, limit=3):
+    """保存済みのHTMLでfind_text_elementsと同じ形式の結果を取得（lxmlがない場合は件数のみ）"""
+    try:
+        import lxml.html
+    except ImportError:
+        return {keyword: (html.count(keyword), []) for keyword in keywords}
+
+    document = lxml.html.fromstring(html)
+    results = {}
+    for keyword in keywords:
+        nodes = document.xpath('//*[contains(text(), $keyword)]', keyword=keyword)
+        results[keyword] = (len(nodes), [
+            TextMatch(node.tag, _normalize_text(node.text_content())[:50]) for node in nodes[:limit]
+        ])
+    return results
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+要素検索 - かよ皮膚科予約管理システム
+優先順位付きのXPathリストをブラウザ内で一度に評価し、最初に一致した要素を返す
+一致したXPathはページ構造ごとに記録し、次回以降はよく当たる順に試す
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 一致したXPathの記録（ページ構造のハッシュごと）
+LOCATOR_CACHE_FILE = 'config/locator_cache.json'
+
+# 1つの検索対象について保持するページ構造の数
+MAX_FINGERPRINTS = 5
+
+# 記録してからキャッシュファイルに保存するまでの秒数（クリックのたびに書き込まないようにまとめる）
+SAVE_DELAY_SECONDS = 5
+
+# ページ構造のハッシュを計算し、XPathリストを評価して最初に条件を満たした要素を返す
+#   arguments[0]: XPathリスト
+#   arguments[1]: クリック可能な要素に限定するか
+#   arguments[2]: ページ構造ハッシュごとの評価順（XPathリストの番号の配列）
+# 戻り値: [要素またはnull, XPathリストでの番号, ページ構造ハッシュ]
+LOCATE_SCRIPT = """
+var patterns = arguments[0];
+var requireClickable = arguments[1];
+var orderings = arguments[2] || {};
+
+function structureHash() {
+    // タグ・id・nameのみを対象にし、セッションIDやクラスの変化では変わらないようにする
+    var signature = location.host + location.pathname.split(';')[0];
+    var nodes = document.getElementsByTagName('*');
+    for (var n = 0; n < nodes.length; n++) {
+        var node = nodes[n];
+        signature += '|' + node.tagName;
+        if (node.id) {
+            signature += '#' + node.id;
+        }
+        var name = node.getAttribute('name');
+        if (name) {
+            signature += '@' + name;
+        }
+    }
+    var hash = 0x811c9dc5;
+    for (var c = 0; c < signature.length; c++) {
+        hash ^= signature.charCodeAt(c);
+        hash = Math.imul(hash, 16777619) >>> 0;
+    }
+    return hash.toString(16);
+}
+
+function isClickable(element) {
+    if (element.disabled) {
+        return false;
+    }
+    var style = window.getComputedStyle(element);
+    if (style.visibility === 'hidden' || style.display === 'none') {
+        return false;
+    }
+    return element.getClientRects().length > 0;
+}
+
+var fingerprint = structureHash();
+var order = orderings[fingerprint];
+if (!order) {
+    order = [];
+    for (var k = 0; k < patterns.length; k++) {
+        order.push(k);
+    }
+}
+
+for (var o = 0; o < order.length; o++) {
+    var i = order[o];
+    var result;
+    try {
+        result = document.evaluate(patterns[i], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    } catch (e) {
+        continue;
+    }
+    for (var j = 0; j < result.snapshotLength; j++) {
+        var node = result.snapshotItem(j);
+        if (node.nodeType !== Node.ELEMENT_NODE) {
+            continue;
+        }
+        if (!requireClickable || isClickable(node)) {
+            return [node, i, fingerprint];
+        }
+    }
+}
+return [null, -1, fingerprint];
+"""
+
+class LocatorCache:
+    """検索対象・ページ構造ごとに一致したXPathを記録するクラス"""
+
+    def __init__(self, cache_file=LOCATOR_CACHE_FILE, save_delay=SAVE_DELAY_SECONDS):
+        self.cache_file = cache_file
+        self.save_delay = save_delay
+        self.lock = threading.Lock()
+        self.entries = self.load()
+        self.dirty = False
+        self.save_timer = None
+
+    def load(self):
+        """キャッシュファイルを読み込む"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"要素検索キャッシュの読み込みエラー: {e}")
+            return {}
+
+    def save(self):
+        """キャッシュファイルに保存（書き込み途中で壊れないよう置き換えで保存）"""
+        with self.lock:
+            content = json.dumps(self.entries, ensure_ascii=False, indent=2)
+            self.dirty = False
+            self.save_timer = None
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            temp_file = f"{self.cache_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temp_file, self.cache_file)
+        except Exception as e:
+            logger.warning(f"要素検索キャッシュの保存エラー: {e}")
+
+    def flush(self):
+        """未保存の記録があれば保存（予約処理の終了時・プロセス終了時）"""
+        with self.lock:
+            if self.save_timer is not None:
+                self.save_timer.cancel()
+                self.save_timer = None
+            dirty = self.dirty
+        if dirty:
+            self.save()
+
+    def get_orderings(self, name, patterns):
+        """ページ構造ごとの評価順（前回一致したXPath → 一致回数の多い順 → 元の順）"""
+        orderings = {}
+        with self.lock:
+            fingerprints = self.entries.get(name, {})
+            for fingerprint, entry in fingerprints.items():
+                hits = entry.get('hits', {})
+                last_winner = entry.get('last_winner')
+                orderings[fingerprint] = sorted(
+                    range(len(patterns)),
+                    key=lambda i: (patterns[i] != last_winner, -hits.get(patterns[i], 0), i)
+                )
+        return orderings
+
+    def record_hit(self, name, fingerprint, xpath):
+        """一致したXPathを記録"""
+        with self.lock:
+            fingerprints = self.entries.setdefault(name, {})
+            entry = fingerprints.setdefault(fingerprint, {'hits': {}})
+            entry['hits'][xpath] = entry['hits'].get(xpath, 0) + 1
+            entry['last_winner'] = xpath
+            entry['last_used'] = time.time()
+
+            # ページ構造が変わった古い記録は破棄
+            if len(fingerprints) > MAX_FINGERPRINTS:
+                oldest = sorted(fingerprints, key=lambda key: fingerprints[key].get('last_used', 0))
+                for key in oldest[:len(fingerprints) - MAX_FINGERPRINTS]:
+                    del fingerprints[key]
+
+            # ファイルへの保存はまとめて後で行う（クリックのたびに書き込まない）
+            self.dirty = True
+            if self.save_timer is None:
+                self.save_timer = threading.Timer(self.save_delay, self.save)
+                self.save_timer.daemon = True
+                self.save_timer.start()
+
+def locate_element(driver, patterns, clickable=False, timeout=5, poll_interval=0.1, name=None):
+    """XPathリストから最初に一致した要素を(要素, 番号)で返す（見つからない場合は(None, None)）
+
+    ページの読み込み途中でも見つかるよう、timeout秒まで短い間隔で再評価する
+    nameを指定した場合は、ページ構造ごとに過去に一致したXPathから試す
+    """
+    if not patterns:
+        return None, None
+
+    patterns = list(patterns)
+    cache = get_locator_cache() if name else None
+    orderings = cache.get_orderings(name, patterns) if cache else {}
+
+    deadline = time.monotonic() + timeout
+    while True:
+        element, index, fingerprint = driver.execute_script(LOCATE_SCRIPT, patterns, clickable, orderings)
+        if element is not None:
+            if cache:
+                cache.record_hit(name, fingerprint, patterns[index])
+            return element, int(index)
+
+        if time.monotonic() >= deadline:
+            return None, None
+        time.sleep(poll_interval)
+
+# シングルトンインスタンス
+_locator_cache = None
+
+def get_locator_cache():
+    """LocatorCacheのインスタンスを取得"""
+    global _locator_cache
+    if _locator_cache is None:
+        _locator_cache = LocatorCache()
+        atexit.register(_locator_cache.flush)
+    return _locator_cache
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+待ち人数予測のオフライン評価
+保存済みの待ち人数の履歴を使い、日ごとに「前日までのデータで学習 → 当日を予測」を繰り返して
+予測した時刻の実際の待ち人数を、固定時刻（受付開始15分後）および当日の最小値と比較する
+
+使用方法:
+  python evaluate_wait_count_predictor.py [DBパス] [評価日数]
+"""
+
+import sys
+import time
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from wait_count_collector import WaitCountStore, OPENING_KINDS
+from wait_count_predictor import WaitCountPredictor, WEEKDAYS
+from reception_calendar import get_reception_calendar
+
+# 現行の固定実行時刻（受付開始からの分数）
+BASELINE_OFFSET_MINUTES = 15
+
+def actual_at(timestamps, wait_counts, target_ts):
+    """目標時刻に最も近いサンプルの待ち人数"""
+    index = int(np.argmin(np.abs(timestamps - target_ts)))
+    return int(wait_counts[index])
+
+def evaluate(db_path, test_days):
+    """直近test_days日分をウォークフォワードで評価"""
+    store = WaitCountStore(lambda: sqlite3.connect(db_path))
+    series = np.array(store.load_series(), dtype=np.int64).reshape(-1, 2)
+    if series.size == 0:
+        print("待ち人数の履歴がありません")
+        return None
+
+    timestamps = series[:, 0]
+    wait_counts = series[:, 1]
+
+    last_day = datetime.fromtimestamp(int(timestamps[-1])).date()
+    dates = [last_day - timedelta(days=offset) for offset in range(test_days - 1, -1, -1)]
+
+    predictor = WaitCountPredictor()
+    calendar = get_reception_calendar()
+    rows = []
+    fit_times = []
+
+    for date in dates:
+        day_start = datetime.combine(date, datetime.min.time())
+        day_start_ts = int(day_start.timestamp())
+
+        # 当日より前のデータのみで学習
+        train_end = int(np.searchsorted(timestamps, day_start_ts))
+        started = time.perf_counter()
+        predictor.fit(timestamps[:train_end], wait_counts[:train_end], now=day_start_ts)
+        fit_times.append((time.perf_counter() - started) * 1000)
+
+        # 当日の診療時間帯（祝日・休診日は受付時間カレンダーで除かれる）
+        weekday = WEEKDAYS[date.weekday()]
+        windows = []
+        for kind in OPENING_KINDS:
+            starts, ends = calendar.windows(day_start, day_start + timedelta(days=1), kind)
+            windows.extend((start.astype(datetime), end.astype(datetime)) for start, end in zip(starts, ends)
+                           if start.astype(datetime).date() == date)
+        for window_start, window_end in sorted(windows):
+            start_str, end_str = window_start.strftime('%H:%M'), window_end.strftime('%H:%M')
+            window = f"{start_str}-{end_str}"
+
+            mask = (timestamps >= window_start.timestamp()) & (timestamps < window_end.timestamp())
+            if mask.sum() < 2:
+                continue
+            day_timestamps = timestamps[mask]
+            day_counts = wait_counts[mask]
+
+            prediction = predictor.predict_best_time(weekday, start_str, end_str)
+            if prediction is None:
+                continue
+            predicted_time = datetime.combine(date, datetime.strptime(prediction[0], '%H:%M').time())
+            baseline_time = window_start + timedelta(minutes=BASELINE_OFFSET_MINUTES)
+
+            rows.append({
+                'date': date.strftime('%Y-%m-%d'),
+                'window': window,
+                'predicted_time': prediction[0],
+                'predicted': actual_at(day_timestamps, day_counts, predicted_time.timestamp()),
+                'baseline': actual_at(day_timestamps, day_counts, baseline_time.timestamp()),
+                'best': int(day_counts.min())
+            })
+
+    return rows, fit_times, int(timestamps.size)
+
+def main():
+    """メイン関数"""
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'database/bookings.db'
+    test_days = int(sys.argv[2]) if len(sys.argv) > 2 else 28
+
+    result = evaluate(db_path, test_days)
+    if result is None:
+        return
+
+    rows, fit_times, sample_total = result
+    print(f"=== 待ち人数予測の評価（サンプル数: {sample_total}, 評価日数: {test_days}） ===")
+
+    if not rows:
+        print("評価できる時間帯がありません（学習データ不足）")
+        return
+
+    print(f"{'日付':<12}{'時間帯':<14}{'予測時刻':<10}{'予測':>6}{'固定':>6}{'最小':>6}")
+    for row in rows:
+        print(f"{row['date']:<12}{row['window']:<14}{row['predicted_time']:<10}"
+              f"{row['predicted']:>6}{row['baseline']:>6}{row['best']:>6}")
+
+    predicted = np.array([row['predicted'] for row in rows], dtype=np.float64)
+    baseline = np.array([row['baseline'] for row in rows], dtype=np.float64)
+    best = np.array([row['best'] for row in rows], dtype=np.float64)
+
+    print("")
+    print(f"予測時刻の平均待ち人数: {predicted.mean():.2f}人（最小値との差: {(predicted - best).mean():.2f}人）")
+    print(f"固定時刻の平均待ち人数: {baseline.mean():.2f}人（最小値との差: {(baseline - best).mean():.2f}人）")
+    print(f"予測が固定時刻以下だった割合: {(predicted <= baseline).mean() * 100:.1f}%")
+    print(f"学習時間: 平均 {np.mean(fit_times):.2f}ms / 最大 {np.max(fit_times):.2f}ms")
+
+if __name__ == "__main__":
+    main()
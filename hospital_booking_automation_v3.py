@@ -6,22 +6,113 @@
 受付時間の制限に対応（患者番号のみの入力）
 """
 
+import re
 import time
 import json
 import logging
 import requests
 from datetime import datetime, timedelta
-from selenium import webdriver
+from urllib.parse import urlsplit
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
 import schedule
 import os
+import atexit
+import sqlite3
+import tempfile
 from selenium.webdriver.support.ui import Select # Added missing import
+from browser_pool import get_browser_pool, measure_page_load
+from element_locator import locate_element, get_locator_cache
+from page_waits import wait_for_document_ready, wait_for_navigation, wait_for_any_element
+from wait_count_collector import parse_wait_count, get_wait_count_store, WaitCountStore
+from wait_count_predictor import get_wait_count_predictor
+from snapshot_writer import get_snapshot_writer, SnapshotWriter
+from booking_logging import configure_logging
+from booking_metrics import track_step, get_metrics_registry
+from page_archive import get_page_archive, PageArchive
+from deadline_waiter import DeadlineWaiter
+from reception_calendar import ReceptionCalendar, DEFAULT_BOOKING_HOURS
+from request_governor import get_request_governor, is_server_error_response
+from retry_policy import RetryPolicy, ServerErrorPage, SAFE_TO_RESEND, classify_error
+import booking_state
+from booking_state import BookingState, get_booking_checkpoint_store, cookies_to_list
+
+# 手順ごとの待機時間の既定値（秒）
+DEFAULT_STEP_TIMEOUTS = {
+    "page_load": 10,
+    "navigation": 10,
+    "reception_form": 10,
+    "submit": 15
+}
+
+# 受付フォームが表示されたことを示す要素
+RECEPTION_FORM_MARKERS = [
+    "//input[@name='pNo']",
+    "//select[@name='pBDayMM']",
+    "//form[@id='C1FM']"
+]
+
+# 確認画面の「受付する」ボタン
+ACCEPT_BUTTON_PATTERNS = [
+    "//form[.//input[@name='jobid' and @value='rsvmodM06']]//button[@type='submit']",
+    "//button[.//*[contains(text(), '受付する')]]",
+    "//button[contains(text(), '受付する')]",
+    "//input[@type='submit' and contains(@value, '受付する')]"
+]
+
+# 予約サイトのURL
+DEFAULT_TOP_URL = "https://www5.tandt.co.jp/cti/hs713/index_p.html"
+DEFAULT_RESERVATION_BASE_URL = "https://www4.tandt.co.jp/rsvsys/"
+
+# 受付フォームに不足しているフィールドの既定値（ymd・subno・subnameはフォームのURLから取得した値）
+LIGHTWEIGHT_FORM_DEFAULTS = {
+    'pSessyu': '',
+    'pCondition': '',
+    'pComment': '',
+    'pCure': '',
+    'clr': '0',
+    'pCtl': '0',
+    'agent': 'RSV1',
+    'jobid': 'rsvmodM04',
+    'callback': '0',
+    'ymd': None,
+    'subno': None,
+    'subname': None,
+    'pFamily': '1',
+    'pBTemp': '',
+    # 家族情報フィールド
+    'pFamNo': '',
+    'pFamBDayMM': '0',
+    'pFamBDayDD': '0',
+    'pGFamName': '',
+    'pGFamSex': '0',
+    'pGFamBDayYY': '0',
+    'pGFamBDayMM': '0',
+    'pGFamBDayDD': '0'
+}
+
+# 受付フォームのページから取得できなければならないフィールド（既定値で補うと送信先の受付枠を誤るため）
+REQUIRED_FORM_FIELDS = ['pNo', 'agent', 'jobid', 'callback', 'ymd', 'subno', 'subname']
+
+# 受付フォームのフィールドの想定値（変わった場合は送信処理の見直しが必要）
+EXPECTED_FORM_VALUES = {'agent': 'RSV1', 'jobid': 'rsvmodM04'}
+
+# 順番受付ページの受付状況の表示（例: <div class="dt-href"><span class="sbjtx" ...>準備中</span>）
+RECEPTION_STATUS_PATTERN = re.compile(r'class="dt-href">\s*<(?:span|a)[^>]*class="sbjtx[^"]*"[^>]*>\s*([^<\s]+)')
+
+# 受付中ボタンがない受付状況（受付時間外・休診のため、予約処理の異常ではない）
+RECEPTION_CLOSED_STATUSES = ('準備中', '休診', '受付終了')
+
+class BrowserHandoff(Exception):
+    """軽量版で解析できなかった手順をブラウザに引き継ぐための例外"""
+    
+    def __init__(self, step, url, reason):
+        super().__init__(reason)
+        self.step = step
+        self.url = url
+        self.reason = reason
 
 class HospitalBookingAutomationV3:
     def __init__(self, config_file="config_v3.json"):
@@ -30,35 +121,52 @@ class HospitalBookingAutomationV3:
         self.config = self.load_config()
         self.setup_logging()
         self.driver = None
+        self.browser_pool = None
+        self.snapshot_writer = None
         self.session = requests.Session()
         
+        # 進捗通知用のコールバック（step, details）を受け取る
+        self.progress_callback = None
+        
+        # 軽量版で解析できない手順をブラウザに引き継ぐか（book()の実行中のみ有効）
+        self.handoff_enabled = False
+        
+        # 軽量版の予約処理の状態を保存するキー（設定すると中断後に同じキーで再開できる）
+        self.checkpoint_key = None
+        
+        # 軽量版のリクエストの所要時間を記録する実行方式の名前（送信しない確認は'dry_run'）
+        self.metrics_engine = 'lightweight'
+        
+        # スタンドインサーバーでの検証中の保存先（待ち人数・スナップショット・ページのアーカイブ）
+        self.sandbox_dir = None
+        self.wait_count_store = None
+        
+        # 予約サイトのURL（環境変数BOOKING_SITE_BASE_URLで検証用のスタンドインサーバーに向けられる）
+        self.top_url = self.config.get('hospital_url', DEFAULT_TOP_URL)
+        self.reservation_base_url = self.config.get('reservation_base_url', DEFAULT_RESERVATION_BASE_URL)
+        if os.environ.get('BOOKING_SITE_BASE_URL'):
+            self.set_site_base_url(os.environ['BOOKING_SITE_BASE_URL'])
+        
         # 患者データの初期化
         self.patient_data = {
             'patient_number': self.config['patient_info']['patient_number'],
             'birth_date': datetime.strptime(self.config['patient_info']['birth_date'], '%Y-%m-%d')
         }
         
-        # 受付時間設定
-        self.booking_hours = {
-            "monday": {"morning": "09:00-12:00", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
-            "tuesday": {"morning": "09:00-12:30", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
-            "wednesday": {"morning": "09:00-12:30", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
-            "thursday": {"morning": "09:00-12:30", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
-            "friday": {"morning": "09:00-12:30", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
-            "saturday": {"morning": "09:00-12:30", "afternoon": "休診", "web": "12:00まで"},
-            "sunday": {"morning": "休診", "afternoon": "休診", "web": "休診"}
-        }
+        # 受付時間設定（祝日・休診日を含めた判定は受付時間カレンダーで行う）
+        self.booking_hours = DEFAULT_BOOKING_HOURS
+        self.reception_calendar = ReceptionCalendar.from_config(self.config.get("reception_calendar"), self.booking_hours)
+        
+        # 再試行の方針（ブラウザ版・軽量版で共通）
+        self.retry_policy = RetryPolicy.from_config(self.config.get("retry_policy"), max_attempts=self.config.get("retry_count", 3))
+        
+    def step_timeout(self, step):
+        """手順ごとの待機時間（秒）を設定ファイルから取得"""
+        return self.config.get("step_timeouts", {}).get(step, DEFAULT_STEP_TIMEOUTS[step])
         
     def setup_logging(self):
         """ログ設定"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('hospital_booking_v3.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        configure_logging('hospital_booking_v3.log')
         self.logger = logging.getLogger(__name__)
         
     def load_config(self):
@@ -103,9 +211,16 @@ class HospitalBookingAutomationV3:
                  },
                 "chrome_options": {
                     "headless": False,
+                    "fast_profile": False,
                     "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
                 },
+                "browser_pool": {
+                    "size": 2,
+                    "warm_up": False,
+                    "acquire_timeout": 60
+                },
                 "wait_timeout": 20,
+                "step_timeouts": dict(DEFAULT_STEP_TIMEOUTS),
                 "retry_count": 3,
                 "page_elements": {
                     "booking_button": [
@@ -151,6 +266,40 @@ class HospitalBookingAutomationV3:
             self.save_config(default_config)
             return default_config
             
+    def set_site_base_url(self, base_url):
+        """予約サイトのURLを指定したホストに置き換える（スタンドインサーバーでの検証用）"""
+        base_url = base_url.rstrip('/')
+        self.top_url = base_url + urlsplit(DEFAULT_TOP_URL).path
+        self.reservation_base_url = base_url + urlsplit(DEFAULT_RESERVATION_BASE_URL).path
+        self.logger.info(f"予約サイトのURLを置き換えました: {self.top_url}, {self.reservation_base_url}")
+        if self.sandbox_dir is None:
+            self.use_sandbox_storage()
+    
+    def use_sandbox_storage(self, directory=None):
+        """待ち人数・スナップショット・ページのアーカイブの保存先を一時フォルダに切り替える
+
+        スタンドインサーバーでの検証の結果が本番のデータ（待ち人数の予測に使う履歴など）に混ざらないようにする
+        """
+        self.sandbox_dir = directory or tempfile.mkdtemp(prefix='booking_sandbox_')
+        database_path = os.path.join(self.sandbox_dir, 'bookings.db')
+        self.wait_count_store = WaitCountStore(lambda: sqlite3.connect(database_path))
+        
+        options = dict(self.config.get('snapshots', {}), directory=os.path.join(self.sandbox_dir, 'snapshots'))
+        self.snapshot_writer = SnapshotWriter(**options)
+        atexit.register(self.snapshot_writer.flush)
+        self.snapshot_writer.add_listener(PageArchive(os.path.join(self.sandbox_dir, 'page_archive')).on_snapshot)
+        self.logger.info(f"検証用のデータの保存先: {self.sandbox_dir}")
+        return self.sandbox_dir
+    
+    def report_progress(self, step, **details):
+        """予約処理の進捗をコールバックに通知"""
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback(step, details)
+        except Exception as e:
+            self.logger.warning(f"進捗通知エラー: {e}")
+            
     def save_config(self, config):
         """設定ファイル保存"""
         with open(self.config_file, 'w', encoding='utf-8') as f:
@@ -160,105 +309,81 @@ class HospitalBookingAutomationV3:
         """受付可能時間をチェック"""
         now = datetime.now()
         weekday = now.strftime("%A").lower()
+        calendar = self.reception_calendar
         
-        if weekday not in self.booking_hours:
-            self.logger.warning(f"不明な曜日: {weekday}")
+        # Web予約受付可能かチェック（祝日・休診日を含む）
+        if calendar.is_closed_day(now, 'web'):
+            self.logger.info(f"{weekday}はWeb予約受付不可（休診日・祝日）")
             return False
             
-        hours = self.booking_hours[weekday]
-        
-        # Web予約受付可能かチェック
-        if hours['web'] == "休診":
-            self.logger.info(f"{weekday}はWeb予約受付不可（休診日）")
-            return False
-        elif hours['web'] == "12:00まで":
-            if now.hour < 12:
-                self.logger.info(f"{weekday} {now.hour}:{now.minute} - Web予約受付可能（午前中）")
-                return True
-            else:
-                self.logger.info(f"{weekday} {now.hour}:{now.minute} - Web予約受付終了（午前のみ）")
-                return False
-        else:  # 12:00-16:00
-            if 12 <= now.hour < 16:
-                self.logger.info(f"{weekday} {now.hour}:{now.minute} - Web予約受付可能（午後）")
-                return True
-            elif now.hour < 12:
-                self.logger.info(f"{weekday} {now.hour}:{now.minute} - Web予約受付開始まで待機中（12:00開始）")
-                return False
-            else:
-                self.logger.info(f"{weekday} {now.hour}:{now.minute} - Web予約受付終了（16:00まで）")
-                return False
+        if calendar.is_open(now, 'web'):
+            _, end = calendar.next_window(now, 'web')
+            self.logger.info(f"{weekday} {now.hour}:{now.minute} - Web予約受付可能（{end.strftime('%H:%M')}まで）")
+            return True
+            
+        start, _ = calendar.next_window(now, 'web')
+        if start is not None and start.date() == now.date():
+            self.logger.info(f"{weekday} {now.hour}:{now.minute} - Web予約受付開始まで待機中（{start.strftime('%H:%M')}開始）")
+        else:
+            next_text = start.strftime('%m/%d %H:%M') if start else "なし"
+            self.logger.info(f"{weekday} {now.hour}:{now.minute} - Web予約受付終了（次回: {next_text}）")
+        return False
                 
+    def get_driver_pool(self):
+        """設定ファイルのChromeオプションに対応するブラウザプールを取得"""
+        config_options = self.config.get("chrome_options", {})
+        pool_options = self.config.get("browser_pool", {})
+        
+        return get_browser_pool(
+            headless=config_options.get("headless", False),
+            user_agent=config_options.get("user_agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"),
+            size=pool_options.get("size", 2),
+            fast=config_options.get("fast_profile", False),
+            blocked_urls=config_options.get("blocked_urls")
+        )
+    
     def setup_driver(self):
-        """Chromeドライバーの設定"""
+        """Chromeドライバーの設定（起動済みのブラウザをプールから借りる）"""
         try:
-            chrome_options = Options()
-            
-            # 設定ファイルからオプションを読み込み
-            config_options = self.config.get("chrome_options", {})
-            
-            # ヘッドレスモード設定
-            if config_options.get("headless", False):
-                chrome_options.add_argument("--headless")
-            
-            # ユーザーエージェント設定
-            user_agent = config_options.get("user_agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
-            chrome_options.add_argument(f"--user-agent={user_agent}")
-            
-            # Windows環境での互換性向上
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--disable-extensions")
-            chrome_options.add_argument("--disable-plugins")
-            chrome_options.add_argument("--disable-images")
-            chrome_options.add_argument("--disable-javascript")
-            chrome_options.add_argument("--disable-web-security")
-            chrome_options.add_argument("--allow-running-insecure-content")
-            chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-            
-            # ウィンドウサイズ設定
-            chrome_options.add_argument("--window-size=1920,1080")
+            pool_options = self.config.get("browser_pool", {})
+            self.browser_pool = self.get_driver_pool()
             
             self.logger.info("Chromeドライバーの初期化を開始します")
-            
-            # ChromeDriverを自動でダウンロード・管理（Windows環境対応）
-            try:
-                # 最新版をダウンロード
-                service = Service(ChromeDriverManager().install())
-                self.driver = webdriver.Chrome(service=service, options=chrome_options)
-                self.logger.info("最新版ChromeDriverで初期化成功")
-            except Exception as e:
-                self.logger.warning(f"最新版ChromeDriverでエラー: {e}")
-                # 代替手段として、システムにインストールされているChromeDriverを使用
-                try:
-                    self.driver = webdriver.Chrome(options=chrome_options)
-                    self.logger.info("システムChromeDriverで初期化成功")
-                except Exception as e2:
-                    self.logger.error(f"システムChromeDriverでもエラー: {e2}")
-                    # 最後の手段として、特定のバージョンを試す
-                    try:
-                        service = Service(ChromeDriverManager(version="114.0.5735.90").install())
-                        self.driver = webdriver.Chrome(service=service, options=chrome_options)
-                        self.logger.info("特定バージョンのChromeDriverで初期化成功")
-                    except Exception as e3:
-                        self.logger.error(f"すべてのChromeDriver初期化方法でエラー: {e3}")
-                        raise e3
-            
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            self.driver.implicitly_wait(10)
+            self.driver = self.browser_pool.acquire(timeout=pool_options.get("acquire_timeout", 60))
             self.logger.info("Chromeドライバーの初期化が完了しました")
             return True
             
         except Exception as e:
             self.logger.error(f"ドライバー初期化エラー: {e}")
             return False
+    
+    def close_driver(self, discard=False):
+        """借りたブラウザをプールに返却（discard=Trueの場合は終了）"""
+        if self.driver:
+            try:
+                self.browser_pool.release(self.driver, discard=discard)
+            except Exception as e:
+                self.logger.warning(f"ブラウザの返却エラー: {e}")
+            self.driver = None
+            # ブラウザでの手順で一致したXPathの記録をまとめて保存
+            get_locator_cache().flush()
+            
+    def log_page_load_timing(self):
+        """現在のページの読み込み時間をログに出力"""
+        try:
+            timing = measure_page_load(self.driver)
+            if timing:
+                profile = "高速" if self.browser_pool and self.browser_pool.fast else "標準"
+                self.logger.info(f"ページ読み込み時間（{profile}プロファイル）: DOMContentLoaded={timing['dom_content_loaded_ms']}ms, load={timing['load_ms']}ms, リソース={timing['resource_count']}件, 転送量={timing['transfer_bytes']}バイト")
+        except Exception as e:
+            self.logger.warning(f"ページ読み込み時間の取得エラー: {e}")
             
     def navigate_to_booking_page(self):
         """予約ページに移動"""
         try:
-            self.logger.info(f"予約ページに移動中: {self.config['hospital_url']}")
-            self.driver.get(self.config['hospital_url'])
+            self.logger.info(f"予約ページに移動中: {self.top_url}")
+            with get_request_governor().slot(self.top_url):
+                self.driver.get(self.top_url)
             
             # ページ読み込み完了まで待機
             WebDriverWait(self.driver, self.config["wait_timeout"]).until(
@@ -266,8 +391,10 @@ class HospitalBookingAutomationV3:
             )
             
             # ページの完全な読み込みを待機
-            time.sleep(3)
+            if not wait_for_document_ready(self.driver, self.step_timeout("page_load")):
+                self.logger.warning("ページの読み込み完了を確認できませんでした")
             
+            self.log_page_load_timing()
             self.logger.info("予約ページの読み込みが完了しました")
             return True
             
@@ -286,10 +413,11 @@ class HospitalBookingAutomationV3:
             ymd = current_date.strftime("%Y%m%d%H%M")
             
             # 受付システムのURLを構築
-            reception_url = f"https://www4.tandt.co.jp/rsvsys/jsp/JobDispatcher.jsp?q={int(time.time())}&agent=RSV1&jobid=rsvmodM02&callback=0&ymd={ymd}&subno=01&subname=BB6CDC019CAD7600&newtimetotime=1200"
+            reception_url = f"{self.reservation_base_url}jsp/JobDispatcher.jsp?q={int(time.time())}&agent=RSV1&jobid=rsvmodM02&callback=0&ymd={ymd}&subno=01&subname=BB6CDC019CAD7600&newtimetotime=1200"
             
             self.logger.info(f"受付システムに直接アクセス: {reception_url}")
-            self.driver.get(reception_url)
+            with get_request_governor().slot(reception_url):
+                self.driver.get(reception_url)
             
             # ページ読み込み完了まで待機
             WebDriverWait(self.driver, self.config["wait_timeout"]).until(
@@ -297,8 +425,10 @@ class HospitalBookingAutomationV3:
             )
             
             # ページの完全な読み込みを待機
-            time.sleep(3)
+            if not wait_for_document_ready(self.driver, self.step_timeout("page_load")):
+                self.logger.warning("ページの読み込み完了を確認できませんでした")
             
+            self.log_page_load_timing()
             self.logger.info("受付システムの読み込みが完了しました")
             return True
             
@@ -314,15 +444,11 @@ class HospitalBookingAutomationV3:
         try:
             page_elements = self.config["page_elements"]["booking_button"]
             
-            for xpath in page_elements:
-                try:
-                    element = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"予約ボタンを発見: {xpath}")
-                    return element
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            element, index = locate_element(self.driver, page_elements, clickable=True, timeout=5, name='booking_button')
+            if element is not None:
+                xpath = page_elements[index]
+                self.logger.info(f"予約ボタンを発見: {xpath}")
+                return element
                     
             self.logger.warning("予約ボタンが見つかりませんでした")
             return None
@@ -336,15 +462,11 @@ class HospitalBookingAutomationV3:
         try:
             page_elements = self.config["page_elements"]["patient_number_input"]
             
-            for xpath in page_elements:
-                try:
-                    element = WebDriverWait(self.driver, 5).until(
-                        EC.presence_of_element_located((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"患者番号入力フィールドを発見: {xpath}")
-                    return element
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            element, index = locate_element(self.driver, page_elements, clickable=False, timeout=5, name='patient_number_input')
+            if element is not None:
+                xpath = page_elements[index]
+                self.logger.info(f"患者番号入力フィールドを発見: {xpath}")
+                return element
                     
             self.logger.warning("患者番号入力フィールドが見つかりませんでした")
             return None
@@ -358,15 +480,11 @@ class HospitalBookingAutomationV3:
         try:
             page_elements = self.config["page_elements"]["birth_date_input"]
             
-            for xpath in page_elements:
-                try:
-                    element = WebDriverWait(self.driver, 5).until(
-                        EC.presence_of_element_located((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"生年月日入力フィールドを発見: {xpath}")
-                    return element
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            element, index = locate_element(self.driver, page_elements, clickable=False, timeout=5, name='birth_date_input')
+            if element is not None:
+                xpath = page_elements[index]
+                self.logger.info(f"生年月日入力フィールドを発見: {xpath}")
+                return element
                     
             self.logger.warning("生年月日入力フィールドが見つかりませんでした")
             return None
@@ -424,15 +542,11 @@ class HospitalBookingAutomationV3:
         try:
             page_elements = self.config["page_elements"]["submit_button"]
             
-            for xpath in page_elements:
-                try:
-                    element = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"送信ボタンを発見: {xpath}")
-                    return element
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            element, index = locate_element(self.driver, page_elements, clickable=True, timeout=5, name='submit_button')
+            if element is not None:
+                xpath = page_elements[index]
+                self.logger.info(f"送信ボタンを発見: {xpath}")
+                return element
                     
             self.logger.warning("送信ボタンが見つかりませんでした")
             return None
@@ -450,11 +564,13 @@ class HospitalBookingAutomationV3:
                 raise Exception("送信ボタンが見つかりませんでした")
                 
             # 送信ボタンをクリック
+            previous_url = self.driver.current_url
             submit_btn.click()
             self.logger.info("予約フォームを送信しました")
             
-            # 送信完了まで待機
-            time.sleep(5)
+            # 送信完了（画面遷移）まで待機
+            if not wait_for_navigation(self.driver, self.step_timeout("submit"), previous_url, submit_btn):
+                self.logger.warning("送信後の画面遷移を確認できませんでした")
             return True
             
         except Exception as e:
@@ -484,14 +600,13 @@ class HospitalBookingAutomationV3:
         if force_analyze:
             self.logger.info("強制解析モード: 受付時間チェックをスキップして解析処理を実行します")
             
-        retry_count = 0
-        max_retries = self.config.get("retry_count", 3)
-        server_error_count = 0  # サーバーエラーの連続発生回数
-        max_server_errors = 2   # サーバーエラーの最大連続発生回数
+        retry = self.retry_policy.begin(self.reception_deadline())
+        max_retries = self.retry_policy.max_attempts
         
-        while retry_count < max_retries:
+        while True:
             try:
-                self.logger.info(f"予約処理を開始します（試行 {retry_count + 1}/{max_retries}）")
+                retry_count = retry.next_attempt()
+                self.logger.info(f"予約処理を開始します（試行 {retry_count}/{max_retries}）")
                 
                 # ドライバー設定
                 self.setup_driver()
@@ -509,8 +624,12 @@ class HospitalBookingAutomationV3:
                     raise Exception("予約ボタンが見つかりませんでした")
                     
                 # 予約ボタンをクリック
+                previous_url = self.driver.current_url
                 booking_button.click()
-                time.sleep(3)
+                
+                # 患者番号入力画面への遷移を待機
+                if not wait_for_navigation(self.driver, self.step_timeout("navigation"), previous_url, booking_button):
+                    self.logger.warning("予約ボタンクリック後の画面遷移を確認できませんでした")
                 
                 # 患者番号入力画面のスクリーンショット
                 self.take_screenshot("patient_number_form.png")
@@ -534,41 +653,24 @@ class HospitalBookingAutomationV3:
                 self.take_screenshot("after_submit.png")
                 
                 self.logger.info("予約処理が完了しました")
+                self.close_driver()
                 return True
                 
             except Exception as e:
-                retry_count += 1
                 self.logger.error(f"予約処理エラー（試行 {retry_count}/{max_retries}）: {e}")
                 
-                # サーバーエラーの場合は特別な処理
-                if "サーバーエラー" in str(e) or "サーバエラー" in str(e):
-                    server_error_count += 1
-                    self.logger.error(f"サーバーエラーが発生しました（連続{server_error_count}回目）")
-                    
-                    if server_error_count >= max_server_errors:
-                        self.logger.error(f"サーバーエラーが{max_server_errors}回連続で発生したため、処理を終了します")
-                        return False
-                    
-                    # サーバーエラー時の待機時間を設定
-                    wait_time = min(300, 60 * server_error_count)  # 最大5分、エラー回数に応じて増加
-                    self.logger.info(f"サーバーエラーが発生したため、{wait_time}秒待機してから再試行します")
-                    time.sleep(wait_time)
-                
                 if self.driver:
                     self.take_screenshot(f"error_screenshot_attempt_{retry_count}.png")
-                    self.driver.quit()
-                    self.driver = None
+                    self.close_driver(discard=True)
                 
-                if retry_count < max_retries:
-                    # 通常のエラーの場合は待機時間を設定
-                    wait_time = 30 * retry_count  # 試行回数に応じて待機時間を増加
-                    self.logger.info(f"{wait_time}秒後にリトライします...")
-                    time.sleep(wait_time)
-                else:
-                    self.logger.error("最大リトライ回数に達しました")
+                # エラーの種類・回数・受付終了時刻から待機時間を決める
+                wait_time, reason = retry.next_delay(e)
+                if wait_time is None:
+                    self.logger.error(f"{reason}ため、処理を終了します")
                     return False
                     
-        return False
+                self.logger.info(f"{wait_time:.0f}秒後にリトライします...（{reason}）")
+                retry.wait(wait_time)
                 
     def schedule_bookings(self):
         """予約スケジュール設定"""
@@ -577,6 +679,14 @@ class HospitalBookingAutomationV3:
                 day = booking_time["day"]
                 time_str = booking_time["time"]
                 
+                # "auto"の場合は待ち人数の履歴から実行時刻を決める
+                if time_str == "auto":
+                    time_str = self.predict_booking_time(
+                        day,
+                        booking_time.get("window", self.booking_hours[day]["web"]),
+                        booking_time.get("fallback_time", "12:05")
+                    )
+                
                 if day == "monday":
                     schedule.every().monday.at(time_str).do(self.execute_booking)
                 elif day == "tuesday":
@@ -595,16 +705,11 @@ class HospitalBookingAutomationV3:
         self.logger.info("スケジューラーを開始しました")
         self.schedule_bookings()
         
-        while True:
-            try:
-                schedule.run_pending()
-                time.sleep(60)  # 1分ごとにチェック
-            except KeyboardInterrupt:
-                self.logger.info("スケジューラーを停止します")
-                break
-            except Exception as e:
-                self.logger.error(f"スケジューラーエラー: {e}")
-                time.sleep(60)
+        # 次の予定の時刻まで待機（Ctrl+C・SIGTERMで停止）
+        waiter = DeadlineWaiter()
+        waiter.install_signal_handlers()
+        waiter.run_schedule()
+        self.logger.info("スケジューラーを停止します")
                 
     def run_once(self):
         """一度だけ実行"""
@@ -631,23 +736,16 @@ class HospitalBookingAutomationV3:
         self.logger.info(f"現在時刻: {datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')}")
         self.logger.info(f"実行予定時刻: {target_time.strftime('%Y年%m月%d日 %H:%M:%S')}")
         
-        while True:
-            try:
-                schedule.run_pending()
-                current_time = datetime.now()
-                
-                # 現在時刻をログに出力（1時間ごと）
-                if current_time.minute == 0:
-                    self.logger.info(f"現在時刻: {current_time.strftime('%Y年%m月%d日 %H:%M:%S')}")
-                
-                time.sleep(60)  # 1分ごとにチェック
-                
-            except KeyboardInterrupt:
-                self.logger.info("スケジューラーを停止します")
-                break
-            except Exception as e:
-                self.logger.error(f"スケジューラーエラー: {e}")
-                time.sleep(60)
+        # 現在時刻をログに出力（1時間ごと）
+        schedule.every().hour.at(":00").do(
+            lambda: self.logger.info(f"現在時刻: {datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')}")
+        )
+        
+        # 次の予定の時刻まで待機（Ctrl+C・SIGTERMで停止）
+        waiter = DeadlineWaiter()
+        waiter.install_signal_handlers()
+        waiter.run_schedule()
+        self.logger.info("スケジューラーを停止します")
 
     def analyze_current_status(self):
         """現在の受付状況を解析"""
@@ -701,14 +799,14 @@ class HospitalBookingAutomationV3:
                 self.logger.warning(f"受付時間情報の検索でエラー: {e}")
             
             self.logger.info("現在の状況の解析が完了しました")
+            self.close_driver()
             return True
             
         except Exception as e:
             self.logger.error(f"状況解析エラー: {e}")
             if self.driver:
                 self.take_screenshot(f"error_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-                self.driver.quit()
-                self.driver = None
+                self.close_driver(discard=True)
             return False
 
     def find_same_day_booking_button(self):
@@ -727,22 +825,18 @@ class HospitalBookingAutomationV3:
                 "//span[contains(text(), '順番受付')]//a"
             ]
             
-            for xpath in same_day_patterns:
-                try:
-                    element = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"順番受付ボタンを発見: {xpath}")
-                    
-                    # 要素の詳細情報をログに出力
-                    button_text = element.text.strip()
-                    button_href = element.get_attribute('href')
-                    button_class = element.get_attribute('class')
-                    self.logger.info(f"ボタンの詳細: テキスト='{button_text}', href='{button_href}', class='{button_class}'")
-                    
-                    return element
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            element, index = locate_element(self.driver, same_day_patterns, clickable=True, timeout=5, name='same_day_booking_button')
+            if element is not None:
+                xpath = same_day_patterns[index]
+                self.logger.info(f"順番受付ボタンを発見: {xpath}")
+                
+                # 要素の詳細情報をログに出力
+                button_text = element.text.strip()
+                button_href = element.get_attribute('href')
+                button_class = element.get_attribute('class')
+                self.logger.info(f"ボタンの詳細: テキスト='{button_text}', href='{button_href}', class='{button_class}'")
+                
+                return element
                     
             self.logger.warning("順番受付ボタンが見つかりませんでした")
             return None
@@ -773,29 +867,25 @@ class HospitalBookingAutomationV3:
                 "//div[contains(text(), '受付')]//a"
             ]
             
-            for xpath in reception_patterns:
-                try:
-                    element = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"受付中ボタンを発見: {xpath}")
-                    
-                    # 要素の詳細情報をログに出力
-                    button_text = element.text.strip()
-                    button_href = element.get_attribute('href') if element.tag_name == 'a' else 'N/A'
-                    button_tag = element.tag_name
-                    button_id = element.get_attribute('id') or 'N/A'
-                    button_name = element.get_attribute('name') or 'N/A'
-                    
-                    self.logger.info(f"受付中ボタンの詳細: タグ={button_tag}, テキスト='{button_text}', href='{button_href}', id='{button_id}', name='{button_name}'")
-                    
-                    # URLパターンの確認
-                    if button_href and 'rsvmodM02' in button_href:
-                        self.logger.info("✅ 正しい受付ボタン（rsvmodM02）を発見しました！")
-                    
-                    return element
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            element, index = locate_element(self.driver, reception_patterns, clickable=True, timeout=5, name='reception_button')
+            if element is not None:
+                xpath = reception_patterns[index]
+                self.logger.info(f"受付中ボタンを発見: {xpath}")
+                
+                # 要素の詳細情報をログに出力
+                button_text = element.text.strip()
+                button_href = element.get_attribute('href') if element.tag_name == 'a' else 'N/A'
+                button_tag = element.tag_name
+                button_id = element.get_attribute('id') or 'N/A'
+                button_name = element.get_attribute('name') or 'N/A'
+                
+                self.logger.info(f"受付中ボタンの詳細: タグ={button_tag}, テキスト='{button_text}', href='{button_href}', id='{button_id}', name='{button_name}'")
+                
+                # URLパターンの確認
+                if button_href and 'rsvmodM02' in button_href:
+                    self.logger.info("✅ 正しい受付ボタン（rsvmodM02）を発見しました！")
+                
+                return element
                     
             self.logger.warning("受付中ボタンが見つかりませんでした")
             return None
@@ -820,6 +910,7 @@ class HospitalBookingAutomationV3:
                     wait_count = element.text.strip()
                     if wait_count.isdigit():
                         self.logger.info(f"現在の待ち人数: {wait_count}人")
+                        self.record_wait_count(int(wait_count), source='selenium')
                         return int(wait_count)
                 except (NoSuchElementException, Exception):
                     continue
@@ -831,11 +922,108 @@ class HospitalBookingAutomationV3:
             self.logger.error(f"待ち人数取得エラー: {e}")
             return None
     
+    def record_wait_count(self, wait_count, source):
+        """取得した待ち人数を時系列に記録（失敗しても予約処理は継続）"""
+        try:
+            (self.wait_count_store or get_wait_count_store()).add_sample(wait_count, source=source)
+        except Exception as e:
+            self.logger.warning(f"待ち人数の記録エラー: {e}")
+    
+    def build_request_headers(self):
+        """requestsでアクセスする際のヘッダー（手動ブラウザと同じ）"""
+        return {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+            'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'none',
+            'Sec-Fetch-User': '?1',
+            'Cache-Control': 'max-age=0'
+        }
+    
+    def fetch_waiting_count_lightweight(self):
+        """トップページから順番受付ページを辿って待ち人数のみを取得（Selenium不使用）"""
+        import re
+        
+        top_url = self.top_url
+        headers = self.build_request_headers()
+        
+        # 予約用のセッションに影響しないよう専用のセッションを使用（送信は予約処理と共通の制限で調整）
+        governor = get_request_governor()
+        with requests.Session() as session:
+            response = governor.get(session, top_url, headers=headers, timeout=30)
+            response.raise_for_status()
+            
+            reception_link_match = re.search(r'href="([^"]*nj=rsvmodG01[^"]*)"', response.text)
+            if not reception_link_match:
+                self.logger.warning("順番受付(当日外来)リンクが見つかりません")
+                return None
+            
+            reception_link = reception_link_match.group(1)
+            if not reception_link.startswith('http'):
+                reception_link = f"{self.reservation_base_url}jsp/" + reception_link
+            
+            headers['Referer'] = top_url
+            headers['Sec-Fetch-Site'] = 'cross-site'
+            reception_response = governor.get(session, reception_link, headers=headers, timeout=30)
+            reception_response.raise_for_status()
+        
+        return parse_wait_count(reception_response.text)
+    
+    def predict_booking_time(self, day, window, fallback_time):
+        """待ち人数の履歴から時間帯内で最も空いている時刻を推定（推定できない場合はfallback_time）"""
+        if '-' not in window:
+            return fallback_time
+        
+        try:
+            start_str, end_str = window.split('-')
+            prediction = get_wait_count_predictor().predict_best_time(day, start_str, end_str)
+        except Exception as e:
+            self.logger.warning(f"予約時刻の推定エラー: {e}")
+            return fallback_time
+        
+        if prediction is None:
+            self.logger.info(f"{day} {window}の待ち人数の履歴が不足しているため、{fallback_time}に実行します")
+            return fallback_time
+        
+        time_str, expected = prediction
+        self.logger.info(f"{day} {window}で最も空いている時刻を{time_str}と推定しました（予測待ち人数: {expected:.1f}人）")
+        return time_str
+    
+    def predict_remaining_minimum(self):
+        """現在の受付時間帯の残りで予測される最小の待ち人数"""
+        now = datetime.now().replace(second=0, microsecond=0)
+        day = now.strftime("%A").lower()
+        
+        for period in ("morning", "afternoon"):
+            if not self.reception_calendar.is_open(now, period):
+                continue
+            _, end = self.reception_calendar.next_window(now, period)
+            try:
+                return get_wait_count_predictor().predict_remaining_minimum(day, now.strftime('%H:%M'), end.strftime('%H:%M'))
+            except Exception as e:
+                self.logger.warning(f"待ち人数の予測エラー: {e}")
+                return None
+        return None
+    
     def check_optimal_booking_time(self):
         """最適な予約タイミングをチェック"""
         try:
             wait_count = self.get_waiting_count()
             if wait_count is not None:
+                # 履歴がある場合は、この後に見込める最小の待ち人数と比較して判断
+                expected_minimum = self.predict_remaining_minimum()
+                if expected_minimum is not None:
+                    if wait_count <= expected_minimum + 2:
+                        self.logger.info(f"待ち人数が{wait_count}人（この後の予測最小値: {expected_minimum:.1f}人）のため、予約処理を実行します")
+                        return True
+                    self.logger.info(f"待ち人数が{wait_count}人（この後の予測最小値: {expected_minimum:.1f}人）のため、少し待機します")
+                    return False
+                
                 if wait_count <= 10:
                     self.logger.info(f"待ち人数が{wait_count}人と少ないため、予約処理を実行します")
                     return True
@@ -850,677 +1038,882 @@ class HospitalBookingAutomationV3:
             self.logger.error(f"最適タイミングチェックエラー: {e}")
             return True
 
-    def execute_same_day_booking(self):
-        """当日外来の予約を実行"""
+    def execute_same_day_booking(self, start_step='top', start_url=None, cookies=None):
+        """当日外来の予約を実行
+        
+        start_stepに'reception'（順番受付ページ）または'form'（受付フォーム）を指定すると、
+        軽量版から引き継いだstart_urlとクッキーで途中の手順から実行する
+        """
         try:
             self.logger.info("=== 当日外来予約開始 ===")
             
             # ドライバーの初期化
-            if not self.setup_driver():
+            with track_step('acquire_driver', 'selenium'):
+                driver_ready = self.setup_driver()
+            if not driver_ready:
                 self.logger.error("ドライバーの初期化に失敗")
                 return False
             
             self.logger.info("ドライバーの初期化完了")
             
-            # TOPページから開始
-            if not self.navigate_to_booking_page():
-                self.logger.error("TOPページへの移動に失敗")
-                return False
-            
-            self.logger.info("TOPページに移動完了")
-            
-            # 順番受付ボタンを探してクリック
-            same_day_button = self.find_same_day_booking_button()
-            if not same_day_button:
-                self.logger.error("順番受付ボタンが見つかりませんでした")
-                return False
-            
-            self.logger.info("順番受付ボタンを発見、クリック準備中...")
-            
-            # ボタンの詳細情報をログ出力
-            button_text = same_day_button.text.strip()
-            button_href = same_day_button.get_attribute('href')
-            button_class = same_day_button.get_attribute('class')
-            self.logger.info(f"順番受付ボタン詳細: テキスト='{button_text}', href='{button_href}', class='{button_class}'")
-            
-            # ボタンがクリック可能か確認
-            try:
-                WebDriverWait(self.driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, f"//a[contains(text(), '{button_text}')]"))
-                )
-                self.logger.info("順番受付ボタンがクリック可能状態です")
-            except TimeoutException:
-                self.logger.warning("順番受付ボタンがクリック可能状態ではありません")
-            
-            # スクロールしてボタンを画面中央に
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", same_day_button)
-            time.sleep(1)
-            
-            # ボタンをクリック
-            try:
-                same_day_button.click()
-                self.logger.info("順番受付ボタンをクリックしました")
-            except Exception as e:
-                self.logger.error(f"順番受付ボタンクリックエラー: {e}")
-                # JavaScriptでクリックを試行
-                try:
-                    self.driver.execute_script("arguments[0].click();", same_day_button)
-                    self.logger.info("JavaScriptで順番受付ボタンをクリックしました")
-                except Exception as js_e:
-                    self.logger.error(f"JavaScriptクリックも失敗: {js_e}")
-                    return False
-            
-            # ページ遷移を待機
-            time.sleep(3)
-            
-            # クリック後のURLを確認
-            current_url = self.driver.current_url
-            self.logger.info(f"クリック後のURL: {current_url}")
-            
-            # 受付中ボタンを探す
-            self.logger.info("受付中ボタンの検索開始...")
-            reception_button = self.find_reception_button()
-            
-            if not reception_button:
-                self.logger.error("受付中ボタンが見つかりませんでした")
-                # 現在のページのHTMLを保存して調査
-                self.save_page_content("reception_page_after_click")
-                return False
-            
-            self.logger.info("受付中ボタンを発見しました！")
-            
-            # 受付中ボタンの詳細情報をログ出力
-            button_text = reception_button.text.strip()
-            button_href = reception_button.get_attribute('href') if reception_button.tag_name == 'a' else 'N/A'
-            button_tag = reception_button.tag_name
-            self.logger.info(f"受付中ボタン詳細: タグ={button_tag}, テキスト='{button_text}', href='{button_href}'")
-            
-            # 受付中ボタンがクリック可能か確認
-            try:
-                WebDriverWait(self.driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, f"//{button_tag}[contains(text(), '{button_text}')]"))
-                )
-                self.logger.info("受付中ボタンがクリック可能状態です")
-            except TimeoutException:
-                self.logger.warning("受付中ボタンがクリック可能状態ではありません")
-            
-            # スクロールしてボタンを画面中央に
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", reception_button)
-            time.sleep(1)
-            
-            # 受付中ボタンをクリック
-            try:
-                reception_button.click()
-                self.logger.info("受付中ボタンをクリックしました")
-            except Exception as e:
-                self.logger.error(f"受付中ボタンクリックエラー: {e}")
-                # JavaScriptでクリックを試行
-                try:
-                    self.driver.execute_script("arguments[0].click();", reception_button)
-                    self.logger.info("JavaScriptで受付中ボタンをクリックしました")
-                except Exception as js_e:
-                    self.logger.error(f"JavaScriptクリックも失敗: {js_e}")
+            if start_url:
+                # 軽量版のセッションを引き継いで同じページを開く
+                with track_step('resume_session', 'selenium'):
+                    resumed = self.resume_browser_session(start_url, cookies)
+                if not resumed:
+                    self.logger.error("引き継いだページへの移動に失敗")
                     return False
-            
-            # ページ遷移を待機
-            time.sleep(3)
-            
-            # クリック後のURLを確認
-            current_url = self.driver.current_url
-            self.logger.info(f"受付中ボタンクリック後のURL: {current_url}")
-            
-            # 受付フォームが表示されているか確認
-            if "rsvmodM02" in current_url:
-                self.logger.info("受付フォームページに移動しました")
-                
-                # 受付フォームに患者情報を入力
-                if not self.fill_reception_form():
-                    self.logger.error("受付フォームの入力に失敗")
+            else:
+                # TOPページから開始
+                with track_step('top_page', 'selenium'):
+                    navigated = self.navigate_to_booking_page()
+                if not navigated:
+                    self.logger.error("TOPページへの移動に失敗")
                     return False
                 
-                # 確定ボタンを探してクリック
-                confirm_button = self.find_confirm_button()
-                if not confirm_button:
-                    self.logger.error("確定ボタンが見つかりませんでした")
+                self.logger.info("TOPページに移動完了")
+                self.report_progress('top_page_fetched', engine='selenium')
+            
+            if start_step == 'top':
+                with track_step('reception_page', 'selenium'):
+                    clicked = self.click_same_day_booking_button()
+                if not clicked:
                     return False
-                
-                self.logger.info("確定ボタンを発見、クリック準備中...")
-                
-                # 確認画面から確定ボタンを探して予約を完了させる
-                self.logger.info("確認画面から確定ボタンを探して予約を完了させます")
-                
-                # 確認画面のHTMLを保存
-                with open(f"confirmation_page_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html", "w", encoding="utf-8") as f:
-                    f.write(submit_response.text)
-                
-                # 確認画面で予約完了のための正しい処理を実行
-                self.logger.info("確認画面で予約完了のための正しい処理を実行します")
-                
-                # 手動で正常に動作する場合、確認画面で特定の条件を満たすと予約が完了する
-                # 確認画面のフォームを正しいデータで送信
-                form_action = "../jsp/rsvmodM04.jsp"
-                form_method = "post"
-                
-                self.logger.info(f"確認画面のフォーム: action={form_action}, method={form_method}")
-                
-                # フォームのaction URLを絶対パスに変換
-                if form_action.startswith('../'):
-                    base_url = "https://www4.tandt.co.jp/rsvsys/"
-                    full_form_action = base_url + form_action[3:]
-                elif form_action.startswith('./'):
-                    base_url = "https://www4.tandt.co.jp/rsvsys/jsp/"
-                    full_form_action = base_url + form_action[2:]
-                elif not form_action.startswith('http'):
-                    base_url = "https://www4.tandt.co.jp/rsvsys/jsp/"
-                    full_form_action = base_url + form_action
-                else:
-                    full_form_action = form_action
-                
-                self.logger.info(f"確認画面フォームの完全なaction URL: {full_form_action}")
-                
-                # 確認画面のフォームデータを準備（患者情報を含む）
-                confirm_form_data = {
-                    'pNo': patient_data['patient_number'],  # 患者番号
-                    'pBDayMM': birth_month,  # 誕生月
-                    'pBDayDD': birth_day,    # 誕生日
-                }
-                
-                # 隠しフィールドの値を追加
-                for name, value in hidden_fields.items():
-                    confirm_form_data[name] = value
-                
-                self.logger.info(f"確認画面フォームの送信データ: {confirm_form_data}")
-                
-                # ヘッダーを更新
-                headers['Referer'] = full_action
-                headers['Sec-Fetch-Site'] = 'same-site'
-                headers['Sec-Fetch-Mode'] = 'navigate'
-                headers['Sec-Fetch-Dest'] = 'document'
-                
-                # 確認画面のフォームを送信
-                if form_method.lower() == 'post':
-                    confirm_response = self.session.post(full_form_action, data=confirm_form_data, headers=headers, timeout=30)
-                else:
-                    confirm_response = self.session.get(full_form_action, params=confirm_form_data, headers=headers, timeout=30)
-                
-                confirm_response.raise_for_status()
-                
-                self.logger.info(f"確認画面フォーム送信完了（サイズ: {len(confirm_response.text)}文字）")
-                
-                # 確定結果を保存
-                with open(f"confirmation_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html", "w", encoding="utf-8") as f:
-                    f.write(confirm_response.text)
-                
-                # 確定結果を確認
-                if "完了" in confirm_response.text or "予約完了" in confirm_response.text or "受付完了" in confirm_response.text:
-                    self.logger.info("🎉 予約が完了しました！")
-                    return True
-                elif "エラー" in confirm_response.text or "失敗" in confirm_response.text:
-                    self.logger.error("確定処理でエラーが発生しました")
-                    self.logger.error(f"確定結果の内容: {confirm_response.text[:200]}...")
+            
+            if start_step in ('top', 'reception'):
+                with track_step('reception_form', 'selenium'):
+                    clicked = self.click_reception_button()
+                if not clicked:
                     return False
-                else:
-                    self.logger.warning("確定処理は完了しましたが、結果の確認が必要です")
-                    self.logger.info(f"確定結果の内容: {confirm_response.text[:200]}...")
-                    return True
-            else:
-                self.logger.error(f"受付フォームページに移動できませんでした。現在のURL: {current_url}")
-                return False
+            
+            with track_step('submit', 'selenium'):
+                return self.submit_reception_form()
                 
         except Exception as e:
             self.logger.error(f"当日外来予約エラー: {e}")
             return False
         finally:
-            # ドライバーのクリーンアップ
-            if self.driver:
-                self.driver.quit()
-                self.driver = None
+            # ドライバーをプールに返却
+            self.close_driver()
+    
+    def resume_browser_session(self, url, cookies=None):
+        """requestsのクッキーをブラウザに設定し、指定URLを開く"""
+        cookies = list(cookies or [])
+        for cookie in cookies:
+            params = {
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path or '/',
+                'secure': bool(cookie.secure),
+                'httpOnly': cookie.has_nonstandard_attr('HttpOnly')
+            }
+            if cookie.expires:
+                params['expires'] = cookie.expires
+            self.driver.execute_cdp_cmd('Network.setCookie', params)
+        
+        self.logger.info(f"軽量版のセッションを引き継ぎました（クッキー: {len(cookies)}件）: {url}")
+        with get_request_governor().slot(url):
+            self.driver.get(url)
+        
+        if not wait_for_document_ready(self.driver, self.step_timeout("page_load")):
+            self.logger.warning("ページの読み込み完了を確認できませんでした")
+            return False
+        
+        self.log_page_load_timing()
+        return True
+    
+    def click_same_day_booking_button(self):
+        """TOPページの順番受付(当日外来)ボタンをクリック"""
+        # 順番受付ボタンを探してクリック
+        same_day_button = self.find_same_day_booking_button()
+        if not same_day_button:
+            self.logger.error("順番受付ボタンが見つかりませんでした")
+            return False
+        
+        self.logger.info("順番受付ボタンを発見、クリック準備中...")
+        
+        # ボタンの詳細情報をログ出力
+        button_text = same_day_button.text.strip()
+        button_href = same_day_button.get_attribute('href')
+        button_class = same_day_button.get_attribute('class')
+        self.logger.info(f"順番受付ボタン詳細: テキスト='{button_text}', href='{button_href}', class='{button_class}'")
+        
+        # ボタンがクリック可能か確認
+        try:
+            WebDriverWait(self.driver, 10).until(
+                EC.element_to_be_clickable((By.XPATH, f"//a[contains(text(), '{button_text}')]"))
+            )
+            self.logger.info("順番受付ボタンがクリック可能状態です")
+        except TimeoutException:
+            self.logger.warning("順番受付ボタンがクリック可能状態ではありません")
+        
+        # スクロールしてボタンを画面中央に
+        self.driver.execute_script("arguments[0].scrollIntoView(true);", same_day_button)
+        
+        # ボタンをクリック
+        previous_url = self.driver.current_url
+        try:
+            same_day_button.click()
+            self.logger.info("順番受付ボタンをクリックしました")
+        except Exception as e:
+            self.logger.error(f"順番受付ボタンクリックエラー: {e}")
+            # JavaScriptでクリックを試行
+            try:
+                self.driver.execute_script("arguments[0].click();", same_day_button)
+                self.logger.info("JavaScriptで順番受付ボタンをクリックしました")
+            except Exception as js_e:
+                self.logger.error(f"JavaScriptクリックも失敗: {js_e}")
+                return False
+        
+        # ページ遷移を待機
+        if not wait_for_navigation(self.driver, self.step_timeout("navigation"), previous_url, same_day_button):
+            self.logger.warning("順番受付ボタンクリック後の画面遷移を確認できませんでした")
+        
+        # クリック後のURLを確認
+        current_url = self.driver.current_url
+        self.logger.info(f"クリック後のURL: {current_url}")
+        
+        return True
+    
+    def click_reception_button(self):
+        """順番受付ページの受付中ボタンをクリック"""
+        # 受付中ボタンを探す
+        self.logger.info("受付中ボタンの検索開始...")
+        reception_button = self.find_reception_button()
+        
+        if not reception_button:
+            self.logger.error("受付中ボタンが見つかりませんでした")
+            # 現在のページのHTMLを保存して調査
+            self.save_page_content("reception_page_after_click")
+            return False
+        
+        self.logger.info("受付中ボタンを発見しました！")
+        self.report_progress('reception_reached', engine='selenium')
+        
+        # 受付中ボタンの詳細情報をログ出力
+        button_text = reception_button.text.strip()
+        button_href = reception_button.get_attribute('href') if reception_button.tag_name == 'a' else 'N/A'
+        button_tag = reception_button.tag_name
+        self.logger.info(f"受付中ボタン詳細: タグ={button_tag}, テキスト='{button_text}', href='{button_href}'")
+        
+        # 受付中ボタンがクリック可能か確認
+        try:
+            WebDriverWait(self.driver, 10).until(
+                EC.element_to_be_clickable((By.XPATH, f"//{button_tag}[contains(text(), '{button_text}')]"))
+            )
+            self.logger.info("受付中ボタンがクリック可能状態です")
+        except TimeoutException:
+            self.logger.warning("受付中ボタンがクリック可能状態ではありません")
+        
+        # スクロールしてボタンを画面中央に
+        self.driver.execute_script("arguments[0].scrollIntoView(true);", reception_button)
+        
+        # 受付中ボタンをクリック
+        previous_url = self.driver.current_url
+        try:
+            reception_button.click()
+            self.logger.info("受付中ボタンをクリックしました")
+        except Exception as e:
+            self.logger.error(f"受付中ボタンクリックエラー: {e}")
+            # JavaScriptでクリックを試行
+            try:
+                self.driver.execute_script("arguments[0].click();", reception_button)
+                self.logger.info("JavaScriptで受付中ボタンをクリックしました")
+            except Exception as js_e:
+                self.logger.error(f"JavaScriptクリックも失敗: {js_e}")
+                return False
+        
+        # 受付フォームへの遷移と入力欄の表示を待機
+        if not wait_for_navigation(self.driver, self.step_timeout("navigation"), previous_url, reception_button):
+            self.logger.warning("受付中ボタンクリック後の画面遷移を確認できませんでした")
+        if wait_for_any_element(self.driver, RECEPTION_FORM_MARKERS, self.step_timeout("reception_form")) is None:
+            self.logger.warning("受付フォームの入力欄を確認できませんでした")
+        
+        # クリック後のURLを確認
+        current_url = self.driver.current_url
+        self.logger.info(f"受付中ボタンクリック後のURL: {current_url}")
+        
+        return True
+    
+    def submit_reception_form(self):
+        """受付フォームに入力し、確認画面で受付を確定"""
+        current_url = self.driver.current_url
+        
+        # 受付フォームが表示されているか確認
+        if "rsvmodM02" not in current_url and "rsvmodM04" not in current_url:
+            self.logger.error(f"受付フォームページに移動できませんでした。現在のURL: {current_url}")
+            return False
+        
+        self.logger.info("受付フォームページに移動しました")
+        
+        # 受付フォームに患者情報を入力
+        if not self.fill_reception_form():
+            self.logger.error("受付フォームの入力に失敗")
+            return False
+        
+        # 確定ボタンを探してクリック
+        confirm_button = self.find_confirm_button()
+        if not confirm_button:
+            self.logger.error("確定ボタンが見つかりませんでした")
+            return False
+        
+        self.logger.info("確定ボタンを発見、クリック準備中...")
+        
+        previous_url = self.driver.current_url
+        confirm_button.click()
+        self.report_progress('submitted', engine='selenium')
+        
+        if not wait_for_navigation(self.driver, self.step_timeout("submit"), previous_url, confirm_button):
+            self.logger.warning("確定ボタンクリック後の画面遷移を確認できませんでした")
+        
+        # 確認画面のHTMLを保存
+        self.save_snapshot("confirmation_page", self.driver.page_source)
+        
+        # 確認画面から「受付する」ボタンを探して予約を完了させる
+        self.logger.info("確認画面から「受付する」ボタンを探して予約を完了させます")
+        accept_button, index = locate_element(self.driver, ACCEPT_BUTTON_PATTERNS, clickable=True, timeout=self.step_timeout("reception_form"), name='accept_button')
+        if accept_button is None:
+            self.logger.error("確認画面の「受付する」ボタンが見つかりませんでした")
+            self.save_page_content("accept_button_not_found")
+            return False
+        
+        self.logger.info(f"「受付する」ボタンを発見: {ACCEPT_BUTTON_PATTERNS[index]}")
+        previous_url = self.driver.current_url
+        accept_button.click()
+        
+        if not wait_for_navigation(self.driver, self.step_timeout("submit"), previous_url, accept_button):
+            self.logger.warning("「受付する」ボタンクリック後の画面遷移を確認できませんでした")
+        
+        result_html = self.driver.page_source
+        
+        # 確定結果を保存
+        self.save_snapshot("confirmation_result", result_html)
+        
+        # 確定結果を確認
+        if "完了" in result_html:
+            self.logger.info("🎉 予約が完了しました！")
+            self.report_progress('confirmed', engine='selenium')
+            return True
+        elif "エラー" in result_html or "失敗" in result_html:
+            self.logger.error("確定処理でエラーが発生しました")
+            self.report_progress('failed', reason='確定処理でエラーが発生しました')
+            return False
+        else:
+            self.logger.warning("確定処理は完了しましたが、結果の確認が必要です")
+            self.report_progress('confirmed', engine='selenium', needs_review=True)
+            return True
 
     def run_force_analyze(self):
         """強制的に解析処理を実行"""
         self.logger.info("強制解析モードで解析処理を開始します")
         return self.execute_same_day_booking()
 
-    def execute_lightweight_booking(self):
-        """軽量版の自動予約処理（Selenium不使用）"""
-        self.logger.info("軽量版の自動予約処理を開始します")
+    def reception_deadline(self, now=None):
+        """受付中の時間帯（午前・午後・Web）の終了時刻（受付時間外はNone）"""
+        now = now or datetime.now()
+        deadlines = []
+        for kind in ('morning', 'afternoon', 'web'):
+            if self.reception_calendar.is_open(now, kind):
+                _, end = self.reception_calendar.next_window(now, kind)
+                deadlines.append(end)
+        return max(deadlines) if deadlines else None
+    
+    def send_step(self, retry, step, method, url, **kwargs):
+        """手順のリクエストを送信（一時的なエラー・サーバーエラーのページはこの手順だけ再送、POSTは送信が届いていない場合のみ）"""
+        def send():
+            response = self.timed_request(step, method, url, **kwargs)
+            response.raise_for_status()
+            if is_server_error_response(response):
+                raise ServerErrorPage(step, response)
+            return response
         
-        max_retries = 3  # 最大リトライ回数を3回に制限
-        retry_count = 0
-        server_error_count = 0  # サーバーエラーの連続発生回数
-        max_server_errors = 2   # サーバーエラーの最大連続発生回数
+        def on_retry(step, attempt, wait_time, error):
+            self.logger.warning(f"{step}の送信に失敗しました（{attempt}/{self.retry_policy.step_attempts}）: {error}")
+            if isinstance(error, ServerErrorPage):
+                # エラーの詳細を分析
+                self.logger.error(f"送信したURL: {url}")
+                self.logger.debug("送信したデータ: %s", kwargs.get('data') or kwargs.get('params'))
+                self.logger.error(f"レスポンスサイズ: {len(error.response.text)}文字")
+                self.logger.debug("レスポンス内容: %s", error.response.text)
+                self.logger.debug("レスポンスヘッダー: %s", error.response.headers)
+            self.logger.info(f"{wait_time:.1f}秒後に{step}を再送します")
+            self.report_progress('retrying', reason=str(error), failed_step=step, wait_seconds=round(wait_time, 1))
+            
+        return retry.run_step(step, send, idempotent=method.upper() == 'GET', on_retry=on_retry)
+    
+    def timed_request(self, step, method, url, **kwargs):
+        """セッションでリクエストを送信し、所要時間を手順ごとに記録（送信間隔・同時接続数はプロセス全体で調整）"""
+        with track_step(step, self.metrics_engine):
+            response = get_request_governor().request(self.session, method, url, **kwargs)
+        # 接続からレスポンスヘッダー受信までの時間（本文の受信時間と分けて確認するため）
+        get_metrics_registry().observe(f"{step}_headers", self.metrics_engine, response.elapsed.total_seconds())
+        return response
+    
+    def book(self):
+        """自動予約処理（軽量版で実行し、解析できない手順のみブラウザで続行）"""
+        # 画面から更新された患者情報を反映
+        self.patient_data = {
+            'patient_number': self.config['patient_info']['patient_number'],
+            'birth_date': datetime.strptime(self.config['patient_info']['birth_date'], '%Y-%m-%d')
+        }
         
-        while retry_count < max_retries:
+        self.handoff_enabled = True
+        try:
+            with track_step('total', 'lightweight'):
+                state = self.load_checkpoint()
+                return self.execute_lightweight_booking(state, resumed=state is not None)
+        except BrowserHandoff as handoff:
+            self.logger.warning(f"軽量版で解析できなかったため、ブラウザで続行します（手順: {handoff.step}）: {handoff.reason}")
+            self.report_progress('handoff', handoff_step=handoff.step, reason=handoff.reason)
+            with track_step('total', 'selenium'):
+                return self.execute_same_day_booking(start_step=handoff.step, start_url=handoff.url, cookies=self.session.cookies)
+        finally:
+            self.handoff_enabled = False
+            # 終了した予約処理の状態は再開しないため削除
+            if self.checkpoint_key:
+                get_booking_checkpoint_store().delete(self.checkpoint_key)
+    
+    def book_batch(self, patients):
+        """複数の患者（家族）を続けて予約し、患者ごとの結果を返す
+
+        トップページ・順番受付ページへの移動は最初の1人分だけ行い、2人目以降は同じセッションで受付フォームから送信する
+        （受付フォームの家族情報フィールドは使い方を確認できていないため使わず、1人ずつ送信する）
+        """
+        results = []
+        navigation = None
+        
+        for index, patient in enumerate(patients):
+            patient = {'patient_number': str(patient['patient_number']), 'birth_date': patient['birth_date']}
+            self.logger.info(f"家族の予約 {index + 1}/{len(patients)} を開始します")
+            self.report_progress('batch_patient', index=index + 1, total=len(patients))
+            
+            state = BookingState(patient=patient)
+            if navigation is not None:
+                # 前の患者と同じセッションで受付フォームから続ける
+                state.urls = dict(navigation['urls'])
+                state.cookies = navigation['cookies']
+                state.wait_count = navigation['wait_count']
+                state.step = booking_state.FORM
+            
+            started = time.perf_counter()
             try:
-                retry_count += 1
-                self.logger.info(f"試行 {retry_count}/{max_retries}")
-                
-                # セッションをリセット（毎回新しいセッションで開始）
-                self.session = requests.Session()
-                
-                # まずトップページから開始
-                top_url = "https://www5.tandt.co.jp/cti/hs713/index_p.html"
-                self.logger.info(f"トップページにアクセス: {top_url}")
-                
-                # ヘッダーを設定（手動ブラウザと完全に同じ）
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-                    'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Sec-Fetch-Dest': 'document',
-                    'Sec-Fetch-Mode': 'navigate',
-                    'Sec-Fetch-Site': 'none',
-                    'Sec-Fetch-User': '?1',
-                    'Cache-Control': 'max-age=0'
+                with track_step('total', 'lightweight'):
+                    success = self.execute_lightweight_booking(state)
+            except Exception as e:
+                self.logger.error(f"家族の予約エラー（{index + 1}/{len(patients)}）: {e}")
+                success = False
+                state.reason = str(e)
+            
+            results.append({
+                'patient_number': patient['patient_number'],
+                'success': success,
+                'needs_review': state.needs_review,
+                'reason': state.reason,
+                'wait_count': state.wait_count,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+            })
+            
+            # 受付フォームまでの移動結果を次の患者に引き継ぐ
+            if all(name in state.urls for name in ('top', 'reception', 'form')):
+                navigation = {
+                    'urls': {name: state.urls[name] for name in ('top', 'reception', 'form')},
+                    'cookies': cookies_to_list(self.session.cookies),
+                    # 2人目以降は順番受付ページを取得しないため、最初に取得した待ち人数を使う
+                    'wait_count': state.wait_count
                 }
+            else:
+                navigation = None
+        
+        succeeded = sum(1 for result in results if result['success'])
+        self.logger.info(f"家族の予約が終了しました（成功: {succeeded}/{len(patients)}）")
+        return results
+    
+    def dry_run_booking(self):
+        """送信の直前（トップページ → 順番受付ページ → 受付フォーム）まで実行し、送信データを検証する（予約は送信しない）
+
+        手順ごとの所要時間と、必須フィールドの有無・想定外の値を返す（定期的な動作確認用）
+        status: 'ok'（問題なし）・'reception_closed'（受付時間外・休診で確認できない）・'failed'
+        """
+        self.logger.info("送信しない確認（ドライラン）を開始します")
+        
+        handlers = {
+            booking_state.TOP: self.booking_step_top,
+            booking_state.RECEPTION: self.booking_step_reception,
+            booking_state.FORM: self.booking_step_form
+        }
+        state = BookingState()
+        retry = self.retry_policy.begin(None)
+        steps = []
+        reason = None
+        
+        handoff_enabled, metrics_engine = self.handoff_enabled, self.metrics_engine
+        self.handoff_enabled = False
+        self.metrics_engine = 'dry_run'
+        self.session = state.session()
+        started = time.perf_counter()
+        try:
+            # 送信（SUBMIT）以降の手順は実行しない
+            while state.step in handlers:
+                step = state.step
+                step_started = time.perf_counter()
+                try:
+                    handlers[step](state, retry)
+                    ok = not state.finished
+                    reason = state.reason
+                except Exception as e:
+                    ok = False
+                    reason = str(e)
+                steps.append({'step': step, 'ok': ok, 'duration_ms': round((time.perf_counter() - step_started) * 1000, 1)})
+                if not ok:
+                    break
+        finally:
+            self.handoff_enabled, self.metrics_engine = handoff_enabled, metrics_engine
+        
+        report = {
+            'checked_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'status': 'failed',
+            'reached_submit': state.step == booking_state.SUBMIT,
+            'reception_status': state.reception_status,
+            'steps': steps,
+            'total_ms': round((time.perf_counter() - started) * 1000, 1),
+            'wait_count': state.wait_count,
+            'action': state.urls.get('action'),
+            'missing_fields': [],
+            'unexpected_values': {},
+            'defaulted_fields': [],
+            'reason': reason
+        }
+        
+        if report['reached_submit']:
+            # 送信データの検証（ページから取得した値と既定値で補った値を区別する）
+            report['missing_fields'] = [name for name in REQUIRED_FORM_FIELDS if name not in state.hidden_fields]
+            report['unexpected_values'] = {
+                name: state.form_data.get(name) for name, expected in EXPECTED_FORM_VALUES.items()
+                if state.form_data.get(name) != expected
+            }
+            report['defaulted_fields'] = [name for name in LIGHTWEIGHT_FORM_DEFAULTS if name not in state.hidden_fields]
+            report['form_fields'] = sorted(state.form_data)
+            if report['missing_fields']:
+                reason = f"受付フォームに必須フィールドがありません: {', '.join(report['missing_fields'])}"
+            elif report['unexpected_values']:
+                reason = f"受付フォームのフィールドの値が想定と異なります: {report['unexpected_values']}"
+            report['reason'] = reason
+        
+        report['success'] = report['reached_submit'] and not report['missing_fields'] and not report['unexpected_values']
+        if report['success']:
+            report['status'] = 'ok'
+        elif state.reception_status in RECEPTION_CLOSED_STATUSES:
+            # 受付時間外・休診は確認できなかっただけで失敗ではない
+            report['status'] = 'reception_closed'
+        
+        timings = ', '.join(f"{step['step']}={step['duration_ms']}ms" for step in steps)
+        if report['status'] == 'ok':
+            self.logger.info(f"ドライラン成功: 送信の直前まで到達しました（{timings}）")
+        elif report['status'] == 'reception_closed':
+            self.logger.info(f"ドライラン: 受付時間外のため受付フォームを確認できませんでした（受付状況: {state.reception_status}、{timings}）")
+        else:
+            self.logger.error(f"ドライラン失敗: {report['reason']}（{timings}）")
+        return report
+    
+    def execute_lightweight_booking(self, state=None, resumed=False):
+        """軽量版の自動予約処理（Selenium不使用）
+
+        手順（TOP → RECEPTION → FORM → SUBMIT → CONFIRM → DONE）ごとに状態を進め、
+        エラー時は失敗した手順から再開する（同じ手順で2回失敗した場合はトップページからやり直す）
+        送信・確定の手順は、送信が届いていないことが確実なエラーの場合のみ再開する
+        stateを指定するとその手順から実行する（resumed=Trueは保存済みの状態からの再開）
+        """
+        self.logger.info("軽量版の自動予約処理を開始します")
+        
+        retry = self.retry_policy.begin(self.reception_deadline())
+        max_retries = self.retry_policy.max_attempts
+        
+        if state is None:
+            state = BookingState()
+        if resumed:
+            self.logger.info(f"保存済みの状態から再開します（手順: {state.step}）")
+        self.session = state.session()
+        
+        handlers = {
+            booking_state.TOP: self.booking_step_top,
+            booking_state.RECEPTION: self.booking_step_reception,
+            booking_state.FORM: self.booking_step_form,
+            booking_state.SUBMIT: self.booking_step_submit,
+            booking_state.CONFIRM: self.booking_step_confirm
+        }
+        
+        retry_count = retry.next_attempt()
+        self.logger.info(f"試行 {retry_count}/{max_retries}")
+        self.report_progress('started', engine='lightweight', attempt=retry_count, max_attempts=max_retries)
+        
+        while not state.finished:
+            try:
+                handlers[state.step](state, retry)
+                self.save_checkpoint(state)
                 
-                # トップページを取得
-                response = self.session.get(top_url, headers=headers, timeout=30)
-                response.raise_for_status()
-                
-                # トップページを保存
-                with open(f"top_page_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html", "w", encoding="utf-8") as f:
-                    f.write(response.text)
+            except BrowserHandoff:
+                raise
+            except Exception as e:
+                self.logger.error(f"軽量版予約処理エラー（試行 {retry_count}/{max_retries}、手順: {state.step}）: {e}")
                 
-                self.logger.info(f"トップページを取得しました（サイズ: {len(response.text)}文字）")
+                # 送信（POST）が処理された可能性がある場合は二重予約を避けるため再送しない
+                if state.step in (booking_state.SUBMIT, booking_state.CONFIRM) and classify_error(e) not in SAFE_TO_RESEND:
+                    reason = f"送信結果を確認できませんでした（手順: {state.step}）。予約サイトで受付状況を確認してください"
+                    self.logger.error(f"{reason}: {e}")
+                    state.finish('failed', reason=reason, needs_review=True)
+                    self.save_checkpoint(state)
+                    self.report_progress('failed', reason=state.reason, needs_review=True)
+                    return False
                 
-                # 順番受付のリンクを探す（実際のHTMLの構造に基づく）
-                import re
+                # エラーの種類・回数・受付終了時刻から待機時間を決める
+                wait_time, reason = retry.next_delay(e)
+                if wait_time is None:
+                    self.logger.error(f"{reason}ため、処理を終了します")
+                    state.finish('failed', reason=f"{reason}ため終了しました")
+                    self.save_checkpoint(state)
+                    self.report_progress('failed', reason=state.reason)
+                    return False
                 
-                # まず、順番受付(当日外来)のリンクを探す
-                reception_link_match = re.search(r'href="([^"]*nj=rsvmodG01[^"]*)"', response.text)
-                if reception_link_match:
-                    reception_link = reception_link_match.group(1)
-                    if not reception_link.startswith('http'):
-                        reception_link = "https://www4.tandt.co.jp/rsvsys/jsp/" + reception_link
-                    
-                    self.logger.info(f"順番受付(当日外来)リンクを発見: {reception_link}")
-                    
-                    # 順番受付ページにアクセス
-                    self.logger.info("順番受付ページにアクセスします（手動と同じ手順）")
-                    
-                    # ヘッダーを更新
-                    headers['Referer'] = top_url
-                    headers['Sec-Fetch-Site'] = 'cross-site'
-                    
-                    reception_response = self.session.get(reception_link, headers=headers, timeout=30)
-                    reception_response.raise_for_status()
-                    
-                    # 順番受付ページを保存
-                    with open(f"reception_page_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html", "w", encoding="utf-8") as f:
-                        f.write(reception_response.text)
-                    
-                    self.logger.info("順番受付ページを取得しました")
-                    self.logger.info(f"順番受付ページのサイズ: {len(reception_response.text)}文字")
-                    
-                    # 順番受付ページの内容を確認
-                    if "順番受付" in reception_response.text:
-                        self.logger.info("✅ 順番受付ページに正しくアクセスできました")
-                    else:
-                        self.logger.warning("⚠️ 順番受付ページの内容が期待と異なります")
-                    
-                    # HTMLから待ち人数を抽出
-                    wait_count_match = re.search(r'待ち人数.*?(\d+)', reception_response.text)
-                    if wait_count_match:
-                        wait_count = int(wait_count_match.group(1))
-                        self.logger.info(f"現在の待ち人数: {wait_count}人")
-                        
-                        # 待ち人数が多い場合でも即座に処理を実行
-                        self.logger.info(f"現在の待ち人数: {wait_count}人 - 即座に予約処理を実行します")
-                    else:
-                        self.logger.warning("待ち人数を取得できませんでした")
-                    
-                    # 受付中ボタンのリンクを探す（手動と同じ手順）
-                    self.logger.info("受付中ボタンを探しています（手動と同じ手順）")
-                    reception_button_match = re.search(r'href="([^"]*rsvmodM02[^"]*)"', reception_response.text)
-                    if reception_button_match:
-                        reception_button_link = reception_button_match.group(1)
-                        self.logger.info(f"受付中ボタンのリンクを発見: {reception_button_link}")
-                        
-                        if not reception_button_link.startswith('http'):
-                            # 相対パスを絶対パスに変換
-                            if reception_button_link.startswith('../'):
-                                base_url = "https://www4.tandt.co.jp/rsvsys/"
-                                full_reception_link = base_url + reception_button_link[3:]
-                            elif reception_button_link.startswith('./'):
-                                base_url = "https://www4.tandt.co.jp/rsvsys/jsp/"
-                                full_reception_link = base_url + reception_button_link[2:]
-                            else:
-                                base_url = "https://www4.tandt.co.jp/rsvsys/jsp/"
-                                full_reception_link = base_url + reception_button_link
-                        else:
-                            full_reception_link = reception_button_link
-                        
-                        self.logger.info(f"受付中ボタンの完全URL: {full_reception_link}")
-                        
-                        # 受付フォームにアクセス
-                        self.logger.info("受付フォームにアクセスします（手動と同じ手順）")
-                        
-                        # ヘッダーを更新
-                        headers['Referer'] = reception_link
-                        headers['Sec-Fetch-Site'] = 'same-site'
-                        
-                        form_response = self.session.get(full_reception_link, headers=headers, timeout=30)
-                        form_response.raise_for_status()
-                        
-                        # フォームページを保存
-                        with open(f"reception_form_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html", "w", encoding="utf-8") as f:
-                            f.write(form_response.text)
-                        
-                        self.logger.info("受付フォームのページを取得しました")
-                        
-                        # 患者情報を送信
-                        patient_data = {
-                            'patient_number': self.config['patient_info']['patient_number'],
-                            'birth_date': self.config['patient_info']['birth_date']
-                        }
-                        
-                        self.logger.info(f"患者情報を送信: {patient_data}")
-                        self.logger.info("実際の予約フォームに患者情報を入力して送信します")
-                        
-                        # 生年月日を月と日に分割
-                        birth_date = datetime.strptime(patient_data['birth_date'], '%Y-%m-%d')
-                        birth_month = birth_date.strftime('%m')
-                        birth_day = birth_date.strftime('%d')
-                        
-                        # 現在のセッションから必要なパラメータを取得
-                        current_url = form_response.url
-                        self.logger.info(f"現在のフォームURL: {current_url}")
-                        
-                        # フォームのHTMLから隠しフィールドの値を取得
-                        import re
-                        
-                        # 隠しフィールドの値を抽出
-                        hidden_fields = {}
-                        
-                        # ymd, subno, subnameをURLから抽出
-                        ymd_match = re.search(r'ymd=(\d+)', current_url)
-                        subno_match = re.search(r'subno=(\d+)', current_url)
-                        subname_match = re.search(r'subname=([^&]+)', current_url)
-                        
-                        ymd = ymd_match.group(1) if ymd_match else datetime.now().strftime('%Y%m%d%H%M')
-                        subno = subno_match.group(1) if subno_match else '01'
-                        subname = subname_match.group(1) if subname_match else 'BB6CDC019CAD7600'
-                        
-                        # HTMLから隠しフィールドの値を取得（より正確な正規表現）
-                        hidden_inputs = re.findall(r'<input[^>]*type="hidden"[^>]*name="([^"]*)"[^>]*value="([^"]*)"[^>]*>', form_response.text)
-                        for name, value in hidden_inputs:
-                            hidden_fields[name] = value
-                            self.logger.info(f"隠しフィールド発見: {name} = {value}")
-                        
-                        # 通常の入力フィールドも確認
-                        regular_inputs = re.findall(r'<input[^>]*name="([^"]*)"[^>]*value="([^"]*)"[^>]*>', form_response.text)
-                        for name, value in regular_inputs:
-                            if name not in hidden_fields:  # 隠しフィールドでない場合
-                                hidden_fields[name] = value
-                                self.logger.info(f"通常フィールド発見: {name} = {value}")
-                        
-                        self.logger.info(f"抽出されたパラメータ: ymd={ymd}, subno={subno}, subname={subname}")
-                        self.logger.info(f"HTMLから取得したフィールド: {hidden_fields}")
-                        
-                        # フォームデータを準備（手動予約と完全に一致）
-                        form_data = {
-                            'pNo': patient_data['patient_number'],  # 診察券番号
-                            'pBDayMM': birth_month,  # 誕生月
-                            'pBDayDD': birth_day,    # 誕生日
-                        }
-                        
-                        # 隠しフィールドの値を追加（患者情報フィールドは除外）
-                        for name, value in hidden_fields.items():
-                            if name not in ['pNo', 'pBDayMM', 'pBDayDD']:  # 患者情報フィールドは除外
-                                form_data[name] = value
-                        
-                        # 患者情報を確実に設定（隠しフィールドで上書きされないように）
-                        form_data['pNo'] = patient_data['patient_number']  # 診察券番号
-                        form_data['pBDayMM'] = birth_month  # 誕生月
-                        form_data['pBDayDD'] = birth_day    # 誕生日
-                        
-                        # 必須フィールドが不足している場合はデフォルト値を設定
-                        if 'pSessyu' not in form_data:
-                            form_data['pSessyu'] = ''
-                        if 'pCondition' not in form_data:
-                            form_data['pCondition'] = ''
-                        if 'pComment' not in form_data:
-                            form_data['pComment'] = ''
-                        if 'pCure' not in form_data:
-                            form_data['pCure'] = ''
-                        if 'clr' not in form_data:
-                            form_data['clr'] = '0'
-                        if 'pCtl' not in form_data:
-                            form_data['pCtl'] = '0'
-                        if 'agent' not in form_data:
-                            form_data['agent'] = 'RSV1'
-                        if 'jobid' not in form_data:
-                            form_data['jobid'] = 'rsvmodM04'
-                        if 'callback' not in form_data:
-                            form_data['callback'] = '0'
-                        if 'ymd' not in form_data:
-                            form_data['ymd'] = ymd
-                        if 'subno' not in form_data:
-                            form_data['subno'] = subno
-                        if 'subname' not in form_data:
-                            form_data['subname'] = subname
-                        if 'pFamily' not in form_data:
-                            form_data['pFamily'] = '1'
-                        if 'pBTemp' not in form_data:
-                            form_data['pBTemp'] = ''
-                        
-                        # 家族情報フィールドが不足している場合はデフォルト値を設定
-                        if 'pFamNo' not in form_data:
-                            form_data['pFamNo'] = ''
-                        if 'pFamBDayMM' not in form_data:
-                            form_data['pFamBDayMM'] = '0'
-                        if 'pFamBDayDD' not in form_data:
-                            form_data['pFamBDayDD'] = '0'
-                        if 'pGFamName' not in form_data:
-                            form_data['pGFamName'] = ''
-                        if 'pGFamSex' not in form_data:
-                            form_data['pGFamSex'] = '0'
-                        if 'pGFamBDayYY' not in form_data:
-                            form_data['pGFamBDayYY'] = '0'
-                        if 'pGFamBDayMM' not in form_data:
-                            form_data['pGFamBDayMM'] = '0'
-                        if 'pGFamBDayDD' not in form_data:
-                            form_data['pGFamBDayDD'] = '0'
-                        
-                        self.logger.info(f"送信するフォームデータ: {form_data}")
-                        self.logger.info("=== フォームデータの詳細 ===")
-                        self.logger.info(f"診察券番号: {form_data['pNo']}")
-                        self.logger.info(f"誕生月: {form_data['pBDayMM']}")
-                        self.logger.info(f"誕生日: {form_data['pBDayDD']}")
-                        self.logger.info(f"家族情報フラグ: {form_data['pFamily']}")
-                        self.logger.info(f"セッション情報: ymd={ymd}, subno={subno}, subname={subname}")
-                        self.logger.info("=== 手動予約と同じデータを送信します ===")
-                        
-                        # セッションを維持するためにRefererを設定
-                        headers['Referer'] = current_url
-                        headers['Sec-Fetch-Site'] = 'same-site'
-                        headers['Sec-Fetch-Mode'] = 'navigate'
-                        headers['Sec-Fetch-Dest'] = 'document'
-                        
-                        # フォームのHTMLからaction属性を取得
-                        action_match = re.search(r'action="([^"]+)"', form_response.text)
-                        if action_match:
-                            actual_action = action_match.group(1)
-                            self.logger.info(f"フォームの実際のaction: {actual_action}")
-                            
-                            # 相対パスを絶対パスに変換
-                            if actual_action.startswith('../'):
-                                base_url = "https://www4.tandt.co.jp/rsvsys/"
-                                full_action = base_url + actual_action[3:]
-                            elif actual_action.startswith('./'):
-                                base_url = "https://www4.tandt.co.jp/rsvsys/jsp/"
-                                full_action = base_url + actual_action[2:]
-                            elif not actual_action.startswith('http'):
-                                base_url = "https://www4.tandt.co.jp/rsvsys/jsp/"
-                                full_action = base_url + actual_action
-                            else:
-                                full_action = actual_action
-                            
-                            self.logger.info(f"完全なaction URL: {full_action}")
-                            
-                            # 新しいaction URLで送信
-                            submit_response = self.session.post(full_action, data=form_data, headers=headers, timeout=30)
-                            submit_response.raise_for_status()
-                            
-                            self.logger.info(f"正しいaction URLでの送信完了（サイズ: {len(submit_response.text)}文字）")
-                            
-                            # 送信結果を保存
-                            with open(f"submit_result_corrected_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html", "w", encoding="utf-8") as f:
-                                f.write(submit_response.text)
-                            
-                            # 送信結果を確認
-                            if "サーバーエラー" in submit_response.text or "サーバエラー" in submit_response.text:
-                                server_error_count += 1
-                                self.logger.error(f"正しいaction URLでもサーバーエラーが発生（連続{server_error_count}回目）")
-                                
-                                # エラーの詳細を分析
-                                self.logger.error("=== エラー詳細分析 ===")
-                                self.logger.error(f"送信したURL: {full_action}")
-                                self.logger.error(f"送信したデータ: {form_data}")
-                                self.logger.error(f"レスポンスサイズ: {len(submit_response.text)}文字")
-                                self.logger.error(f"レスポンス内容: {submit_response.text}")
-                                
-                                # レスポンスヘッダーも確認
-                                self.logger.error(f"レスポンスヘッダー: {dict(submit_response.headers)}")
-                                
-                                if server_error_count >= max_server_errors:
-                                    self.logger.error(f"サーバーエラーが{max_server_errors}回連続で発生したため、処理を終了します")
-                                    return False
-                                
-                                # サーバーエラー時の待機時間を設定
-                                wait_time = min(300, 60 * server_error_count)  # 最大5分、エラー回数に応じて増加
-                                self.logger.info(f"サーバーエラーが発生したため、{wait_time}秒待機してから再試行します")
-                                time.sleep(wait_time)
-                                
-                                # セッションをリセット
-                                self.session = requests.Session()
-                                continue
-                                
-                            elif "確認" in submit_response.text:
-                                self.logger.info("🎉 確認画面に到達しました！予約の確認が可能です")
-                                
-                                # 確認画面から確定ボタンを探して予約を完了させる
-                                self.logger.info("確認画面から確定ボタンを探して予約を完了させます")
-                                
-                                # 確認画面のHTMLを保存
-                                with open(f"confirmation_page_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html", "w", encoding="utf-8") as f:
-                                    f.write(submit_response.text)
-                                
-                                # 確認画面で予約完了のための正しい処理を実行
-                                self.logger.info("確認画面で予約完了のための正しい処理を実行します")
-                                
-                                # 確認画面の「受付する」ボタンのフォームを正しいデータで送信
-                                # 正しいaction: ../jsp/JobDispatcher.jsp (rsvmodM06)
-                                form_action = "../jsp/JobDispatcher.jsp"
-                                form_method = "post"
-                                
-                                self.logger.info(f"確認画面のフォーム: action={form_action}, method={form_method}")
-                                
-                                # フォームのaction URLを絶対パスに変換
-                                if form_action.startswith('../'):
-                                    base_url = "https://www4.tandt.co.jp/rsvsys/"
-                                    full_form_action = base_url + form_action[3:]
-                                elif form_action.startswith('./'):
-                                    base_url = "https://www4.tandt.co.jp/rsvsys/jsp/"
-                                    full_form_action = base_url + form_action[2:]
-                                elif not form_action.startswith('http'):
-                                    base_url = "https://www4.tandt.co.jp/rsvsys/jsp/"
-                                    full_form_action = base_url + form_action
-                                else:
-                                    full_form_action = form_action
-                                
-                                self.logger.info(f"確認画面フォームの完全なaction URL: {full_form_action}")
-                                
-                                # 確認画面のフォームデータを準備（患者情報を含む）
-                                confirm_form_data = {
-                                    'pNo': patient_data['patient_number'],  # 患者番号
-                                    'pBDayMM': birth_month,  # 誕生月
-                                    'pBDayDD': birth_day,    # 誕生日
-                                    'agent': 'RSV1',         # 正しいagent
-                                    'jobid': 'rsvmodM06',    # 正しいjobid
-                                }
-                                
-                                # 隠しフィールドの値を追加（患者情報フィールドは除外）
-                                for name, value in hidden_fields.items():
-                                    if name not in ['pNo', 'pBDayMM', 'pBDayDD', 'agent', 'jobid']:  # 患者情報フィールドと正しい隠しフィールドは除外
-                                        confirm_form_data[name] = value
-                                
-                                # 患者情報を確実に設定（隠しフィールドで上書きされないように）
-                                confirm_form_data['pNo'] = patient_data['patient_number']  # 患者番号
-                                confirm_form_data['pBDayMM'] = birth_month  # 誕生月
-                                confirm_form_data['pBDayDD'] = birth_day    # 誕生日
-                                
-                                self.logger.info(f"確認画面フォームの送信データ: {confirm_form_data}")
-                                
-                                # ヘッダーを更新
-                                headers['Referer'] = full_action
-                                headers['Sec-Fetch-Site'] = 'same-site'
-                                headers['Sec-Fetch-Mode'] = 'navigate'
-                                headers['Sec-Fetch-Dest'] = 'document'
-                                
-                                # 確認画面のフォームを送信
-                                if form_method.lower() == 'post':
-                                    confirm_response = self.session.post(full_form_action, data=confirm_form_data, headers=headers, timeout=30)
-                                else:
-                                    confirm_response = self.session.get(full_form_action, params=confirm_form_data, headers=headers, timeout=30)
-                                
-                                confirm_response.raise_for_status()
-                                
-                                self.logger.info(f"確認画面フォーム送信完了（サイズ: {len(confirm_response.text)}文字）")
-                                
-                                # 確定結果を保存
-                                with open(f"confirmation_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html", "w", encoding="utf-8") as f:
-                                    f.write(confirm_response.text)
-                                
-                                # 確定結果を確認
-                                if "完了" in confirm_response.text or "予約完了" in confirm_response.text or "受付完了" in confirm_response.text:
-                                    self.logger.info("🎉 予約が完了しました！")
-                                    return True
-                                elif "エラー" in confirm_response.text or "失敗" in confirm_response.text:
-                                    self.logger.error("確定処理でエラーが発生しました")
-                                    self.logger.error(f"確定結果の内容: {confirm_response.text[:200]}...")
-                                    return False
-                                else:
-                                    self.logger.warning("確定処理は完了しましたが、結果の確認が必要です")
-                                    self.logger.info(f"確定結果の内容: {confirm_response.text[:200]}...")
-                                    return True
-                            elif "完了" in submit_response.text:
-                                self.logger.info("🎉 予約が完了しました！")
-                                return True
-                            else:
-                                self.logger.warning("正しいaction URLでの送信は完了しましたが、結果の確認が必要です")
-                                self.logger.info(f"送信結果の内容: {submit_response.text[:200]}...")
-                                
-                                # 成功とみなしてサーバーエラーカウントをリセット
-                                server_error_count = 0
-                                return True
-                        else:
-                            self.logger.error("フォームのaction属性が見つかりませんでした")
-                            return False
-                    else:
-                        self.logger.error("受付ボタンリンクが見つかりませんでした")
-                        return False
+                # 同じ手順で続けて失敗した場合はセッションごと作り直す
+                if state.record_failure() >= 2 or state.step == booking_state.TOP:
+                    state.restart()
+                    self.session = state.session()
+                    resume_label = "トップページから"
                 else:
-                    self.logger.error("順番受付リンクが見つかりませんでした")
-                    return False
+                    resume_label = f"手順「{state.step}」から"
+                self.save_checkpoint(state)
                     
-            except Exception as e:
-                self.logger.error(f"軽量版予約処理エラー（試行 {retry_count}/{max_retries}）: {e}")
-                if retry_count < max_retries:
-                    wait_time = 30 * retry_count  # 試行回数に応じて待機時間を増加
-                    self.logger.info(f"{wait_time}秒後にリトライします")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    self.logger.error("最大リトライ回数に達しました")
-                    return False
+                self.logger.info(f"{wait_time:.0f}秒後に{resume_label}リトライします（{reason}）")
+                self.report_progress('retrying', reason=str(e), wait_seconds=round(wait_time))
+                with track_step('retry_wait', 'lightweight'):
+                    retry.wait(wait_time)
+                
+                retry_count = retry.next_attempt()
+                self.logger.info(f"試行 {retry_count}/{max_retries}")
+                self.report_progress('started', engine='lightweight', attempt=retry_count, max_attempts=max_retries)
         
-        self.logger.error("最大リトライ回数に達しました")
+        if state.result == 'confirmed':
+            if state.needs_review:
+                self.report_progress('confirmed', needs_review=True)
+            else:
+                self.report_progress('confirmed')
+            return True
+        self.report_progress('failed', reason=state.reason)
         return False
+    
+    def save_checkpoint(self, state):
+        """予約処理の状態を保存（checkpoint_keyが設定されている場合のみ）"""
+        if not self.checkpoint_key:
+            return
+        try:
+            get_booking_checkpoint_store().save(self.checkpoint_key, state)
+        except Exception as e:
+            self.logger.warning(f"予約処理の状態の保存エラー: {e}")
+    
+    def load_checkpoint(self):
+        """保存済みの予約処理の状態（checkpoint_keyが設定されていない場合・ない場合はNone）
+
+        送信中に中断したため確認が必要な状態は、再送しないように終了した状態のまま返す
+        """
+        if not self.checkpoint_key:
+            return None
+        state = get_booking_checkpoint_store().load(self.checkpoint_key)
+        if state is not None and state.finished and not state.needs_review:
+            return None
+        return state
+    
+    def reservation_url(self, link):
+        """予約システムのページの相対パスを絶対URLに変換"""
+        if link.startswith('http'):
+            return link
+        if link.startswith('../'):
+            return self.reservation_base_url + link[3:]
+        if link.startswith('./'):
+            return f"{self.reservation_base_url}jsp/" + link[2:]
+        return f"{self.reservation_base_url}jsp/" + link
+    
+    def booking_step_headers(self, referer=None, site='same-site'):
+        """手順ごとのヘッダー（手動ブラウザと同じ）"""
+        headers = self.build_request_headers()
+        if referer:
+            headers['Referer'] = referer
+            headers['Sec-Fetch-Site'] = site
+        return headers
+    
+    def booking_step_top(self, state, retry):
+        """トップページから順番受付(当日外来)のリンクを探す"""
+        top_url = self.top_url
+        self.logger.info(f"トップページにアクセス: {top_url}")
+        
+        response = self.send_step(retry, 'top_page', 'GET', top_url, headers=self.booking_step_headers(), timeout=30)
+        
+        # トップページを保存
+        self.save_snapshot("top_page", response.text)
+        
+        self.logger.info(f"トップページを取得しました（サイズ: {len(response.text)}文字）")
+        self.report_progress('top_page_fetched')
+        
+        # 順番受付(当日外来)のリンクを探す（実際のHTMLの構造に基づく）
+        reception_link_match = re.search(r'href="([^"]*nj=rsvmodG01[^"]*)"', response.text)
+        if not reception_link_match:
+            self.logger.error("順番受付リンクが見つかりませんでした")
+            if self.handoff_enabled:
+                raise BrowserHandoff('top', response.url, '順番受付リンクが見つかりませんでした')
+            state.finish('failed', reason='順番受付リンクが見つかりませんでした')
+            return
+        
+        reception_link = reception_link_match.group(1)
+        if not reception_link.startswith('http'):
+            reception_link = f"{self.reservation_base_url}jsp/" + reception_link
+        
+        self.logger.info(f"順番受付(当日外来)リンクを発見: {reception_link}")
+        state.urls['top'] = top_url
+        state.urls['reception'] = reception_link
+        state.advance(booking_state.RECEPTION, self.session)
+    
+    def booking_step_reception(self, state, retry):
+        """順番受付ページで待ち人数と受付中ボタンのリンクを取得"""
+        self.logger.info("順番受付ページにアクセスします（手動と同じ手順）")
+        
+        reception_link = state.urls['reception']
+        headers = self.booking_step_headers(referer=state.urls['top'], site='cross-site')
+        response = self.send_step(retry, 'reception_page', 'GET', reception_link, headers=headers, timeout=30)
+        
+        # 順番受付ページを保存
+        self.save_snapshot("reception_page", response.text)
+        
+        self.logger.info("順番受付ページを取得しました")
+        self.logger.info(f"順番受付ページのサイズ: {len(response.text)}文字")
+        
+        # 順番受付ページの内容を確認
+        if "順番受付" in response.text:
+            self.logger.info("✅ 順番受付ページに正しくアクセスできました")
+        else:
+            self.logger.warning("⚠️ 順番受付ページの内容が期待と異なります")
+        self.report_progress('reception_reached')
+        
+        # HTMLから待ち人数を抽出
+        wait_count = parse_wait_count(response.text)
+        if wait_count is not None:
+            self.logger.info(f"現在の待ち人数: {wait_count}人")
+            self.record_wait_count(wait_count, source='lightweight')
+            state.wait_count = wait_count
+            
+            # 待ち人数が多い場合でも即座に処理を実行
+            self.logger.info(f"現在の待ち人数: {wait_count}人 - 即座に予約処理を実行します")
+            self.report_progress('wait_count_parsed', wait_count=wait_count)
+        else:
+            self.logger.warning("待ち人数を取得できませんでした")
+        
+        # 受付中ボタンのリンクを探す（手動と同じ手順）
+        self.logger.info("受付中ボタンを探しています（手動と同じ手順）")
+        reception_button_match = re.search(r'href="([^"]*rsvmodM02[^"]*)"', response.text)
+        if not reception_button_match:
+            status_match = RECEPTION_STATUS_PATTERN.search(response.text)
+            state.reception_status = status_match.group(1) if status_match else None
+            self.logger.error(f"受付ボタンリンクが見つかりませんでした（受付状況: {state.reception_status or '不明'}）")
+            if self.handoff_enabled:
+                raise BrowserHandoff('reception', response.url, '受付ボタンリンクが見つかりませんでした')
+            state.finish('failed', reason='受付ボタンリンクが見つかりませんでした')
+            return
+        
+        reception_button_link = reception_button_match.group(1)
+        self.logger.info(f"受付中ボタンのリンクを発見: {reception_button_link}")
+        
+        full_reception_link = self.reservation_url(reception_button_link)
+        self.logger.info(f"受付中ボタンの完全URL: {full_reception_link}")
+        
+        state.urls['form'] = full_reception_link
+        state.advance(booking_state.FORM, self.session)
+    
+    def booking_step_form(self, state, retry):
+        """受付フォームから隠しフィールドと送信先を取得し、送信するデータを作成"""
+        self.logger.info("受付フォームにアクセスします（手動と同じ手順）")
+        
+        headers = self.booking_step_headers(referer=state.urls['reception'])
+        response = self.send_step(retry, 'reception_form', 'GET', state.urls['form'], headers=headers, timeout=30)
+        
+        # フォームページを保存
+        self.save_snapshot("reception_form", response.text)
+        
+        self.logger.info("受付フォームのページを取得しました")
+        
+        # 現在のセッションから必要なパラメータを取得
+        current_url = response.url
+        self.logger.info(f"現在のフォームURL: {current_url}")
+        
+        # フォームのHTMLから隠しフィールドの値を取得
+        hidden_fields = {}
+        
+        # ymd, subno, subnameをURLから抽出
+        ymd_match = re.search(r'ymd=(\d+)', current_url)
+        subno_match = re.search(r'subno=(\d+)', current_url)
+        subname_match = re.search(r'subname=([^&]+)', current_url)
+        
+        ymd = ymd_match.group(1) if ymd_match else datetime.now().strftime('%Y%m%d%H%M')
+        subno = subno_match.group(1) if subno_match else '01'
+        subname = subname_match.group(1) if subname_match else 'BB6CDC019CAD7600'
+        
+        # HTMLから隠しフィールドの値を取得（より正確な正規表現）
+        hidden_inputs = re.findall(r'<input[^>]*type="hidden"[^>]*name="([^"]*)"[^>]*value="([^"]*)"[^>]*>', response.text)
+        for name, value in hidden_inputs:
+            hidden_fields[name] = value
+            self.logger.debug("隠しフィールド発見: %s = %s", name, value)
+        
+        # 通常の入力フィールドも確認
+        regular_inputs = re.findall(r'<input[^>]*name="([^"]*)"[^>]*value="([^"]*)"[^>]*>', response.text)
+        for name, value in regular_inputs:
+            if name not in hidden_fields:  # 隠しフィールドでない場合
+                hidden_fields[name] = value
+                self.logger.debug("通常フィールド発見: %s = %s", name, value)
+        
+        self.logger.info(f"抽出されたパラメータ: ymd={ymd}, subno={subno}, subname={subname}")
+        self.logger.debug("HTMLから取得したフィールド: %s", hidden_fields)
+        
+        # フォームのHTMLからaction属性を取得
+        action_match = re.search(r'action="([^"]+)"', response.text)
+        if not action_match:
+            self.logger.error("フォームのaction属性が見つかりませんでした")
+            if self.handoff_enabled:
+                raise BrowserHandoff('form', response.url, 'フォームのaction属性が見つかりませんでした')
+            state.finish('failed', reason='フォームのaction属性が見つかりませんでした')
+            return
+        
+        actual_action = action_match.group(1)
+        self.logger.info(f"フォームの実際のaction: {actual_action}")
+        
+        full_action = self.reservation_url(actual_action)
+        self.logger.info(f"完全なaction URL: {full_action}")
+        
+        state.urls['form_page'] = current_url
+        state.urls['action'] = full_action
+        state.hidden_fields = hidden_fields
+        state.form_data = self.build_form_data(hidden_fields, ymd, subno, subname, state.patient)
+        state.advance(booking_state.SUBMIT, self.session)
+    
+    def build_form_data(self, hidden_fields, ymd, subno, subname, patient=None):
+        """受付フォームの送信データ（手動予約と完全に一致、patientを省略した場合は設定ファイルの患者）"""
+        # 患者情報を送信
+        patient_data = patient or {
+            'patient_number': self.config['patient_info']['patient_number'],
+            'birth_date': self.config['patient_info']['birth_date']
+        }
+        
+        self.logger.debug("患者情報を送信: %s", patient_data)
+        self.logger.info("実際の予約フォームに患者情報を入力して送信します")
+        
+        # 生年月日を月と日に分割
+        birth_date = datetime.strptime(patient_data['birth_date'], '%Y-%m-%d')
+        birth_month = birth_date.strftime('%m')
+        birth_day = birth_date.strftime('%d')
+        
+        # フォームデータを準備（手動予約と完全に一致）
+        form_data = {
+            'pNo': patient_data['patient_number'],  # 診察券番号
+            'pBDayMM': birth_month,  # 誕生月
+            'pBDayDD': birth_day,    # 誕生日
+        }
+        
+        # 隠しフィールドの値を追加（患者情報フィールドは隠しフィールドで上書きしない）
+        for name, value in hidden_fields.items():
+            if name not in ['pNo', 'pBDayMM', 'pBDayDD']:
+                form_data[name] = value
+        
+        # 必須フィールド・家族情報フィールドが不足している場合はデフォルト値を設定
+        url_values = {'ymd': ymd, 'subno': subno, 'subname': subname}
+        for name, value in LIGHTWEIGHT_FORM_DEFAULTS.items():
+            if name not in form_data:
+                form_data[name] = url_values.get(name, value)
+        
+        self.logger.debug("送信するフォームデータ: %s", form_data)
+        self.logger.debug("フォームデータの詳細: 診察券番号=%s, 誕生月=%s, 誕生日=%s, 家族情報フラグ=%s, ymd=%s, subno=%s, subname=%s",
+                          form_data['pNo'], form_data['pBDayMM'], form_data['pBDayDD'], form_data['pFamily'], ymd, subno, subname)
+        return form_data
+    
+    def booking_step_submit(self, state, retry):
+        """受付フォームを送信"""
+        self.logger.info("=== 手動予約と同じデータを送信します ===")
+        
+        # 新しいaction URLで送信（送信が届いていないことが確実な場合のみ同じフォームで再送）
+        headers = self.booking_step_headers(referer=state.urls['form_page'])
+        # 送信中に中断した場合に再送しないよう、送信前に記録
+        state.begin_post()
+        self.save_checkpoint(state)
+        response = self.send_step(retry, 'submit', 'POST', state.urls['action'], data=state.form_data, headers=headers, timeout=30)
+        retry.record_success()
+        
+        self.logger.info(f"正しいaction URLでの送信完了（サイズ: {len(response.text)}文字）")
+        self.report_progress('submitted')
+        
+        # 送信結果を保存
+        self.save_snapshot("submit_result_corrected", response.text)
+        
+        # 送信結果を確認
+        if "確認" in response.text:
+            self.logger.info("🎉 確認画面に到達しました！予約の確認が可能です")
+            
+            # 確認画面のHTMLを保存
+            self.save_snapshot("confirmation_page", response.text)
+            state.advance(booking_state.CONFIRM, self.session)
+        elif "完了" in response.text:
+            self.logger.info("🎉 予約が完了しました！")
+            state.finish('confirmed')
+        else:
+            self.logger.warning("正しいaction URLでの送信は完了しましたが、結果の確認が必要です")
+            self.logger.debug("送信結果の内容: %.200s...", response.text)
+            state.finish('confirmed', needs_review=True)
+    
+    def booking_step_confirm(self, state, retry):
+        """確認画面の「受付する」を送信して予約を確定"""
+        self.logger.info("確認画面から確定ボタンを探して予約を完了させます")
+        
+        # 確認画面の「受付する」ボタンのフォームを正しいデータで送信
+        # 正しいaction: ../jsp/JobDispatcher.jsp (rsvmodM06)
+        form_action = "../jsp/JobDispatcher.jsp"
+        full_form_action = self.reservation_url(form_action)
+        self.logger.info(f"確認画面フォームの完全なaction URL: {full_form_action}")
+        
+        # 確認画面のフォームデータを準備（患者情報を含む）
+        confirm_form_data = {
+            'pNo': state.form_data['pNo'],          # 患者番号
+            'pBDayMM': state.form_data['pBDayMM'],  # 誕生月
+            'pBDayDD': state.form_data['pBDayDD'],  # 誕生日
+            'agent': 'RSV1',         # 正しいagent
+            'jobid': 'rsvmodM06',    # 正しいjobid
+        }
+        
+        # 隠しフィールドの値を追加（患者情報フィールドと正しい隠しフィールドは除外）
+        for name, value in state.hidden_fields.items():
+            if name not in ['pNo', 'pBDayMM', 'pBDayDD', 'agent', 'jobid']:
+                confirm_form_data[name] = value
+        
+        self.logger.debug("確認画面フォームの送信データ: %s", confirm_form_data)
+        
+        # 確認画面のフォームを送信（送信が届いていないことが確実な場合はトップページに戻らずこの送信だけやり直す）
+        headers = self.booking_step_headers(referer=state.urls['action'])
+        # 送信中に中断した場合に再送しないよう、送信前に記録
+        state.begin_post()
+        self.save_checkpoint(state)
+        response = self.send_step(retry, 'confirm', 'POST', full_form_action, data=confirm_form_data, headers=headers, timeout=30)
+        
+        self.logger.info(f"確認画面フォーム送信完了（サイズ: {len(response.text)}文字）")
+        
+        # 確定結果を保存
+        self.save_snapshot("confirmation_result", response.text)
+        
+        # 確定結果を確認
+        if "完了" in response.text or "予約完了" in response.text or "受付完了" in response.text:
+            self.logger.info("🎉 予約が完了しました！")
+            state.finish('confirmed')
+        elif "エラー" in response.text or "失敗" in response.text:
+            self.logger.error("確定処理でエラーが発生しました")
+            self.logger.error("確定結果の内容: %.200s...", response.text)
+            state.finish('failed', reason='確定処理でエラーが発生しました')
+        else:
+            self.logger.warning("確定処理は完了しましたが、結果の確認が必要です")
+            self.logger.debug("確定結果の内容: %.200s...", response.text)
+            state.finish('confirmed', needs_review=True)
 
     def fill_reception_form(self):
         """受付フォームに患者情報を入力"""
@@ -1557,48 +1950,27 @@ class HospitalBookingAutomationV3:
             ]
             
             # 患者番号入力
-            patient_number_field = None
-            for xpath in patient_number_patterns:
-                try:
-                    patient_number_field = WebDriverWait(self.driver, 3).until(
-                        EC.presence_of_element_located((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"患者番号フィールドを発見: {xpath}")
-                    break
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            patient_number_field, index = locate_element(self.driver, patient_number_patterns, timeout=3, name='reception_patient_number')
+            if patient_number_field is not None:
+                self.logger.info(f"患者番号フィールドを発見: {patient_number_patterns[index]}")
             
             if not patient_number_field:
                 self.logger.error("患者番号フィールドが見つかりませんでした")
                 return False
                 
             # 誕生日月選択
-            birth_month_field = None
-            for xpath in birth_month_patterns:
-                try:
-                    birth_month_field = WebDriverWait(self.driver, 3).until(
-                        EC.presence_of_element_located((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"誕生日月フィールドを発見: {xpath}")
-                    break
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            birth_month_field, index = locate_element(self.driver, birth_month_patterns, timeout=3, name='reception_birth_month')
+            if birth_month_field is not None:
+                self.logger.info(f"誕生日月フィールドを発見: {birth_month_patterns[index]}")
                     
             if not birth_month_field:
                 self.logger.error("誕生日月フィールドが見つかりませんでした")
                 return False
                 
             # 誕生日選択
-            birth_day_field = None
-            for xpath in birth_day_patterns:
-                try:
-                    birth_day_field = WebDriverWait(self.driver, 3).until(
-                        EC.presence_of_element_located((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"誕生日フィールドを発見: {xpath}")
-                    break
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            birth_day_field, index = locate_element(self.driver, birth_day_patterns, timeout=3, name='reception_birth_day')
+            if birth_day_field is not None:
+                self.logger.info(f"誕生日フィールドを発見: {birth_day_patterns[index]}")
                     
             if not birth_day_field:
                 self.logger.error("誕生日フィールドが見つかりませんでした")
@@ -1678,28 +2050,24 @@ class HospitalBookingAutomationV3:
                 "//form//button[contains(@class, 'submit')]"
             ]
             
-            for xpath in confirm_patterns:
-                try:
-                    element = WebDriverWait(self.driver, 3).until(
-                        EC.element_to_be_clickable((By.XPATH, xpath))
-                    )
-                    self.logger.info(f"確定ボタンを発見: {xpath}")
-                    
-                    # 要素の詳細情報をログに出力
-                    button_text = element.get_attribute('value') or element.text.strip()
-                    button_type = element.get_attribute('type') or 'N/A'
-                    button_tag = element.tag_name
-                    button_class = element.get_attribute('class') or 'N/A'
-                    
-                    self.logger.info(f"確定ボタンの詳細: タグ={button_tag}, テキスト='{button_text}', type='{button_type}', class='{button_class}'")
-                    
-                    # 発見されたHTML要素と一致するか確認
-                    if 'submitbtn' in button_class and 'btn-ef' in button_class:
-                        self.logger.info("✅ 正しい確定ボタン（submitbtn btn-ef）を発見しました！")
-                    
-                    return element
-                except (NoSuchElementException, TimeoutException):
-                    continue
+            element, index = locate_element(self.driver, confirm_patterns, clickable=True, timeout=3, name='confirm_button')
+            if element is not None:
+                xpath = confirm_patterns[index]
+                self.logger.info(f"確定ボタンを発見: {xpath}")
+                
+                # 要素の詳細情報をログに出力
+                button_text = element.get_attribute('value') or element.text.strip()
+                button_type = element.get_attribute('type') or 'N/A'
+                button_tag = element.tag_name
+                button_class = element.get_attribute('class') or 'N/A'
+                
+                self.logger.info(f"確定ボタンの詳細: タグ={button_tag}, テキスト='{button_text}', type='{button_type}', class='{button_class}'")
+                
+                # 発見されたHTML要素と一致するか確認
+                if 'submitbtn' in button_class and 'btn-ef' in button_class:
+                    self.logger.info("✅ 正しい確定ボタン（submitbtn btn-ef）を発見しました！")
+                
+                return element
                     
             self.logger.warning("確定ボタンが見つかりませんでした")
             
@@ -1712,14 +2080,23 @@ class HospitalBookingAutomationV3:
             self.logger.error(f"確定ボタン検索エラー: {e}")
             return None
 
+    def save_snapshot(self, prefix, html):
+        """取得したページのHTMLをスナップショットとして保存（書き込みはバックグラウンドで実行）"""
+        try:
+            if self.snapshot_writer is None:
+                self.snapshot_writer = get_snapshot_writer(**self.config.get('snapshots', {}))
+                # 主要なページは構造の変化を検出するためアーカイブにも記録
+                self.snapshot_writer.add_listener(get_page_archive().on_snapshot)
+            return self.snapshot_writer.save(prefix, html)
+        except Exception as e:
+            self.logger.error(f"スナップショット保存エラー: {e}")
+            return False
+    
     def save_page_content(self, filename_prefix):
         """ページのHTML内容をファイルに保存"""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{filename_prefix}_{timestamp}.html"
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(self.driver.page_source)
-            self.logger.warning(f"ページのHTMLを {filename} に保存しました。エラーの原因を特定するために確認してください。")
+            if self.save_snapshot(filename_prefix, self.driver.page_source):
+                self.logger.warning(f"ページのHTMLを {self.snapshot_writer.directory} に保存しました（{filename_prefix}）。エラーの原因を特定するために確認してください。")
         except Exception as e:
             self.logger.error(f"ページ内容保存エラー: {e}")
 
@@ -1741,12 +2118,20 @@ def main():
         elif sys.argv[1] == "--lightweight-booking":
             # 軽量版の自動予約処理
             automation.execute_lightweight_booking()
+        elif sys.argv[1] == "--book":
+            # 軽量版で予約し、解析できない手順のみブラウザで続行
+            automation.book()
         elif sys.argv[1] == "--same-day-booking":
             # 順番受付(当日外来)の自動処理
             automation.execute_same_day_booking()
         elif sys.argv[1] == "--analyze-status":
             # 現在の状況を解析
             automation.analyze_current_status()
+        elif sys.argv[1] == "--dry-run":
+            # 送信の直前まで実行して検証（予約は送信しない）
+            report = automation.dry_run_booking()
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+            sys.exit(0 if report['status'] != 'failed' else 1)
         else:
             print("使用方法:")
             print("  python hospital_booking_automation_v3.py          # 通常のスケジューラー実行")
@@ -1754,8 +2139,10 @@ def main():
             print("  python hospital_booking_automation_v3.py --tomorrow-9-15  # 明日9時15分に実行")
             print("  python hospital_booking_automation_v3.py --force-analyze  # 順番受付の自動処理")
             print("  python hospital_booking_automation_v3.py --lightweight-booking  # 軽量版の自動予約")
+            print("  python hospital_booking_automation_v3.py --book  # 軽量版で予約（失敗した手順のみブラウザで続行）")
             print("  python hospital_booking_automation_v3.py --same-day-booking  # 順番受付(当日外来)の自動処理")
             print("  python hospital_booking_automation_v3.py --analyze-status # 現在の状況を解析")
+            print("  python hospital_booking_automation_v3.py --dry-run  # 送信の直前まで実行して検証（予約しない）")
     else:
         # スケジューラー実行
         automation.run_scheduler()
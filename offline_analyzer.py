@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+オフラインページ解析ツール - かよ皮膚科予約管理システム
+保存済みのHTML（*.html、snapshots/の*.html.gz・*.html.zst、page_archive/のobjects）をブラウザを使わずに解析し、
+解析ツールと同じ形式でフォーム・入力欄・ボタン・リンクを表示する
+多数のファイルはプロセスプールで並列に解析し、手順ごとの集計をJSONに保存する
+
+使用方法:
+  python offline_analyzer.py [--detail] <ファイル/ディレクトリ/パターン>...
+  python offline_analyzer.py snapshots/ page_archive/ "*.html"
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from dom_snapshot import snapshot_from_html, form_inputs, is_patient_related_input, count_text_matches
+from snapshot_writer import read_snapshot
+from wait_count_collector import parse_wait_count
+
+# 解析対象の拡張子
+HTML_SUFFIXES = ('.html', '.html.gz', '.html.zst')
+
+# ファイル名から手順を判定（step_YYYYMMDD_HHMMSS.html / step_HHMMSS_ffffff_digest.html.gz）
+STEP_PATTERN = re.compile(r'^(?P<step>[a-z_]+?)_\d')
+
+# 受付ボタンのリンク（受付中のページにのみある）
+RECEPTION_JOBID = 'rsvmodM02'
+
+# 出現回数を数える文字列（page_analyzer.py・page_analyzer_v2.pyのテキスト検索から）
+KEYWORDS = ["予約", "受診", "診察", "順番受付", "患者番号", "患者No", "患者ID"]
+
+# 1プロセスにまとめて渡すファイル数
+CHUNK_SIZE = 8
+
+def expand_paths(arguments):
+    """引数のファイル・ディレクトリ・パターンを解析対象のファイル一覧にする"""
+    paths = []
+    for argument in arguments:
+        if os.path.isdir(argument):
+            for root, _, names in os.walk(argument):
+                paths.extend(os.path.join(root, name) for name in names if name.endswith(HTML_SUFFIXES))
+        elif os.path.isfile(argument):
+            paths.append(argument)
+        else:
+            paths.extend(path for path in glob.glob(argument) if path.endswith(HTML_SUFFIXES))
+    return sorted(set(paths))
+
+def archive_steps(paths):
+    """page_archive/のobjectsのハッシュと手順の対応（index.jsonlから）"""
+    steps = {}
+    index_files = {
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(path))), 'index.jsonl')
+        for path in paths if os.path.basename(os.path.dirname(os.path.dirname(path))) == 'objects'
+    }
+    for index_file in index_files:
+        if not os.path.exists(index_file):
+            continue
+        with open(index_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    steps[entry['hash']] = entry['step']
+    return steps
+
+def detect_step(path, steps):
+    """ファイル名から手順を判定"""
+    name = os.path.basename(path)
+    digest = name.split('.')[0]
+    if digest in steps:
+        return steps[digest]
+    match = STEP_PATTERN.match(name)
+    return match.group('step') if match else 'unknown'
+
+def analyze_file(path, step):
+    """1つのファイルを解析（プロセスプールで実行）"""
+    try:
+        html = read_snapshot(path)
+        snapshot = snapshot_from_html(html)
+    except Exception as e:
+        return {'path': path, 'step': step, 'error': str(e)}
+
+    return {
+        'path': path,
+        'step': step,
+        'title': snapshot.title,
+        'forms': [
+            {
+                'action': form.action,
+                'method': form.method,
+                'id': form.id,
+                'inputs': [item._asdict() for item in form_inputs(snapshot, form)]
+            }
+            for form in snapshot.forms
+        ],
+        'inputs': [dict(item._asdict(), patient_related=is_patient_related_input(item)) for item in snapshot.inputs],
+        'buttons': [item._asdict() for item in snapshot.buttons],
+        'links': [item._asdict() for item in snapshot.links],
+        'reception_open': any(RECEPTION_JOBID in (link.href or '') for link in snapshot.links),
+        'wait_count': parse_wait_count(html),
+        'keywords': count_text_matches(html, KEYWORDS)
+    }
+
+def analyze_files(paths, max_workers=None):
+    """ファイルをプロセスプールで並列に解析（結果は引数の順）"""
+    steps = archive_steps(paths)
+    file_steps = [detect_step(path, steps) for path in paths]
+    if len(paths) <= 1:
+        return [analyze_file(path, step) for path, step in zip(paths, file_steps)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(analyze_file, paths, file_steps, chunksize=CHUNK_SIZE))
+
+def print_detail(result):
+    """1つのファイルの解析結果を解析ツールと同じ形式で表示"""
+    print(f"\n=== {result['path']}（{result['step']}） ===")
+    print(f"ページタイトル: {result['title']}")
+
+    print(f"フォームの数: {len(result['forms'])}")
+    for i, form in enumerate(result['forms']):
+        print(f"フォーム{i+1}: action={form['action']}, method={form['method']}, id={form['id']}")
+        print(f"  入力要素: {len(form['inputs'])}個")
+        for inp in form['inputs']:
+            print(f"    - タイプ: {inp['type']}, 名前: {inp['name']}, ID: {inp['id']}, プレースホルダー: {inp['placeholder']}")
+
+    print(f"\n全入力要素: {len(result['inputs'])}個")
+    for i, inp in enumerate(result['inputs']):
+        label = "[患者番号関連] " if inp['patient_related'] else ""
+        print(f"  {i+1}. {label}タイプ={inp['type']}, 名前={inp['name']}, ID={inp['id']}, プレースホルダー={inp['placeholder']}")
+
+    print(f"\nボタンの数: {len(result['buttons'])}")
+    for i, button in enumerate(result['buttons']):
+        if button['text']:
+            print(f"  {i+1}. テキスト='{button['text']}', タイプ={button['type']}, ID={button['id']}")
+
+    print(f"\nリンクの数: {len(result['links'])}")
+    for i, link in enumerate(result['links']):
+        if link['text'] and link['href']:
+            print(f"  {i+1}. '{link['text']}' -> {link['href']}")
+
+def summarize(results):
+    """手順ごとの集計"""
+    summary = {}
+    for result in results:
+        if 'error' in result:
+            continue
+        step = summary.setdefault(result['step'], {'files': 0, 'reception_open': 0, 'wait_counts': [],
+                                                   'form_actions': set()})
+        step['files'] += 1
+        step['reception_open'] += 1 if result['reception_open'] else 0
+        if result['wait_count'] is not None:
+            step['wait_counts'].append(result['wait_count'])
+        step['form_actions'].update(form['action'] for form in result['forms'])
+
+    for step in summary.values():
+        wait_counts = step.pop('wait_counts')
+        step['wait_count_min'] = min(wait_counts) if wait_counts else None
+        step['wait_count_max'] = max(wait_counts) if wait_counts else None
+        step['form_actions'] = sorted(step['form_actions'])
+    return summary
+
+def main():
+    """メイン関数"""
+    arguments = sys.argv[1:]
+    detail = '--detail' in arguments
+    arguments = [argument for argument in arguments if argument != '--detail']
+    if not arguments:
+        print("使用方法:")
+        print("  python offline_analyzer.py [--detail] <ファイル/ディレクトリ/パターン>...")
+        return
+
+    paths = expand_paths(arguments)
+    if not paths:
+        print("解析するHTMLファイルが見つかりません")
+        return
+
+    started = datetime.now()
+    results = analyze_files(paths)
+    elapsed = (datetime.now() - started).total_seconds()
+
+    print(f"{'ファイル':<60}{'手順':<24}{'フォーム':>8}{'入力欄':>8}{'リンク':>8}{'受付中':>8}{'待ち人数':>8}")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['path']:<60}解析エラー: {result['error']}")
+            continue
+        print(f"{result['path']:<60}{result['step']:<24}{len(result['forms']):>8}{len(result['inputs']):>8}"
+              f"{len(result['links']):>8}{'○' if result['reception_open'] else '-':>8}"
+              f"{result['wait_count'] if result['wait_count'] is not None else '-':>8}")
+
+    if detail:
+        for result in results:
+            if 'error' not in result:
+                print_detail(result)
+
+    summary = summarize(results)
+    print(f"\n=== 手順ごとの集計（{len(results)}ファイル, {elapsed:.2f}秒） ===")
+    for step, values in sorted(summary.items()):
+        print(f"{step}: {values['files']}ファイル, 受付中{values['reception_open']}件, "
+              f"待ち人数 {values['wait_count_min']}〜{values['wait_count_max']}, action={values['form_actions']}")
+
+    filename = f"offline_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({'analyzed_at': started.strftime('%Y-%m-%d %H:%M:%S'), 'summary': summary, 'files': results},
+                  f, ensure_ascii=False, indent=2)
+    print(f"\n解析結果を保存しました: {filename}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ページアーカイブ - かよ皮膚科予約管理システム
+予約処理で取得したページを内容のハッシュで1回だけ保存し、(時刻, 手順, ハッシュ)の索引を記録する
+同じ手順の前回のページとフォーム・リンクの構造を比較し、受付フォームの入力欄やactionが変わった場合に通知する
+
+使用方法（保存済みのHTMLファイルを取り込んで差分を表示）:
+  python page_archive.py import reception_page_20250906_002828.html reception_page_20250914_090013.html
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, parse_qsl
+
+logger = logging.getLogger(__name__)
+
+# アーカイブの保存先
+ARCHIVE_DIR = 'page_archive'
+
+# 構造を比較する手順（スナップショットの接頭辞）
+TRACKED_STEPS = ('top_page', 'reception_page', 'reception_form', 'confirmation_page')
+
+# フォームが変わったら通知する手順
+ALERT_STEPS = ('reception_form',)
+
+# これより長いクエリの値と、日時らしい数字の値はアクセスごとに変わるものとして比較しない
+VOLATILE_VALUE_LENGTH = 12
+VOLATILE_DIGITS_LENGTH = 8
+
+def _is_volatile(value):
+    """アクセスごとに変わるクエリの値か"""
+    return len(value) > VOLATILE_VALUE_LENGTH or (value.isdigit() and len(value) >= VOLATILE_DIGITS_LENGTH)
+
+def normalize_url(url):
+    """セッションIDや長いトークンを除いて比較用のURLにする"""
+    if not url:
+        return ''
+    parts = urlsplit(url.strip())
+    path = parts.path.split(';')[0]
+    params = []
+    for key, value in parse_qsl(parts.query, keep_blank_values=True):
+        params.append(f"{key}={'*' if _is_volatile(value) else value}")
+    query = '&'.join(sorted(params))
+    return f"{path}?{query}" if query else path
+
+class _StructureParser(HTMLParser):
+    """フォーム（action・method・入力欄）とリンクを抽出"""
+
+    FIELD_TAGS = ('input', 'select', 'textarea', 'button')
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.forms = []
+        self.links = set()
+        self.current_form = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form':
+            self.current_form = {
+                'action': normalize_url(attrs.get('action')),
+                'method': (attrs.get('method') or 'get').lower(),
+                'fields': []
+            }
+            self.forms.append(self.current_form)
+        elif tag in self.FIELD_TAGS and self.current_form is not None:
+            field_type = attrs.get('type') or tag
+            name = attrs.get('name') or attrs.get('id') or ''
+            self.current_form['fields'].append(f"{tag}:{field_type}:{name}")
+        elif tag == 'a' and attrs.get('href'):
+            href = attrs['href']
+            if not href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
+                self.links.add(normalize_url(href))
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self.current_form = None
+
+def extract_structure(html):
+    """HTMLからフォームとリンクの構造を抽出"""
+    parser = _StructureParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logger.warning(f"HTMLの構造解析エラー: {e}")
+
+    forms = [
+        {'action': form['action'], 'method': form['method'], 'fields': sorted(set(form['fields']))}
+        for form in parser.forms
+    ]
+    return {'forms': forms, 'links': sorted(parser.links)}
+
+def structure_digest(structure):
+    """構造のハッシュ（構造が同じなら同じ値）"""
+    return hashlib.sha256(json.dumps(structure, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def diff_structures(previous, current):
+    """2つの構造の差分（変更がなければ空の辞書）"""
+    changes = {}
+
+    # フォームはactionで対応付け（actionがないフォームは出現順）
+    def keyed(forms):
+        return {form['action'] or f"#{index}": form for index, form in enumerate(forms)}
+
+    previous_forms = keyed(previous.get('forms', []))
+    current_forms = keyed(current.get('forms', []))
+
+    added_actions = sorted(set(current_forms) - set(previous_forms))
+    removed_actions = sorted(set(previous_forms) - set(current_forms))
+    if added_actions:
+        changes['forms_added'] = added_actions
+    if removed_actions:
+        changes['forms_removed'] = removed_actions
+
+    for action in sorted(set(previous_forms) & set(current_forms)):
+        before, after = previous_forms[action], current_forms[action]
+        form_changes = {}
+        added_fields = sorted(set(after['fields']) - set(before['fields']))
+        removed_fields = sorted(set(before['fields']) - set(after['fields']))
+        if added_fields:
+            form_changes['fields_added'] = added_fields
+        if removed_fields:
+            form_changes['fields_removed'] = removed_fields
+        if before['method'] != after['method']:
+            form_changes['method'] = [before['method'], after['method']]
+        if form_changes:
+            changes.setdefault('forms_changed', {})[action] = form_changes
+
+    added_links = sorted(set(current.get('links', [])) - set(previous.get('links', [])))
+    removed_links = sorted(set(previous.get('links', [])) - set(current.get('links', [])))
+    if added_links:
+        changes['links_added'] = added_links
+    if removed_links:
+        changes['links_removed'] = removed_links
+
+    return changes
+
+class PageArchive:
+    """内容のハッシュでページを保存し、手順ごとの構造の変化を検出するクラス"""
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.index_file = os.path.join(directory, 'index.jsonl')
+        self.lock = threading.Lock()
+        self.alert_handlers = []
+        self.latest = None
+
+    def add_alert_handler(self, handler):
+        """フォームの変更時に呼び出す関数（step, changes）を登録"""
+        if handler not in self.alert_handlers:
+            self.alert_handlers.append(handler)
+
+    def object_path(self, digest):
+        """ハッシュに対応する保存先"""
+        return os.path.join(self.directory, 'objects', digest[:2], f"{digest}.html.gz")
+
+    def load_html(self, digest):
+        """保存したページを読み込む"""
+        with open(self.object_path(digest), 'rb') as f:
+            return gzip.decompress(f.read()).decode('utf-8', errors='replace')
+
+    def _load_latest(self):
+        """索引から手順ごとの最新のエントリを読み込む"""
+        latest = {}
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    latest[entry['step']] = entry
+        except FileNotFoundError:
+            pass
+        return latest
+
+    def history(self, step=None, limit=50):
+        """索引のエントリ（新しい順）"""
+        entries = []
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if step is None or entry['step'] == step:
+                        entries.append(entry)
+        except FileNotFoundError:
+            pass
+        return list(reversed(entries))[:limit]
+
+    def record(self, step, saved_at, html):
+        """ページを記録し、前回から構造が変わっていれば差分を返す"""
+        if step not in TRACKED_STEPS:
+            return None
+
+        data = html.encode('utf-8') if isinstance(html, str) else html
+        digest = hashlib.sha256(data).hexdigest()
+
+        with self.lock:
+            if self.latest is None:
+                self.latest = self._load_latest()
+
+            path = self.object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(gzip.compress(data))
+                os.replace(temp_path, path)
+
+            previous = self.latest.get(step)
+            if previous and previous['hash'] == digest:
+                structure_hash = previous['structure']
+                changes = {}
+            else:
+                structure = extract_structure(data.decode('utf-8', errors='replace'))
+                structure_hash = structure_digest(structure)
+                changes = {}
+                if previous and previous['structure'] != structure_hash:
+                    try:
+                        previous_structure = extract_structure(self.load_html(previous['hash']))
+                        changes = diff_structures(previous_structure, structure)
+                    except FileNotFoundError:
+                        logger.warning(f"前回のページが見つかりません: {previous['hash']}")
+
+            entry = {
+                'timestamp': saved_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'step': step,
+                'hash': digest,
+                'structure': structure_hash
+            }
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.latest[step] = entry
+
+        if changes:
+            self._report(step, previous, entry, changes)
+        return changes
+
+    def _report(self, step, previous, entry, changes):
+        """構造の変化をログに記録し、受付フォームの変更は通知"""
+        logger.warning(f"ページ構造の変化を検出しました（{step}: {previous['timestamp']} → {entry['timestamp']}）: "
+                       f"{json.dumps(changes, ensure_ascii=False)}")
+
+        if step not in ALERT_STEPS:
+            return
+        if not any(key.startswith('forms_') for key in changes):
+            return
+
+        for handler in list(self.alert_handlers):
+            try:
+                handler(step, changes)
+            except Exception as e:
+                logger.error(f"ページ構造の変化の通知エラー: {e}")
+
+    def on_snapshot(self, prefix, saved_at, html):
+        """SnapshotWriterの書き込みスレッドから呼ばれる"""
+        try:
+            self.record(prefix, saved_at, html)
+        except Exception as e:
+            logger.error(f"ページアーカイブ記録エラー: {e}")
+
+# シングルトンインスタンス
+_page_archive = None
+
+def get_page_archive(directory=ARCHIVE_DIR):
+    """PageArchiveのインスタンスを取得"""
+    global _page_archive
+    if _page_archive is None:
+        _page_archive = PageArchive(directory)
+    return _page_archive
+
+def import_files(paths):
+    """保存済みのHTMLファイルを取り込み、手順ごとに前回との差分を表示"""
+    archive = get_page_archive()
+    pattern = re.compile(r'^(?P<step>[a-z_]+?)_(?P<stamp>\d{8}_\d{6})\.html$')
+
+    files = []
+    for path in paths:
+        match = pattern.match(os.path.basename(path))
+        if not match:
+            print(f"ファイル名から手順と時刻を判定できません: {path}")
+            continue
+        files.append((datetime.strptime(match.group('stamp'), '%Y%m%d_%H%M%S'), match.group('step'), path))
+
+    for saved_at, step, path in sorted(files):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            changes = archive.record(step, saved_at, f.read())
+        if changes is None:
+            print(f"{path}: 対象外の手順です（{step}）")
+        elif changes:
+            print(f"{path}: 構造の変化あり")
+            print(json.dumps(changes, ensure_ascii=False, indent=2))
+        else:
+            print(f"{path}: 変化なし")
+
+def main():
+    """メイン関数"""
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 2 and sys.argv[1] == 'import':
+        import_files(sys.argv[2:])
+    else:
+        print("使用方法:")
+        print("  python page_archive.py import <HTMLファイル>...  # 保存済みのHTMLを取り込んで差分を表示")
+
+if __name__ == "__main__":
+    main()
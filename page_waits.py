@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ページ遷移の待機 - かよ皮膚科予約管理システム
+固定時間のsleepの代わりに、読み込み完了・URLの変化・次画面の要素の出現を短い間隔で確認して待機する
+"""
+
+import logging
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+
+from element_locator import locate_element
+
+logger = logging.getLogger(__name__)
+
+# 状態確認の間隔（秒）
+POLL_INTERVAL = 0.05
+
+def wait_for_document_ready(driver, timeout):
+    """document.readyStateがcompleteになるまで待機（タイムアウト時はFalse）"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+        return True
+    except TimeoutException:
+        return False
+
+def _page_changed(driver, previous_url, old_element):
+    """URLが変わったか、クリックした要素が古いドキュメントのものになったか"""
+    if previous_url is not None and driver.current_url != previous_url:
+        return True
+
+    if old_element is not None:
+        try:
+            # 新しいドキュメントに切り替わると参照が無効になる
+            old_element.is_enabled()
+        except StaleElementReferenceException:
+            return True
+
+    return False
+
+def wait_for_navigation(driver, timeout, previous_url=None, old_element=None):
+    """クリック後のページ遷移を待ち、遷移先の読み込み完了まで待機（遷移しなかった場合はFalse）"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(
+            lambda d: _page_changed(d, previous_url, old_element)
+        )
+    except TimeoutException:
+        return False
+
+    return wait_for_document_ready(driver, timeout)
+
+def wait_for_any_element(driver, patterns, timeout, name=None):
+    """次の画面の目印となる要素のいずれかが現れるまで待機"""
+    element, _ = locate_element(driver, patterns, timeout=timeout, poll_interval=POLL_INTERVAL, name=name)
+    return element
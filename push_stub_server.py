@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+プッシュサービスのスタンドインサーバー - かよ皮膚科予約管理システム
+ブラウザのプッシュサービス（FCM・Mozilla Autopushなど）の代わりにWeb Pushの送信を受け取り、
+受信内容（VAPIDの署名・暗号化方式・TTL）を記録する
+期限切れの購読（410）を再現でき、オフラインでプッシュ通知の送信・期限切れの購読の削除を検証できる
+
+使用方法:
+  python push_stub_server.py [ポート番号]     # サーバーを起動
+  python push_stub_server.py --self-test      # 一時データベースと使い捨ての鍵で送信を検証
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import logging
+import sqlite3
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def generate_subscription_keys():
+    """購読の鍵（p256dh・auth）を作成（ブラウザが購読時に作成するものと同じ形式）"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    public_key = private_key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    return {'p256dh': _b64url(public_key), 'auth': _b64url(os.urandom(16))}
+
+def generate_vapid_keys():
+    """使い捨てのVAPID鍵（秘密鍵, 公開鍵）を作成"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    private_value = private_key.private_numbers().private_value.to_bytes(32, 'big')
+    public_key = private_key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    return _b64url(private_value), _b64url(public_key)
+
+class StubPushService:
+    """Web Pushの送信を受け取り、購読ごとの受信内容を記録するクラス"""
+
+    def __init__(self):
+        self.base_url = ''
+        self.lock = threading.Lock()
+        self.expired = set()
+        self.received = []
+
+    def endpoint(self, name):
+        """購読のendpoint"""
+        return f"{self.base_url}/push/{name}"
+
+    def subscription(self, name):
+        """このサーバーに届く購読情報（/api/push-subscriptionに送る形式）"""
+        return {'endpoint': self.endpoint(name), 'keys': generate_subscription_keys()}
+
+    def expire(self, name):
+        """購読を期限切れにする（以降の送信には410を返す）"""
+        with self.lock:
+            self.expired.add(name)
+
+    def handle(self, path, headers, body):
+        """送信に応答し、ステータスを返す"""
+        if not path.startswith('/push/'):
+            return 404
+        name = path[len('/push/'):]
+
+        with self.lock:
+            status = 410 if name in self.expired else 201
+            self.received.append({
+                'name': name,
+                'status': status,
+                'ttl': headers.get('TTL'),
+                'encoding': headers.get('Content-Encoding'),
+                'vapid': (headers.get('Authorization') or '').startswith('vapid '),
+                'size': len(body)
+            })
+        return status
+
+    def stats(self):
+        """購読ごとの受信回数とステータス"""
+        with self.lock:
+            counts = {}
+            for item in self.received:
+                counts.setdefault(item['name'], {}).setdefault(item['status'], 0)
+                counts[item['name']][item['status']] += 1
+            return counts
+
+class StubPushRequestHandler(BaseHTTPRequestHandler):
+    """StubPushServiceにリクエストを渡すハンドラー"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        status = self.server.service.handle(self.path, self.headers, body)
+
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+def start_stub_push_server(host='127.0.0.1', port=0):
+    """スタンドインサーバーをバックグラウンドで起動（server.service.endpoint(名前)が購読の送信先）"""
+    server = ThreadingHTTPServer((host, port), StubPushRequestHandler)
+    server.daemon_threads = True
+    server.service = StubPushService()
+    server.service.base_url = f"http://{host}:{server.server_address[1]}"
+
+    thread = threading.Thread(target=server.serve_forever, name='push-stub-server', daemon=True)
+    thread.start()
+    logger.info(f"プッシュサービスのスタンドインサーバーを起動しました: {server.service.base_url}")
+    return server
+
+def self_test():
+    """一時データベースと使い捨てのVAPID鍵で送信・期限切れの購読の削除を検証"""
+    from config.push_config import PushNotificationManager
+
+    server = start_stub_push_server()
+    service = server.service
+    database_path = os.path.join(tempfile.mkdtemp(prefix='push_stub_'), 'push.db')
+
+    manager = PushNotificationManager(lambda: sqlite3.connect(database_path))
+    private_key, public_key = generate_vapid_keys()
+    manager.config = {
+        'enabled': True,
+        'vapid_private_key': private_key,
+        'vapid_public_key': public_key,
+        'vapid_subject': 'mailto:test@example.com',
+        'timeout': 5
+    }
+
+    for name in ('active', 'expired'):
+        manager.save_subscription(service.subscription(name))
+    service.expire('expired')
+
+    success, result = manager.send_notification('テスト通知', 'プッシュサービスのスタンドインサーバーへの送信')
+    remaining = [subscription['endpoint'] for subscription in manager.get_subscriptions()]
+    server.shutdown()
+
+    print(json.dumps({'success': success, 'result': result, 'received': service.received,
+                      'remaining': remaining}, ensure_ascii=False, indent=2))
+    return success and result['sent'] == 1 and result['pruned'] == 1 and remaining == [service.endpoint('active')]
+
+def main():
+    """メイン関数"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--self-test':
+        sys.exit(0 if self_test() else 1)
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8766
+    server = start_stub_push_server(port=port)
+    print(f"購読のendpointを {server.service.endpoint('<名前>')} にすると送信がこのサーバーに届きます（Ctrl+Cで終了）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(server.service.stats())
+
+if __name__ == "__main__":
+    main()
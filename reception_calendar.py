@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+受付時間カレンダー - かよ皮膚科予約管理システム
+曜日ごとの受付時間（"09:00-12:30"・"12:00まで"・"休診"）を分単位の区間の表に変換し、
+祝日・休診日を除いた「受付中か」「次の受付時間」「期間内の受付時間の一覧」を
+NumPyでまとめて（多数の時刻を一度に）計算する
+"""
+
+import json
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# 1970-01-01（datetime64の起点）は木曜日
+EPOCH_WEEKDAY = 3
+
+# 受付時間設定
+DEFAULT_BOOKING_HOURS = {
+    "monday": {"morning": "09:00-12:00", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
+    "tuesday": {"morning": "09:00-12:30", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
+    "wednesday": {"morning": "09:00-12:30", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
+    "thursday": {"morning": "09:00-12:30", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
+    "friday": {"morning": "09:00-12:30", "afternoon": "14:00-17:00", "web": "12:00-16:00"},
+    "saturday": {"morning": "09:00-12:30", "afternoon": "休診", "web": "12:00まで"},
+    "sunday": {"morning": "休診", "afternoon": "休診", "web": "休診"}
+}
+
+# 次の受付時間を探す範囲（日）
+SEARCH_DAYS = 21
+
+MINUTE = np.timedelta64(1, 'm')
+NOT_A_TIME = np.datetime64('NaT', 'm')
+
+def parse_window(text):
+    """受付時間の文字列を(開始分, 終了分)のリストにする（"休診"は空、"12:00まで"は0時から）"""
+    text = (text or '').strip()
+    if not text or text == "休診":
+        return []
+
+    def minutes(value):
+        hour, minute = value.strip().split(':')
+        return int(hour) * 60 + int(minute)
+
+    if text.endswith("まで"):
+        return [(0, minutes(text[:-2]))]
+
+    windows = []
+    for part in text.split(','):
+        start, end = part.split('-')
+        windows.append((minutes(start), minutes(end)))
+    return windows
+
+def _nth_weekday(year, month, weekday, n):
+    """その月の第n週の曜日（0=月曜）"""
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+@lru_cache(maxsize=None)
+def national_holidays(year):
+    """国民の祝日（2020年以降の祝日法、春分・秋分の日は1980〜2099年の近似式）"""
+    offset = year - 1980
+    vernal = int(20.8431 + 0.242194 * offset - offset // 4)
+    autumnal = int(23.2488 + 0.242194 * offset - offset // 4)
+
+    holidays = {
+        date(year, 1, 1): "元日",
+        _nth_weekday(year, 1, 0, 2): "成人の日",
+        date(year, 2, 11): "建国記念の日",
+        date(year, 2, 23): "天皇誕生日",
+        date(year, 3, vernal): "春分の日",
+        date(year, 4, 29): "昭和の日",
+        date(year, 5, 3): "憲法記念日",
+        date(year, 5, 4): "みどりの日",
+        date(year, 5, 5): "こどもの日",
+        _nth_weekday(year, 7, 0, 3): "海の日",
+        date(year, 8, 11): "山の日",
+        _nth_weekday(year, 9, 0, 3): "敬老の日",
+        date(year, 9, autumnal): "秋分の日",
+        _nth_weekday(year, 10, 0, 2): "スポーツの日",
+        date(year, 11, 3): "文化の日",
+        date(year, 11, 23): "勤労感謝の日"
+    }
+
+    # 国民の休日（祝日に挟まれた平日）
+    for day in sorted(holidays):
+        between = day + timedelta(days=1)
+        if between not in holidays and between + timedelta(days=1) in holidays and between.weekday() != 6:
+            holidays[between] = "国民の休日"
+
+    # 振替休日（日曜日の祝日の後の最初の平日）
+    for day in sorted(holidays):
+        if day.weekday() == 6:
+            substitute = day + timedelta(days=1)
+            while substitute in holidays:
+                substitute += timedelta(days=1)
+            holidays[substitute] = "振替休日"
+
+    return holidays
+
+def _to_minutes(values):
+    """datetime・date・文字列・datetime64（単一または配列）を分単位のdatetime64配列にする"""
+    scalar = isinstance(values, (date, str, np.datetime64))
+    if isinstance(values, date) and not isinstance(values, datetime):
+        values = datetime.combine(values, datetime.min.time())
+    return np.atleast_1d(np.asarray(values, dtype='datetime64[m]')), scalar
+
+def _to_python(values, scalar):
+    """datetime64の配列をdatetime（単一の場合）またはそのまま返す"""
+    if not scalar:
+        return values
+    value = values[0]
+    return None if np.isnat(value) else value.astype(datetime)
+
+class ReceptionCalendar:
+    """曜日ごとの受付時間と祝日・休診日から受付時間を計算するクラス"""
+
+    def __init__(self, booking_hours=None, closed_dates=(), open_dates=(), national_holidays_closed=True):
+        self.booking_hours = booking_hours or DEFAULT_BOOKING_HOURS
+        self.closed_dates = {np.datetime64(d, 'D') for d in closed_dates}
+        self.open_dates = {np.datetime64(d, 'D') for d in open_dates}
+        self.national_holidays_closed = national_holidays_closed
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, booking_hours=None):
+        """設定（reception_calendar）から作成"""
+        config = config or {}
+        return cls(
+            booking_hours=config.get("booking_hours", booking_hours),
+            closed_dates=config.get("closed_dates", []),
+            open_dates=config.get("open_dates", []),
+            national_holidays_closed=config.get("national_holidays_closed", True)
+        )
+
+    def table(self, kind):
+        """曜日×区間の開始・終了（分）の表（区間のない部分は-1）"""
+        with self.lock:
+            if kind not in self.tables:
+                windows = [parse_window(self.booking_hours.get(day, {}).get(kind)) for day in WEEKDAYS]
+                width = max(1, max(len(w) for w in windows))
+                starts = np.full((7, width), -1, dtype=np.int64)
+                ends = np.full((7, width), -1, dtype=np.int64)
+                for i, day_windows in enumerate(windows):
+                    for j, (start, end) in enumerate(day_windows):
+                        starts[i, j] = start
+                        ends[i, j] = end
+                self.tables[kind] = (starts, ends)
+            return self.tables[kind]
+
+    def closed_days(self, days):
+        """祝日・休診日かどうか（日単位のdatetime64配列）"""
+        days = np.asarray(days, dtype='datetime64[D]')
+        closed = np.zeros(days.shape, dtype=bool)
+        if days.size == 0:
+            return closed
+
+        known = days[~np.isnat(days)]
+        if known.size == 0:
+            return closed
+
+        holidays = set(self.closed_dates)
+        if self.national_holidays_closed:
+            first = known.min().astype(date).year
+            last = known.max().astype(date).year
+            for year in range(first, last + 1):
+                holidays.update(np.datetime64(d, 'D') for d in national_holidays(year))
+        holidays -= self.open_dates
+
+        if holidays:
+            closed = np.isin(days, np.array(sorted(holidays), dtype='datetime64[D]'))
+        return closed
+
+    def is_closed_day(self, values, kind='web'):
+        """終日受付がない日か（祝日・休診日・受付時間のない曜日）"""
+        minutes, scalar = _to_minutes(values)
+        days = minutes.astype('datetime64[D]')
+        weekdays = (days.astype(np.int64) + EPOCH_WEEKDAY) % 7
+        starts, _ = self.table(kind)
+        result = self.closed_days(days) | ~(starts[weekdays] >= 0).any(axis=1)
+        return bool(result[0]) if scalar else result
+
+    def is_open(self, values, kind='web'):
+        """受付時間内か（単一の時刻ならbool、配列ならboolの配列）"""
+        minutes, scalar = _to_minutes(values)
+        days = minutes.astype('datetime64[D]')
+        weekdays = (days.astype(np.int64) + EPOCH_WEEKDAY) % 7
+        minute_of_day = (minutes - days).astype(np.int64)[:, None]
+
+        starts, ends = self.table(kind)
+        inside = ((starts[weekdays] <= minute_of_day) & (minute_of_day < ends[weekdays])).any(axis=1)
+        result = inside & ~self.closed_days(days) & ~np.isnat(minutes)
+        return bool(result[0]) if scalar else result
+
+    def windows(self, start, end, kind='web'):
+        """期間内の受付時間の(開始, 終了)の配列（期間と重なるもの、開始順）"""
+        (start,), _ = _to_minutes(start)
+        (end,), _ = _to_minutes(end)
+        days = np.arange(start.astype('datetime64[D]'), end.astype('datetime64[D]') + 1, dtype='datetime64[D]')
+        weekdays = (days.astype(np.int64) + EPOCH_WEEKDAY) % 7
+
+        starts, ends = self.table(kind)
+        day_starts = starts[weekdays]
+        day_ends = ends[weekdays]
+        valid = (day_starts >= 0) & ~self.closed_days(days)[:, None]
+
+        base = days.astype('datetime64[m]')[:, None]
+        window_starts = (base + day_starts * MINUTE)[valid]
+        window_ends = (base + day_ends * MINUTE)[valid]
+
+        overlap = (window_ends > start) & (window_starts < end)
+        order = np.argsort(window_starts[overlap], kind='stable')
+        return window_starts[overlap][order], window_ends[overlap][order]
+
+    def next_window(self, values, kind='web', search_days=SEARCH_DAYS):
+        """各時刻以降で最初の受付時間（受付中ならその時刻から）の(開始, 終了)、見つからなければNaT/None"""
+        minutes, scalar = _to_minutes(values)
+        result_starts = np.full(minutes.shape, NOT_A_TIME)
+        result_ends = np.full(minutes.shape, NOT_A_TIME)
+
+        valid = ~np.isnat(minutes)
+        if valid.any():
+            earliest = minutes[valid].min()
+            latest = minutes[valid].max() + np.timedelta64(search_days, 'D')
+            starts, ends = self.windows(earliest, latest, kind)
+            if starts.size:
+                # 終了がその時刻より後の最初の区間（区間は重ならず開始順なので終了も昇順）
+                index = np.searchsorted(ends, minutes[valid], side='right')
+                found = index < starts.size
+                index = np.minimum(index, starts.size - 1)
+
+                candidate_starts = np.maximum(starts[index], minutes[valid])
+                candidate_ends = ends[index]
+                within = found & (candidate_starts <= minutes[valid] + np.timedelta64(search_days, 'D'))
+
+                chosen_starts = np.where(within, candidate_starts, NOT_A_TIME)
+                chosen_ends = np.where(within, candidate_ends, NOT_A_TIME)
+                result_starts[valid] = chosen_starts
+                result_ends[valid] = chosen_ends
+
+        return _to_python(result_starts, scalar), _to_python(result_ends, scalar)
+
+    def holidays_between(self, start, end):
+        """期間内の祝日・休診日（日付, 名前）"""
+        first = datetime.fromisoformat(str(start)[:10]).date()
+        last = datetime.fromisoformat(str(end)[:10]).date()
+        names = {}
+        if self.national_holidays_closed:
+            for year in range(first.year, last.year + 1):
+                names.update(national_holidays(year))
+        names.update({d.astype(date): "休診日" for d in self.closed_dates})
+        opened = {d.astype(date) for d in self.open_dates}
+        return sorted((d, name) for d, name in names.items() if first <= d <= last and d not in opened)
+
+def load_reception_calendar(config_file='config_v3.json'):
+    """設定ファイルから受付時間カレンダーを作成（読めない場合は既定の受付時間）"""
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except Exception as e:
+        logger.warning(f"設定ファイルを読み込めないため既定の受付時間を使用します: {e}")
+        config = {}
+    return ReceptionCalendar.from_config(config.get("reception_calendar"))
+
+# シングルトンインスタンス
+_reception_calendar = None
+_reception_calendar_lock = threading.Lock()
+
+def get_reception_calendar():
+    """ReceptionCalendarのインスタンスを取得"""
+    global _reception_calendar
+    with _reception_calendar_lock:
+        if _reception_calendar is None:
+            _reception_calendar = load_reception_calendar()
+        return _reception_calendar
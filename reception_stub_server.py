@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+予約サイトのスタンドインサーバー - かよ皮膚科予約管理システム
+保存済みの実際のページ（top_page_*, reception_page_*, reception_form_*, confirmation_page_*,
+submit_result_corrected_*, confirmation_result_*）を返し、JobDispatcher.jspの各jobidを再現する
+応答の遅延・サーバーエラー・同時接続数と受付件数の上限を設定でき、オフラインで予約処理を検証・計測できる
+
+使用方法:
+  python reception_stub_server.py [ポート番号] [遅延(ミリ秒)] [サーバーエラーの割合(0-1)]
+  BOOKING_SITE_BASE_URL=http://127.0.0.1:8765 python hospital_booking_automation_v3.py --book
+"""
+
+import os
+import sys
+import glob
+import time
+import random
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# 置き換える予約サイトのホスト
+SITE_HOSTS = [
+    b"https://www4.tandt.co.jp",
+    b"http://www4.tandt.co.jp",
+    b"https://www5.tandt.co.jp",
+    b"http://www5.tandt.co.jp"
+]
+
+# サーバーエラー時に返すページ（予約処理は本文の「サーバーエラー」で判定する）
+SERVER_ERROR_PAGE = "<html><head><meta charset=\"UTF-8\"></head><body><p>サーバーエラーが発生しました。しばらくしてから再度お試しください。</p></body></html>"
+
+# 受付件数の上限に達した場合に返すページ
+CAPACITY_PAGE = "<html><head><meta charset=\"UTF-8\"></head><body><p>ただいま混み合っております。</p></body></html>"
+
+def _latest(pages_dir, pattern, contains=None, excludes=None):
+    """パターンに一致する最新のページ（条件に合うもの）"""
+    for path in sorted(glob.glob(os.path.join(pages_dir, pattern)), reverse=True):
+        with open(path, 'rb') as f:
+            content = f.read()
+        if contains is not None and contains not in content:
+            continue
+        if excludes is not None and excludes in content:
+            continue
+        return content
+    return None
+
+class StubSite:
+    """保存済みのページで予約サイトの応答を再現するクラス"""
+
+    def __init__(self, pages_dir='.', latency=0.0, jitter=0.0, error_rate=0.0, error_jobids=('rsvmodM04',),
+                 max_concurrent=None, max_bookings=None):
+        self.pages_dir = pages_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_jobids = tuple(error_jobids)
+        self.max_concurrent = max_concurrent
+        self.max_bookings = max_bookings
+        self.base_url = ''
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.bookings = 0
+        self.counts = {}
+        self.pages = self.load_pages()
+
+    def load_pages(self):
+        """保存済みのページを読み込む（受付中のページは受付ボタンのリンクがあるもの）"""
+        pages = {
+            'top': _latest(self.pages_dir, 'top_page_*.html'),
+            'reception_open': _latest(self.pages_dir, 'reception_page_*.html', contains=b'rsvmodM02'),
+            'reception_closed': _latest(self.pages_dir, 'reception_page_*.html', excludes=b'rsvmodM02'),
+            'form': _latest(self.pages_dir, 'reception_form_*.html'),
+            'confirmation': (_latest(self.pages_dir, 'confirmation_page_*.html')
+                             or _latest(self.pages_dir, 'submit_result_corrected_*.html')),
+            'result': _latest(self.pages_dir, 'confirmation_result_*.html')
+        }
+        missing = [name for name, content in pages.items() if content is None]
+        if missing:
+            logger.warning(f"保存済みのページが見つかりません: {', '.join(missing)}")
+        return pages
+
+    def page(self, name):
+        """ページの本文（予約サイトのホストをこのサーバーに置き換える）"""
+        content = self.pages.get(name)
+        if content is None:
+            return 404, f"<html><body>{name}のページがありません</body></html>".encode('utf-8')
+        for host in SITE_HOSTS:
+            content = content.replace(host, self.base_url.encode('ascii'))
+        return 200, content
+
+    def resolve(self, path, params):
+        """パスとパラメータから応答するjobidを判定"""
+        path = path.split(';')[0]
+        if path.endswith('index_p.html'):
+            return 'top'
+        if path.endswith('rsvmodM04.jsp'):
+            return 'rsvmodM04'
+        if path.endswith('JobDispatcher.jsp'):
+            jobid = params.get('jobid', [''])[0]
+            if jobid == 'rsvmod000':
+                return params.get('nj', [''])[0]
+            return jobid
+        return None
+
+    def handle(self, method, path, params):
+        """リクエストに応答し、(ステータス, 本文)を返す"""
+        jobid = self.resolve(path, params)
+
+        with self.lock:
+            self.counts[jobid] = self.counts.get(jobid, 0) + 1
+            if self.max_concurrent is not None and self.in_flight >= self.max_concurrent:
+                return 503, CAPACITY_PAGE.encode('utf-8')
+            self.in_flight += 1
+
+        try:
+            delay = self.latency + random.uniform(0, self.jitter)
+            if delay > 0:
+                time.sleep(delay)
+
+            if jobid in self.error_jobids and random.random() < self.error_rate:
+                return 200, SERVER_ERROR_PAGE.encode('utf-8')
+
+            if jobid == 'top':
+                return self.page('top')
+            if jobid == 'rsvmodG01':
+                with self.lock:
+                    is_open = self.max_bookings is None or self.bookings < self.max_bookings
+                return self.page('reception_open' if is_open else 'reception_closed')
+            if jobid == 'rsvmodM02':
+                return self.page('form')
+            if jobid == 'rsvmodM04':
+                return self.page('confirmation')
+            if jobid == 'rsvmodM06':
+                with self.lock:
+                    if self.max_bookings is not None and self.bookings >= self.max_bookings:
+                        return 200, CAPACITY_PAGE.encode('utf-8')
+                    self.bookings += 1
+                return self.page('result')
+
+            return 404, f"<html><body>未対応のjobidです: {jobid}</body></html>".encode('utf-8')
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def stats(self):
+        """jobidごとのリクエスト数と受付件数"""
+        with self.lock:
+            return {'requests': dict(self.counts), 'bookings': self.bookings}
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """StubSiteにリクエストを渡すハンドラー"""
+
+    def _respond(self, method):
+        parts = urlsplit(self.path)
+        params = parse_qs(parts.query, keep_blank_values=True)
+        if method == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode('utf-8', errors='replace')
+            for key, values in parse_qs(body, keep_blank_values=True).items():
+                params.setdefault(key, []).extend(values)
+
+        status, content = self.server.site.handle(method, parts.path, params)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=UTF-8')
+        self.send_header('Content-Length', str(len(content)))
+        if 'JSESSIONID' not in (self.headers.get('Cookie') or ''):
+            self.send_header('Set-Cookie', f"JSESSIONID={random.getrandbits(128):032X}; Path=/rsvsys; HttpOnly")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        self._respond('POST')
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+def start_stub_server(host='127.0.0.1', port=0, **settings):
+    """スタンドインサーバーをバックグラウンドで起動（server.site.base_urlが接続先）"""
+    server = ThreadingHTTPServer((host, port), StubRequestHandler)
+    server.daemon_threads = True
+    server.site = StubSite(**settings)
+    server.site.base_url = f"http://{host}:{server.server_address[1]}"
+
+    thread = threading.Thread(target=server.serve_forever, name='reception-stub-server', daemon=True)
+    thread.start()
+    logger.info(f"スタンドインサーバーを起動しました: {server.site.base_url}")
+    return server
+
+def main():
+    """メイン関数"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+    server = start_stub_server(port=port, pages_dir=os.path.dirname(os.path.abspath(__file__)),
+                               latency=latency, error_rate=error_rate)
+    print(f"BOOKING_SITE_BASE_URL={server.site.base_url} を設定すると予約処理がこのサーバーに接続します（Ctrl+Cで終了）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(server.site.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+予約サイトへの送信の調整 - かよ皮膚科予約管理システム
+同時に動く予約処理・待ち人数の取得・解析ツールから予約サイトへの送信をプロセス全体でまとめて制御する
+- ホストごとのトークンバケットで送信の間隔を空ける
+- ホストごとの同時接続数の上限
+- 「サーバーエラー」の応答が続いたら一定時間送信を止める（全処理で共有）
+- 同じURLへの実行中のGETは1回だけ送信し、結果を共有する（クッキーを発行する応答は共有しない）
+"""
+
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 調整する既定のホスト（末尾一致）
+DEFAULT_HOSTS = ["tandt.co.jp"]
+
+# 既定の制限
+DEFAULT_LIMITS = {
+    "rate_per_second": 2.0,   # 平均の送信回数（回/秒）
+    "burst": 5,               # 続けて送信できる回数
+    "max_concurrent": 4,      # 同時接続数
+    "failure_threshold": 3,   # 送信を止めるまでの連続エラー回数
+    "reset_seconds": 60,      # 送信を止める時間（秒）
+    "acquire_timeout": 60     # 送信の順番を待つ上限（秒）
+}
+
+SERVER_ERROR_MARKERS = ("サーバーエラー", "サーバエラー")
+
+class RequestGovernorError(requests.exceptions.RequestException):
+    """送信を調整できなかった（順番待ちの時間切れなど）"""
+
+class CircuitOpenError(RequestGovernorError):
+    """サーバーエラーが続いたため送信を止めている"""
+
+    def __init__(self, host, retry_after):
+        super().__init__(f"サーバーエラーが続いているため{host}への送信を停止中です（あと{retry_after:.0f}秒）")
+        self.host = host
+        self.retry_after = retry_after
+
+def is_server_error_response(response):
+    """サーバーエラーの応答か（5xxまたは本文に「サーバーエラー」）"""
+    if response.status_code >= 500:
+        return True
+    content_type = response.headers.get('Content-Type', '')
+    if content_type and 'html' not in content_type and 'text' not in content_type:
+        return False
+    text = response.text
+    return any(marker in text for marker in SERVER_ERROR_MARKERS)
+
+def sets_cookies(response):
+    """応答（リダイレクトを含む）がクッキーを発行したか"""
+    return any(r.cookies or 'Set-Cookie' in r.headers for r in response.history + [response])
+
+class TokenBucket:
+    """一定の割合で補充されるトークンを1回の送信ごとに消費する"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """トークンを1つ予約し、使えるまでの秒数を返す"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def _refund(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def acquire(self, timeout=None):
+        """トークンを取得（timeout秒以内に使えない場合はFalse）"""
+        delay = self._reserve()
+        if timeout is not None and delay > timeout:
+            self._refund()
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+class CircuitBreaker:
+    """連続したエラーで開き、reset_seconds後は1件の試しの送信の結果で閉じるか再び開くかが決まる"""
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+
+    def _remaining(self):
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def retry_after(self):
+        """送信を再開できるまでの秒数（送信できる場合は0）"""
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return self._remaining()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            if self._remaining() > 0:
+                return 'open'
+            return 'half_open'
+
+    def admit(self, timeout):
+        """送信してよいかを判定し、(状態, 再開までの秒数) を返す
+
+        状態は 'closed'（送信できる）・'probe'（試しの送信として送信できる）・'open'（停止中）・
+        'timeout'（試しの送信の結果待ちの時間切れ）のいずれか
+        停止時間が過ぎた後は1件だけを試しの送信として通し、他はその結果が出るまで待たせる
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.opened_at is None:
+                    return 'closed', 0.0
+                remaining = self._remaining()
+                if remaining > 0:
+                    return 'open', remaining
+                if not self.probing:
+                    self.probing = True
+                    logger.info("送信の停止時間が過ぎたため、試しに1件送信します")
+                    return 'probe', 0.0
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    return 'timeout', 0.0
+                self.condition.wait(wait)
+
+    def end_probe(self):
+        """結果を記録せずに終わった試しの送信を取り消す（次の呼び出し元が試しの送信になる）"""
+        with self.condition:
+            if self.probing:
+                self.probing = False
+                self.condition.notify_all()
+
+    def record_success(self):
+        with self.condition:
+            if self.opened_at is not None:
+                logger.info("予約サイトの応答が回復したため送信を再開します")
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+            self.condition.notify_all()
+
+    def record_failure(self):
+        with self.condition:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"サーバーエラーが{self.failures}回続いたため{self.reset_seconds}秒間送信を停止します")
+                self.opened_at = time.monotonic()
+            self.probing = False
+            self.condition.notify_all()
+
+class _InFlight:
+    """実行中のGET（結果を待つ他の呼び出し元と共有）"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+        self.followers = 0
+
+class HostGovernor:
+    """1つのホストへの送信を調整するクラス"""
+
+    def __init__(self, host, limits):
+        self.host = host
+        self.limits = limits
+        self.bucket = TokenBucket(limits["rate_per_second"], limits["burst"])
+        self.slots = threading.BoundedSemaphore(limits["max_concurrent"])
+        self.breaker = CircuitBreaker(limits["failure_threshold"], limits["reset_seconds"])
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.stats = {"sent": 0, "shared": 0, "rejected": 0, "server_errors": 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    @contextmanager
+    def slot(self):
+        """送信の順番を取得（停止中は CircuitOpenError、時間切れは RequestGovernorError）
+
+        停止時間が過ぎた直後は試しの送信を1件だけ通し、他の呼び出し元はその結果が記録されるまで待つ
+        """
+        timeout = self.limits["acquire_timeout"]
+        started = time.monotonic()
+        state, retry_after = self.breaker.admit(timeout)
+        if state == 'open':
+            self._count("rejected")
+            raise CircuitOpenError(self.host, retry_after)
+        if state == 'timeout':
+            raise RequestGovernorError(f"{self.host}への試しの送信の結果待ちが{timeout}秒を超えました")
+
+        try:
+            if not self.bucket.acquire(max(0.0, timeout - (time.monotonic() - started))):
+                raise RequestGovernorError(f"{self.host}への送信の順番待ちが{timeout}秒を超えました")
+            if not self.slots.acquire(timeout=max(0.0, timeout - (time.monotonic() - started))):
+                raise RequestGovernorError(f"{self.host}への同時接続数の上限で{timeout}秒待機しました")
+            try:
+                self._count("sent")
+                yield
+            finally:
+                self.slots.release()
+        finally:
+            if state == 'probe':
+                self.breaker.end_probe()
+
+    def send(self, session, method, url, **kwargs):
+        """リクエストを送信し、応答でサーバーエラーの状態を更新"""
+        # 試しの送信の結果を順番を返す前に記録する（待っている呼び出し元が続けて試しの送信をしないように）
+        with self.slot():
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.breaker.record_failure()
+                raise
+
+            if is_server_error_response(response):
+                self._count("server_errors")
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        return response
+
+    def shared_get(self, key, session, url, **kwargs):
+        """同じキーの実行中のGETがあればその結果を待ち、なければ送信する
+
+        待っていた応答がクッキーを発行した場合は、別のセッションが同じ予約サイトのセッションを
+        使わないように、結果を共有せずに自分のセッションで送信し直す
+        """
+        with self.lock:
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.in_flight[key] = _InFlight()
+            else:
+                flight.followers += 1
+
+        if leader:
+            try:
+                flight.response = self.send(session, 'GET', url, **kwargs)
+            except Exception as e:
+                flight.error = e
+            finally:
+                with self.lock:
+                    del self.in_flight[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        if not leader and sets_cookies(flight.response):
+            # クッキーを発行する応答（予約サイトのセッションの開始など）は共有せず、自分のセッションで送信する
+            return self.send(session, 'GET', url, **kwargs)
+        if not leader:
+            self._count("shared")
+        return flight.response
+
+class RequestGovernor:
+    """予約サイトへの送信をプロセス全体で調整するクラス（対象外のホストはそのまま送信）"""
+
+    def __init__(self, hosts=None, limits=None, host_limits=None):
+        self.hosts = list(DEFAULT_HOSTS if hosts is None else hosts)
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.host_limits = host_limits or {}
+        self.governors = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """設定（request_governor）から作成"""
+        config = dict(config or {})
+        hosts = config.pop("hosts", None)
+        host_limits = config.pop("host_limits", {})
+        return cls(hosts=hosts, limits=config, host_limits=host_limits)
+
+    def _governed(self, host):
+        return any(host == pattern or host.endswith('.' + pattern) for pattern in self.hosts)
+
+    def governor_for(self, url):
+        """URLのホストの調整用オブジェクト（対象外のホストはNone）"""
+        host = (urlsplit(url).hostname or '').lower()
+        if not host or not self._governed(host):
+            return None
+        with self.lock:
+            if host not in self.governors:
+                limits = dict(self.limits, **self.host_limits.get(host, {}))
+                self.governors[host] = HostGovernor(host, limits)
+            return self.governors[host]
+
+    @contextmanager
+    def slot(self, url):
+        """ブラウザでの遷移など、requests以外で送信するときの順番を取得"""
+        governor = self.governor_for(url)
+        if governor is None:
+            yield
+            return
+        with governor.slot():
+            yield
+
+    def request(self, session, method, url, **kwargs):
+        """セッションでリクエストを送信（同じ内容の実行中のGETは結果を共有）"""
+        governor = self.governor_for(url)
+        if governor is None:
+            return session.request(method, url, **kwargs)
+
+        if method.upper() != 'GET' or kwargs.get('stream'):
+            return governor.send(session, method, url, **kwargs)
+
+        key = (
+            url,
+            repr(sorted((kwargs.get('params') or {}).items())),
+            repr(sorted((kwargs.get('headers') or {}).items())),
+            repr(sorted(session.cookies.items())),
+            repr(sorted((kwargs.get('cookies') or {}).items()))
+        )
+        return governor.shared_get(key, session, url, **kwargs)
+
+    def get(self, session, url, **kwargs):
+        return self.request(session, 'GET', url, **kwargs)
+
+    def status(self):
+        """ホストごとの状態（停止中か・送信回数など）"""
+        with self.lock:
+            governors = list(self.governors.values())
+        return {
+            governor.host: dict(governor.stats, state=governor.breaker.state,
+                                retry_after=round(governor.breaker.retry_after(), 1))
+            for governor in governors
+        }
+
+def load_request_governor(config_file='config_v3.json'):
+    """設定ファイルから作成（読めない場合は既定の制限）"""
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except Exception as e:
+        logger.warning(f"設定ファイルを読み込めないため既定の送信制限を使用します: {e}")
+        config = {}
+    return RequestGovernor.from_config(config.get("request_governor"))
+
+# シングルトンインスタンス
+_request_governor = None
+_request_governor_lock = threading.Lock()
+
+def get_request_governor():
+    """RequestGovernorのインスタンスを取得"""
+    global _request_governor
+    with _request_governor_lock:
+        if _request_governor is None:
+            _request_governor = load_request_governor()
+        return _request_governor
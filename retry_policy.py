@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+再試行の方針 - かよ皮膚科予約管理システム
+予約処理（ブラウザ版・軽量版）の再試行を1つの方針にまとめる
+- 揺らぎ（ジッター）付きの指数的な待機時間
+- 受付時間の終了（期限）を過ぎる再試行はしない
+- エラーの種類で再試行するか・どれだけ待つかを決める
+- 手順ごとの再試行（確定の送信に失敗してもトップページからやり直さない）
+"""
+
+import time
+import random
+import logging
+
+import requests
+
+from request_governor import CircuitOpenError, RequestGovernorError
+
+logger = logging.getLogger(__name__)
+
+# 既定の方針
+DEFAULT_RETRY_POLICY = {
+    "max_attempts": 3,          # 予約処理全体の試行回数
+    "base_delay": 30,           # 予約処理全体をやり直すまでの待機時間（秒、回数ごとに倍）
+    "max_delay": 300,           # 待機時間の上限（秒）
+    "multiplier": 2.0,
+    "jitter": 0.5,              # 待機時間を最大この割合だけ短くする（同時に再試行しないように）
+    "server_error_delay": 60,   # サーバーエラー後の待機時間（秒、回数ごとに倍）
+    "max_server_errors": 2,     # 予約処理全体でサーバーエラーが続いたら終了する回数
+    "step_attempts": 3,         # 1つの手順の送信回数
+    "step_base_delay": 2,       # 手順を再送するまでの待機時間（秒、回数ごとに倍）
+    "step_max_delay": 20
+}
+
+# 再試行しないエラー
+FATAL_ERRORS = {"client_error"}
+
+# 送信が予約サイトに届いていないことが確実なエラー（POSTも再送できる）
+# サーバーエラー（5xx・429・エラーページ）は受付を記録した後に返されることがあるため含めない
+SAFE_TO_RESEND = {"circuit_open", "connect", "busy"}
+
+class ServerErrorPage(requests.exceptions.RequestException):
+    """予約サイトがサーバーエラーのページを返した"""
+
+    def __init__(self, step, response):
+        super().__init__(f"サーバーエラーが発生しました（{step}）", response=response)
+        self.step = step
+
+def classify_error(error):
+    """エラーの種類（circuit_open・server_error・connect・timeout・connection・busy・client_error・unknown）"""
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, RequestGovernorError):
+        return "busy"
+    if isinstance(error, ServerErrorPage):
+        return "server_error"
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        if status >= 500 or status == 429:
+            return "server_error"
+        return "client_error"
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return "connect"
+    if isinstance(error, requests.exceptions.Timeout):
+        return "timeout"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "connection"
+    if "サーバーエラー" in str(error) or "サーバエラー" in str(error):
+        return "server_error"
+    return "unknown"
+
+class RetryPolicy:
+    """再試行の方針（設定値のみを持ち、実行ごとの状態はbegin()で作るRetryRunが持つ）"""
+
+    def __init__(self, sleep=time.sleep, clock=time.time, **settings):
+        unknown = set(settings) - set(DEFAULT_RETRY_POLICY)
+        if unknown:
+            raise ValueError(f"不明な再試行の設定です: {', '.join(sorted(unknown))}")
+        settings = dict(DEFAULT_RETRY_POLICY, **settings)
+        self.max_attempts = settings["max_attempts"]
+        self.base_delay = settings["base_delay"]
+        self.max_delay = settings["max_delay"]
+        self.multiplier = settings["multiplier"]
+        self.jitter = settings["jitter"]
+        self.server_error_delay = settings["server_error_delay"]
+        self.max_server_errors = settings["max_server_errors"]
+        self.step_attempts = settings["step_attempts"]
+        self.step_base_delay = settings["step_base_delay"]
+        self.step_max_delay = settings["step_max_delay"]
+        self.sleep = sleep
+        self.clock = clock
+
+    @classmethod
+    def from_config(cls, config, **defaults):
+        """設定（retry_policy）から作成（defaultsは設定がない項目の値）"""
+        return cls(**dict(defaults, **(config or {})))
+
+    def backoff(self, attempt, base, limit):
+        """attempt回目の待機時間（揺らぎ付き）"""
+        delay = min(limit, base * self.multiplier ** max(0, attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def begin(self, deadline=None):
+        """1回の予約処理の再試行の状態を作成（deadlineは受付終了時刻のUNIX時刻またはdatetime）"""
+        if deadline is not None and not isinstance(deadline, (int, float)):
+            deadline = deadline.timestamp()
+        return RetryRun(self, deadline)
+
+class RetryRun:
+    """1回の予約処理の試行回数・サーバーエラー回数・期限"""
+
+    def __init__(self, policy, deadline=None):
+        self.policy = policy
+        self.deadline = deadline
+        self.attempt = 0
+        self.server_errors = 0
+
+    def remaining(self):
+        """期限までの秒数（期限がない場合はNone）"""
+        if self.deadline is None:
+            return None
+        return self.deadline - self.policy.clock()
+
+    def _within_deadline(self, delay):
+        remaining = self.remaining()
+        return remaining is None or delay < remaining
+
+    def next_attempt(self):
+        """次の試行を開始（試行回数を返す）"""
+        self.attempt += 1
+        return self.attempt
+
+    def record_success(self):
+        """成功した（サーバーエラーの連続回数をリセット）"""
+        self.server_errors = 0
+
+    def next_delay(self, error):
+        """予約処理全体をやり直すまでの秒数と理由（やり直さない場合は秒数がNone）"""
+        kind = classify_error(error)
+        policy = self.policy
+
+        if kind in FATAL_ERRORS:
+            return None, "再試行できないエラー"
+
+        if kind == "server_error":
+            self.server_errors += 1
+            if self.server_errors >= policy.max_server_errors:
+                return None, f"サーバーエラーが{policy.max_server_errors}回連続で発生した"
+            delay = policy.backoff(self.server_errors, policy.server_error_delay, policy.max_delay)
+        else:
+            delay = policy.backoff(self.attempt, policy.base_delay, policy.max_delay)
+
+        if kind == "circuit_open":
+            delay = max(delay, error.retry_after)
+
+        if self.attempt >= policy.max_attempts:
+            return None, "最大リトライ回数に達した"
+        if not self._within_deadline(delay):
+            return None, "受付時間内に再試行できない"
+        return delay, kind
+
+    def wait(self, seconds):
+        """待機"""
+        if seconds > 0:
+            self.policy.sleep(seconds)
+
+    def run_step(self, step, function, idempotent=True, on_retry=None):
+        """手順を実行し、一時的なエラーはその手順だけ再送する
+
+        idempotent=False（POSTなど）の場合は、送信が届いていないことが確実なエラーのみ再送する
+        on_retryは(step, 回数, 待機秒数, エラー)を受け取る
+        """
+        policy = self.policy
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return function()
+            except Exception as e:
+                kind = classify_error(e)
+                if kind in FATAL_ERRORS or kind == "unknown":
+                    raise
+                if not idempotent and kind not in SAFE_TO_RESEND:
+                    raise
+                if attempt >= policy.step_attempts:
+                    raise
+
+                delay = policy.backoff(attempt, policy.step_base_delay, policy.step_max_delay)
+                if kind == "circuit_open":
+                    delay = max(delay, e.retry_after)
+                if not self._within_deadline(delay):
+                    raise
+
+                if on_retry:
+                    on_retry(step, attempt, delay, e)
+                else:
+                    logger.warning(f"{step}の送信に失敗したため{delay:.1f}秒後に再送します（{attempt}/{policy.step_attempts}）: {e}")
+                self.wait(delay)
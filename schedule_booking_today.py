@@ -1,24 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-今日の9時15分に予約を実行するスケジュールプログラム
+今日の予約を実行するスケジュールプログラム
+待ち人数の履歴がある場合は最も空いている時刻に実行する
 """
 
 import schedule
-import time
 import logging
 from datetime import datetime
 from hospital_booking_automation_v3 import HospitalBookingAutomationV3
+from booking_logging import configure_logging, booking_log_context
+from deadline_waiter import DeadlineWaiter
 
 # ログ設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/schedule_booking.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+configure_logging('logs/schedule_booking.log')
 logger = logging.getLogger(__name__)
 
 def execute_booking():
@@ -29,7 +24,8 @@ def execute_booking():
         
         # 予約プログラムを実行
         automation = HospitalBookingAutomationV3()
-        result = automation.execute_lightweight_booking()
+        with booking_log_context(f"today-{datetime.now().strftime('%Y%m%d%H%M')}"):
+            result = automation.book()
         
         if result:
             logger.info("✅ 予約が成功しました！")
@@ -45,18 +41,25 @@ def main():
     """メイン処理"""
     logger.info("予約スケジューラーを開始します")
     
-    # 今日の9時15分に予約を実行
-    schedule.every().day.at("09:15").do(execute_booking)
+    # 待ち人数の履歴から午前の受付で最も空いている時刻を推定（履歴がなければ9時15分）
+    automation = HospitalBookingAutomationV3()
+    if automation.reception_calendar.is_closed_day(datetime.now(), 'morning'):
+        logger.info("今日は休診日（祝日）のため予約をスケジュールしません")
+        return
     
-    logger.info("今日の9時15分に予約を実行するスケジュールを設定しました")
+    today = datetime.now().strftime("%A").lower()
+    time_str = automation.predict_booking_time(today, automation.booking_hours[today]["morning"], "09:15")
+    
+    schedule.every().day.at(time_str).do(execute_booking)
+    
+    logger.info(f"今日の{time_str}に予約を実行するスケジュールを設定しました")
     logger.info("スケジューラーを実行中... (Ctrl+Cで停止)")
     
-    try:
-        while True:
-            schedule.run_pending()
-            time.sleep(60)  # 1分ごとにチェック
-    except KeyboardInterrupt:
-        logger.info("スケジューラーを停止しました")
+    # 次の予定の時刻まで待機（Ctrl+C・SIGTERMで停止）
+    waiter = DeadlineWaiter()
+    waiter.install_signal_handlers()
+    waiter.run_schedule()
+    logger.info("スケジューラーを停止しました")
 
 if __name__ == "__main__":
     main()
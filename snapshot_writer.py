@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTMLスナップショット保存 - かよ皮膚科予約管理システム
+予約処理中に取得したページを別スレッドで圧縮保存し、予約処理をファイル書き込みで待たせない
+同じ内容のページは重複して保存せず、日付ごとのディレクトリに保存して容量・保存期間で削除する
+"""
+
+import os
+import gzip
+import time
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# スナップショットの保存先
+SNAPSHOT_DIR = 'snapshots'
+
+def _compress(data, level):
+    """zstd（インストールされている場合）またはgzipで圧縮し、(データ, 拡張子)を返す"""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(data), '.zst'
+    return gzip.compress(data, compresslevel=level), '.gz'
+
+def read_snapshot(path):
+    """保存したスナップショットをHTML文字列として読み込む"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("zstd形式のスナップショットを読むにはzstandardが必要です")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif path.endswith('.gz'):
+        data = gzip.decompress(data)
+
+    return data.decode('utf-8', errors='replace')
+
+class SnapshotWriter:
+    """HTMLスナップショットをバックグラウンドで保存するクラス"""
+
+    def __init__(self, directory=SNAPSHOT_DIR, max_queue=32, max_total_mb=200, retention_days=14, compress_level=6):
+        self.directory = directory
+        self.max_total_bytes = int(max_total_mb * 1024 * 1024)
+        self.retention_days = retention_days
+        self.compress_level = compress_level
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.known_digests = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.writes_since_prune = 0
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """書き込みスレッドで保存ごとに呼び出す関数（prefix, saved_at, html）を登録"""
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def start(self):
+        """書き込みスレッドを開始"""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+                self.thread.start()
+
+    def save(self, prefix, html):
+        """スナップショットを書き込み待ちに追加（待ちが一杯の場合は保存せずFalse）"""
+        if not html:
+            return False
+
+        self.start()
+        try:
+            self.queue.put_nowait((prefix, datetime.now(), html))
+            return True
+        except queue.Full:
+            logger.warning(f"スナップショットの書き込み待ちが一杯のため保存しませんでした: {prefix}")
+            return False
+
+    def flush(self, timeout=10):
+        """書き込み待ちがなくなるまで待機"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.queue.unfinished_tasks == 0
+
+    def _run(self):
+        """書き込みスレッド"""
+        while True:
+            prefix, saved_at, html = self.queue.get()
+            try:
+                self._write(prefix, saved_at, html)
+            except Exception as e:
+                logger.error(f"スナップショット保存エラー: {e}")
+
+            try:
+                for listener in list(self.listeners):
+                    listener(prefix, saved_at, html)
+            except Exception as e:
+                logger.error(f"スナップショットの後処理エラー: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _load_known_digests(self):
+        """保存済みファイル名から内容ハッシュを読み込む"""
+        digests = {}
+        for path in self._snapshot_files():
+            digest = os.path.basename(path).split('.')[0].rsplit('_', 1)[-1]
+            digests[digest] = path
+        return digests
+
+    def _write(self, prefix, saved_at, html):
+        """圧縮して保存（同じ内容が保存済みの場合は保存しない）"""
+        data = html.encode('utf-8') if isinstance(html, str) else html
+        digest = hashlib.sha256(data).hexdigest()[:16]
+
+        if self.known_digests is None:
+            self.known_digests = self._load_known_digests()
+
+        existing = self.known_digests.get(digest)
+        if existing and os.path.exists(existing):
+            logger.debug(f"同じ内容のスナップショットが保存済みです: {prefix} -> {existing}")
+            return existing
+
+        compressed, extension = _compress(data, self.compress_level)
+        day_dir = os.path.join(self.directory, saved_at.strftime('%Y-%m-%d'))
+        os.makedirs(day_dir, exist_ok=True)
+
+        path = os.path.join(day_dir, f"{prefix}_{saved_at.strftime('%H%M%S_%f')}_{digest}.html{extension}")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+
+        self.known_digests[digest] = path
+        logger.debug(f"スナップショットを保存しました: {path}（{len(data)} → {len(compressed)}バイト）")
+
+        self.writes_since_prune += 1
+        if self.writes_since_prune >= 20:
+            self.prune()
+        return path
+
+    def _snapshot_files(self):
+        """保存済みのスナップショットファイル一覧"""
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.gz') or name.endswith('.zst'):
+                    files.append(os.path.join(root, name))
+        return files
+
+    def prune(self):
+        """保存期間を過ぎたものと、容量の上限を超えた古いものを削除"""
+        self.writes_since_prune = 0
+        cutoff = time.time() - self.retention_days * 86400
+        entries = []
+        removed = 0
+
+        for path in self._snapshot_files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime < cutoff:
+                os.remove(path)
+                removed += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_total_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+
+        # 空になった日付ディレクトリを削除
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                day_dir = os.path.join(self.directory, name)
+                if os.path.isdir(day_dir) and not os.listdir(day_dir):
+                    os.rmdir(day_dir)
+
+        if removed:
+            self.known_digests = None
+            logger.info(f"古いスナップショットを{removed}件削除しました")
+        return removed
+
+# シングルトンインスタンス
+_snapshot_writer = None
+
+def get_snapshot_writer(**options):
+    """SnapshotWriterのインスタンスを取得"""
+    global _snapshot_writer
+    if _snapshot_writer is None:
+        _snapshot_writer = SnapshotWriter(**options)
+        atexit.register(_snapshot_writer.flush)
+    return _snapshot_writer
@@ -25,8 +25,33 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // カレンダー連携状況の確認
     checkCalendarStatus();
+    
+    // 事前予約の状態変化をサーバーから受け取る（SSE）
+    subscribeBookingEvents({
+        advance_bookings_changed: handleAdvanceBookingChange
+    });
 });
 
+/**
+ * 事前予約の状態変化を反映
+ */
+function handleAdvanceBookingChange(change) {
+    const item = document.querySelector(`.booking-item[data-id="${change.id}"]`);
+    
+    // ステータス変更は該当カードのみ更新し、それ以外は一覧を再読み込み
+    if (change.action === 'status' && item) {
+        item.className = `booking-item ${change.status}`;
+        const badge = item.querySelector('.status-badge');
+        if (badge) {
+            badge.className = `status-badge ${change.status}`;
+            badge.textContent = getStatusText(change.status);
+        }
+        return;
+    }
+    
+    loadAdvanceBookings();
+}
+
 /**
  * 日付入力フィールドの初期化
  */
@@ -65,10 +90,36 @@ function initializeDateInputs() {
         if (executionDateValue >= targetDate) {
             showMessage('実行日は予約希望日より前の日付を選択してください', 'error');
             this.value = '';
+            return;
         }
+        
+        checkReceptionDay(this);
     });
 }
 
+/**
+ * 実行日が受付日（休診日・祝日でない）かの確認
+ */
+async function checkReceptionDay(input) {
+    const value = input.value;
+    if (!value) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/api/reception-windows?kind=morning&start=${value}&days=1`);
+        const result = await response.json();
+        
+        if (result.success && result.windows.length === 0 && input.value === value) {
+            const holiday = result.holidays.length > 0 ? `（${result.holidays[0].name}）` : '';
+            showMessage(`実行日は休診日です${holiday}。受付のある日を選択してください`, 'error');
+            input.value = '';
+        }
+    } catch (error) {
+        console.error('受付日確認エラー:', error);
+    }
+}
+
 /**
  * カレンダー連携状況の確認
  */
@@ -135,7 +135,20 @@ async function handleFormSubmit(event) {
     // 予約状況の表示
     showBookingStatus('processing', '予約処理中', '予約システムに接続しています...');
     
+    // サーバーから進捗を受け取る（SSE）
+    formData.progress_id = createProgressId();
+    const progressSource = subscribeBookingEvents({
+        booking_progress: (progress) => {
+            if (progress.progress_id === formData.progress_id) {
+                updateBookingProgress(progress);
+            }
+        }
+    });
+    
     try {
+        // 購読の登録前に発行された進捗（started など）を取りこぼさないように接続を待ってから送信
+        await waitForBookingEvents(progressSource);
+        
         // APIに予約リクエストを送信
         const response = await executeBooking(formData);
         
@@ -162,6 +175,11 @@ async function handleFormSubmit(event) {
         handleError(error, '予約処理');
         
     } finally {
+        // 進捗の購読を終了
+        if (progressSource) {
+            progressSource.close();
+        }
+        
         // 送信ボタンの再有効化
         if (submitButton) {
             submitButton.disabled = false;
@@ -277,6 +295,35 @@ async function executeBooking(formData) {
     return await response.json();
 }
 
+/**
+ * 進捗IDの生成
+ */
+function createProgressId() {
+    return `${Date.now()}-${Math.random().toString(36).slice(2, 10)}`;
+}
+
+/**
+ * 予約処理の進捗を表示
+ */
+function updateBookingProgress(progress) {
+    const progressMessages = {
+        'started': `予約処理を開始しました（試行 ${progress.attempt || 1}/${progress.max_attempts || 1}）`,
+        'top_page_fetched': 'トップページを取得しました',
+        'reception_reached': '順番受付ページに到達しました',
+        'wait_count_parsed': `現在の待ち人数: ${progress.wait_count}人`,
+        'submitted': '受付フォームを送信しました',
+        'confirmed': '受付が確定しました',
+        'handoff': `ブラウザで続きを実行します: ${progress.reason || ''}`,
+        'retrying': `再試行します（${progress.wait_seconds || 0}秒後）: ${progress.reason || ''}`,
+        'failed': `処理に失敗しました: ${progress.reason || ''}`
+    };
+    
+    const statusMessage = document.getElementById('statusMessage');
+    if (statusMessage && progressMessages[progress.step]) {
+        statusMessage.textContent = progressMessages[progress.step];
+    }
+}
+
 /**
  * 予約状況の表示
  */
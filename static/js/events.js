@@ -0,0 +1,55 @@
+// 予約管理アプリ - サーバー送信イベント（SSE）の購読
+
+/**
+ * 予約イベントの購読を開始
+ * handlers: { イベント名: function(data) } の形式
+ */
+function subscribeBookingEvents(handlers) {
+    if (!('EventSource' in window)) {
+        console.log('EventSource はサポートされていません');
+        return null;
+    }
+    
+    const source = new EventSource('/api/events');
+    
+    Object.entries(handlers).forEach(([eventName, handler]) => {
+        source.addEventListener(eventName, (event) => {
+            try {
+                handler(JSON.parse(event.data));
+            } catch (error) {
+                console.error(`イベント処理エラー (${eventName}):`, error);
+            }
+        });
+    });
+    
+    source.addEventListener('error', () => {
+        // 接続が切れた場合はブラウザが自動で再接続する
+        console.log('予約イベントの接続が切断されました（再接続します）');
+    });
+    
+    return source;
+}
+
+/**
+ * 購読の接続完了を待つ（接続できない場合もtimeoutMs後に続行）
+ * サーバーは接続を受け付けた時点で購読を登録するため、open後に発行されたイベントは失われない
+ */
+function waitForBookingEvents(source, timeoutMs = 3000) {
+    return new Promise((resolve) => {
+        if (!source || source.readyState === EventSource.OPEN) {
+            resolve(true);
+            return;
+        }
+        
+        const timer = setTimeout(() => finish(false), timeoutMs);
+        function finish(opened) {
+            clearTimeout(timer);
+            source.removeEventListener('open', onOpen);
+            resolve(opened);
+        }
+        function onOpen() {
+            finish(true);
+        }
+        source.addEventListener('open', onOpen);
+    });
+}
@@ -11,6 +11,11 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // 予約データの読み込み
     loadBookings();
+    
+    // 予約データの変更をサーバーから受け取る（SSE）
+    subscribeBookingEvents({
+        bookings_changed: () => applyFilters()
+    });
 });
 
 /**
@@ -227,10 +227,18 @@ class PWAManager {
   // プッシュ通知の購読
   async subscribeToPush() {
     try {
+      // サーバーからVAPID公開鍵を取得
+      const keyResponse = await fetch('/api/push/vapid-public-key');
+      if (!keyResponse.ok) {
+        console.log('PWA Manager: プッシュ通知はサーバー側で無効です');
+        return;
+      }
+      const { public_key: publicKey } = await keyResponse.json();
+      
       const registration = await navigator.serviceWorker.ready;
       this.pushSubscription = await registration.pushManager.subscribe({
         userVisibleOnly: true,
-        applicationServerKey: this.urlBase64ToUint8Array('YOUR_VAPID_PUBLIC_KEY')
+        applicationServerKey: this.urlBase64ToUint8Array(publicKey)
       });
       
       console.log('プッシュ通知購読成功:', this.pushSubscription);
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""テスト共通の設定（リポジトリ直下のモジュールを読み込めるようにする）"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
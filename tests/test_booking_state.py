@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+予約処理の状態の保存・再開のテスト
+"""
+
+import requests
+
+import booking_state
+from booking_state import BookingState, BookingCheckpointStore
+from hospital_booking_automation_v3 import HospitalBookingAutomationV3
+
+def interrupted_submit_state():
+    """受付フォームの送信中に中断した状態"""
+    state = BookingState(
+        step=booking_state.SUBMIT,
+        urls={'top': 'https://example.com/top', 'form_page': 'https://example.com/form',
+              'action': 'https://example.com/rsvmodM04.jsp'},
+        form_data={'pNo': '1527', 'pBDayMM': '08', 'pBDayDD': '08', 'agent': 'RSV1', 'jobid': 'rsvmodM04'}
+    )
+    state.begin_post()
+    return state
+
+def test_load_finishes_interrupted_post_for_review(tmp_path):
+    store = BookingCheckpointStore(str(tmp_path))
+    store.save('advance-1', interrupted_submit_state())
+
+    state = store.load('advance-1')
+
+    assert state.step == booking_state.FAILED
+    assert state.result == 'failed'
+    assert state.needs_review
+    assert store.pending() == []
+    assert [key for key, _ in store.needs_review()] == ['advance-1']
+
+def test_state_without_marker_resumes(tmp_path):
+    store = BookingCheckpointStore(str(tmp_path))
+    store.save('advance-2', BookingState(step=booking_state.SUBMIT))
+
+    state = store.load('advance-2')
+
+    assert state.step == booking_state.SUBMIT
+    assert store.pending() == ['advance-2']
+
+def test_book_does_not_resend_interrupted_post(tmp_path, monkeypatch):
+    store = BookingCheckpointStore(str(tmp_path))
+    store.save('advance-3', interrupted_submit_state())
+    monkeypatch.setattr(booking_state, '_checkpoint_store', store)
+
+    sent = []
+    def record_request(session, method, url, *args, **kwargs):
+        sent.append((method, url))
+        raise AssertionError(f"送信してはいけません: {method} {url}")
+    monkeypatch.setattr(requests.Session, 'request', record_request)
+
+    automation = HospitalBookingAutomationV3()
+    automation.checkpoint_key = 'advance-3'
+
+    assert automation.book() is False
+    assert sent == []
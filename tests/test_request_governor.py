@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+予約サイトへの送信の調整のテスト
+"""
+
+import time
+import threading
+
+import pytest
+
+from request_governor import DEFAULT_LIMITS, HostGovernor, CircuitOpenError
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {'Content-Type': 'text/html'}
+        self.text = ''
+
+class BlockingSession:
+    """releaseされるまで応答を返さず、送信回数を数えるセッション"""
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return FakeResponse(self.status_code)
+
+def half_open_governor():
+    governor = HostGovernor('example.test', dict(DEFAULT_LIMITS, rate_per_second=100, burst=10,
+                                                 reset_seconds=0.1, acquire_timeout=5))
+    for _ in range(governor.limits['failure_threshold']):
+        governor.breaker.record_failure()
+    time.sleep(0.15)
+    assert governor.breaker.state == 'half_open'
+    return governor
+
+def send_from_threads(governor, session, count):
+    results = []
+
+    def worker():
+        try:
+            results.append(governor.send(session, 'GET', 'http://example.test/'))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    assert session.started.wait(5)
+    time.sleep(0.1)
+    calls_during_probe = session.calls
+    session.release.set()
+    for thread in threads:
+        thread.join(5)
+    return calls_during_probe, results
+
+def test_half_open_sends_single_probe_then_resumes():
+    governor = half_open_governor()
+    session = BlockingSession(200)
+
+    calls_during_probe, results = send_from_threads(governor, session, 3)
+
+    assert calls_during_probe == 1
+    assert session.calls == 3
+    assert all(isinstance(result, FakeResponse) for result in results)
+    assert governor.breaker.state == 'closed'
+
+def test_failed_probe_reopens_for_waiting_callers():
+    governor = half_open_governor()
+    session = BlockingSession(503)
+
+    calls_during_probe, results = send_from_threads(governor, session, 3)
+
+    assert calls_during_probe == 1
+    assert session.calls == 1
+    assert sum(isinstance(result, CircuitOpenError) for result in results) == 2
+    assert governor.breaker.state == 'open'
+
+def test_probe_released_when_not_recorded():
+    governor = half_open_governor()
+
+    with pytest.raises(RuntimeError):
+        with governor.slot():
+            raise RuntimeError("送信前の失敗")
+
+    assert not governor.breaker.probing
+    assert governor.breaker.admit(0)[0] == 'probe'
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+待ち人数の時系列保存のテスト
+"""
+
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from wait_count_collector import WaitCountStore, ROLLUP_RESOLUTIONS
+
+JST = timezone(timedelta(hours=9))
+JST_OFFSET = 9 * 3600
+
+def make_store(tmp_path):
+    path = str(tmp_path / 'bookings.db')
+    return WaitCountStore(lambda: sqlite3.connect(path), utc_offset=JST_OFFSET), path
+
+def rollups(path, resolution):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            'SELECT bucket_start, sample_count, min_count, max_count FROM wait_count_rollups '
+            'WHERE resolution = ? ORDER BY bucket_start', (ROLLUP_RESOLUTIONS[resolution],)
+        ).fetchall()
+    finally:
+        conn.close()
+
+def test_daily_rollup_starts_at_local_midnight(tmp_path):
+    store, path = make_store(tmp_path)
+
+    # 日本時間9時前（UTCでは前日）と午前の受付時間中のサンプルは同じ日に集計する
+    store.add_sample(3, datetime(2026, 10, 19, 8, 30, tzinfo=JST))
+    store.add_sample(12, datetime(2026, 10, 19, 10, 0, tzinfo=JST))
+
+    midnight = int(datetime(2026, 10, 19, tzinfo=JST).timestamp())
+    assert rollups(path, '1d') == [(midnight, 2, 3, 12)]
+    assert [row[0] for row in rollups(path, '1h')] == [
+        int(datetime(2026, 10, 19, 8, tzinfo=JST).timestamp()),
+        int(datetime(2026, 10, 19, 10, tzinfo=JST).timestamp())
+    ]
+
+def test_utc_aligned_daily_rollups_are_rebuilt(tmp_path):
+    path = str(tmp_path / 'bookings.db')
+    WaitCountStore(lambda: sqlite3.connect(path), utc_offset=0).add_sample(
+        3, datetime(2026, 10, 19, 8, 30, tzinfo=JST))
+
+    store, _ = make_store(tmp_path)
+    store.add_sample(12, datetime(2026, 10, 19, 10, 0, tzinfo=JST))
+
+    midnight = int(datetime(2026, 10, 19, tzinfo=JST).timestamp())
+    assert rollups(path, '1d') == [(midnight, 2, 3, 12)]
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+待ち人数の時系列収集 - かよ皮膚科予約管理システム
+順番受付ページの待ち人数を診療時間中に定期取得し、時系列として保存する
+"""
+
+import os
+import re
+import random
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from reception_calendar import get_reception_calendar
+
+logger = logging.getLogger(__name__)
+
+# 待ち人数の表示（例: 待ち人数&nbsp;&nbsp;<span>20</span>&nbsp;人）
+WAIT_COUNT_PATTERN = re.compile(r'待ち人数.*?(\d+)')
+
+# ロールアップの集計単位（秒）
+ROLLUP_RESOLUTIONS = {
+    '5m': 300,
+    '1h': 3600,
+    '1d': 86400
+}
+
+# 待ち人数が変動する時間帯（受付時間カレンダーの診察時間の種類、祝日・休診日は除かれる）
+OPENING_KINDS = ('morning', 'afternoon')
+
+# 受付サイトへの負荷を抑えるための最小取得間隔（秒）
+MIN_INTERVAL_SECONDS = 60
+
+def parse_wait_count(html):
+    """HTMLから待ち人数を抽出（見つからない場合はNone）"""
+    match = WAIT_COUNT_PATTERN.search(html)
+    if match:
+        return int(match.group(1))
+    return None
+
+def default_connection_factory():
+    """待ち人数を保存するSQLiteデータベースに接続"""
+    os.makedirs('database', exist_ok=True)
+    return sqlite3.connect('database/bookings.db')
+
+class WaitCountStore:
+    """待ち人数の時系列とロールアップを保存するクラス"""
+
+    def __init__(self, db_connection_factory=None, utc_offset=None):
+        self.db_connection_factory = db_connection_factory or default_connection_factory
+        # 集計の区切りを日本時間の0時に合わせる（夏時間がないため固定のUTCオフセット）
+        if utc_offset is None:
+            utc_offset = int(datetime.now().astimezone().utcoffset().total_seconds())
+        self.utc_offset = utc_offset
+        self.lock = threading.Lock()
+        self.table_ready = False
+
+    def bucket_start(self, sampled_at, resolution):
+        """UNIX秒が含まれる集計単位の開始（日本時間の区切り）"""
+        return sampled_at - ((sampled_at + self.utc_offset) % resolution)
+
+    def ensure_tables(self, conn):
+        """時系列テーブルとロールアップテーブルを作成"""
+        if self.table_ready:
+            return
+
+        cursor = conn.cursor()
+
+        # 生データ（UNIX秒をキーにした1行12バイト程度のコンパクトな表）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS wait_count_samples (
+                sampled_at INTEGER PRIMARY KEY,
+                wait_count INTEGER NOT NULL,
+                source TEXT
+            )
+        ''')
+
+        # ダウンサンプリング済みの集計
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS wait_count_rollups (
+                resolution INTEGER NOT NULL,
+                bucket_start INTEGER NOT NULL,
+                sample_count INTEGER NOT NULL,
+                min_count INTEGER NOT NULL,
+                max_count INTEGER NOT NULL,
+                avg_count REAL NOT NULL,
+                PRIMARY KEY (resolution, bucket_start)
+            )
+        ''')
+        self.realign_daily_rollups(cursor)
+        conn.commit()
+        self.table_ready = True
+
+    def realign_daily_rollups(self, cursor):
+        """UTCの0時で区切られた日単位の集計を、時間単位の集計から日本時間の区切りで作り直す"""
+        daily = ROLLUP_RESOLUTIONS['1d']
+        hourly = ROLLUP_RESOLUTIONS['1h']
+        cursor.execute('''
+            SELECT COUNT(*) FROM wait_count_rollups
+            WHERE resolution = ? AND (bucket_start + ?) % ? != 0
+        ''', (daily, self.utc_offset, daily))
+        if cursor.fetchone()[0] == 0:
+            return
+
+        cursor.execute('DELETE FROM wait_count_rollups WHERE resolution = ?', (daily,))
+        cursor.execute('''
+            INSERT INTO wait_count_rollups
+                (resolution, bucket_start, sample_count, min_count, max_count, avg_count)
+            SELECT ?, day_start, SUM(sample_count), MIN(min_count), MAX(max_count),
+                   SUM(avg_count * sample_count) / SUM(sample_count)
+            FROM (
+                SELECT bucket_start - ((bucket_start + ?) % ?) AS day_start,
+                       sample_count, min_count, max_count, avg_count
+                FROM wait_count_rollups WHERE resolution = ?
+            )
+            GROUP BY day_start
+        ''', (daily, self.utc_offset, daily, hourly))
+        logger.info("日単位の待ち人数の集計を日本時間の区切りで作り直しました")
+
+    def add_sample(self, wait_count, sampled_at=None, source='collector'):
+        """待ち人数を1件保存し、ロールアップを更新（同じ秒の待ち人数が保存済みの場合はFalse）"""
+        sampled_at = int((sampled_at or datetime.now()).timestamp())
+
+        with self.lock:
+            conn = self.db_connection_factory()
+            try:
+                self.ensure_tables(conn)
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR IGNORE INTO wait_count_samples (sampled_at, wait_count, source)
+                    VALUES (?, ?, ?)
+                ''', (sampled_at, wait_count, source))
+                if cursor.rowcount == 0:
+                    # 同じ秒の待ち人数は保存済み（ロールアップと件数を合わせるため集計もしない）
+                    return False
+
+                # 各集計単位のバケットを逐次更新（再集計不要）
+                for resolution in ROLLUP_RESOLUTIONS.values():
+                    bucket_start = self.bucket_start(sampled_at, resolution)
+                    cursor.execute('''
+                        INSERT INTO wait_count_rollups
+                            (resolution, bucket_start, sample_count, min_count, max_count, avg_count)
+                        VALUES (?, ?, 1, ?, ?, ?)
+                        ON CONFLICT(resolution, bucket_start) DO UPDATE SET
+                            avg_count = (avg_count * sample_count + excluded.avg_count) / (sample_count + 1),
+                            sample_count = sample_count + 1,
+                            min_count = MIN(min_count, excluded.min_count),
+                            max_count = MAX(max_count, excluded.max_count)
+                    ''', (resolution, bucket_start, wait_count, wait_count, wait_count))
+
+                conn.commit()
+                return True
+            finally:
+                conn.close()
+
+    def query(self, start, end, resolution='raw'):
+        """期間内の待ち人数を取得（resolution: raw / 5m / 1h / 1d）"""
+        start_ts = int(start.timestamp())
+        end_ts = int(end.timestamp())
+
+        conn = self.db_connection_factory()
+        try:
+            self.ensure_tables(conn)
+            cursor = conn.cursor()
+
+            if resolution == 'raw':
+                cursor.execute('''
+                    SELECT sampled_at, wait_count FROM wait_count_samples
+                    WHERE sampled_at >= ? AND sampled_at < ?
+                    ORDER BY sampled_at ASC
+                ''', (start_ts, end_ts))
+                return [
+                    {
+                        'timestamp': datetime.fromtimestamp(sampled_at).strftime('%Y-%m-%d %H:%M:%S'),
+                        'wait_count': wait_count
+                    }
+                    for sampled_at, wait_count in cursor.fetchall()
+                ]
+
+            if resolution not in ROLLUP_RESOLUTIONS:
+                raise ValueError(f"不明な集計単位です: {resolution}")
+
+            cursor.execute('''
+                SELECT bucket_start, sample_count, min_count, max_count, avg_count
+                FROM wait_count_rollups
+                WHERE resolution = ? AND bucket_start >= ? AND bucket_start < ?
+                ORDER BY bucket_start ASC
+            ''', (ROLLUP_RESOLUTIONS[resolution], start_ts, end_ts))
+            return [
+                {
+                    'timestamp': datetime.fromtimestamp(bucket_start).strftime('%Y-%m-%d %H:%M:%S'),
+                    'samples': sample_count,
+                    'min': min_count,
+                    'max': max_count,
+                    'avg': round(avg_count, 2)
+                }
+                for bucket_start, sample_count, min_count, max_count, avg_count in cursor.fetchall()
+            ]
+        finally:
+            conn.close()
+
+    def load_series(self, start=None, end=None):
+        """期間内の生データを(UNIX秒, 待ち人数)のリストで取得（予測モデルの学習用）"""
+        start_ts = int(start.timestamp()) if start else 0
+        end_ts = int(end.timestamp()) if end else 2 ** 62
+
+        conn = self.db_connection_factory()
+        try:
+            self.ensure_tables(conn)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT sampled_at, wait_count FROM wait_count_samples
+                WHERE sampled_at >= ? AND sampled_at < ?
+                ORDER BY sampled_at ASC
+            ''', (start_ts, end_ts))
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def latest(self):
+        """最新の待ち人数を取得"""
+        conn = self.db_connection_factory()
+        try:
+            self.ensure_tables(conn)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT sampled_at, wait_count FROM wait_count_samples
+                ORDER BY sampled_at DESC LIMIT 1
+            ''')
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+        return {
+            'timestamp': datetime.fromtimestamp(row[0]).strftime('%Y-%m-%d %H:%M:%S'),
+            'wait_count': row[1]
+        }
+
+    def prune(self, retention_days):
+        """保持期間を過ぎた生データを削除（ロールアップは残す）"""
+        cutoff = int((datetime.now() - timedelta(days=retention_days)).timestamp())
+
+        with self.lock:
+            conn = self.db_connection_factory()
+            try:
+                self.ensure_tables(conn)
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM wait_count_samples WHERE sampled_at < ?', (cutoff,))
+                deleted = cursor.rowcount
+                conn.commit()
+            finally:
+                conn.close()
+
+        if deleted:
+            logger.info(f"保持期間を過ぎた待ち人数データを削除しました: {deleted}件")
+        return deleted
+
+class WaitCountCollector:
+    """診療時間中に待ち人数を定期取得するクラス"""
+
+    def __init__(self, store, fetch_wait_count, interval_seconds=120, calendar=None, retention_days=90):
+        self.store = store
+        self.fetch_wait_count = fetch_wait_count
+        self.interval_seconds = max(MIN_INTERVAL_SECONDS, int(interval_seconds))
+        self.calendar = calendar or get_reception_calendar()
+        self.retention_days = retention_days
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def seconds_until_next_window(self, now=None):
+        """次の診療時間帯までの秒数（診療時間中は0、祝日・休診日は除く）"""
+        now = now or datetime.now()
+
+        waits = []
+        for kind in OPENING_KINDS:
+            start, _ = self.calendar.next_window(now, kind)
+            if start is not None:
+                waits.append(max(0.0, (start - now).total_seconds()))
+        return min(waits) if waits else None
+
+    def sample_once(self):
+        """待ち人数を1回取得して保存"""
+        try:
+            wait_count = self.fetch_wait_count()
+        except Exception as e:
+            logger.warning(f"待ち人数の取得エラー: {e}")
+            return None
+
+        if wait_count is None:
+            logger.info("待ち人数を取得できませんでした（受付時間外の可能性）")
+            return None
+
+        self.store.add_sample(wait_count, source='collector')
+        logger.info(f"待ち人数を記録しました: {wait_count}人")
+        return wait_count
+
+    def run(self):
+        """収集ループ（stop()が呼ばれるまで継続）"""
+        logger.info(f"待ち人数の収集を開始しました（間隔: {self.interval_seconds}秒）")
+        last_prune_date = None
+
+        while not self.stop_event.is_set():
+            wait_seconds = self.seconds_until_next_window()
+            if wait_seconds is None:
+                logger.warning("診療時間が設定されていないため、待ち人数の収集を終了します")
+                return
+
+            if wait_seconds > 0:
+                # 診療時間外は次の時間帯まで待機
+                self.stop_event.wait(wait_seconds)
+                continue
+
+            try:
+                self.sample_once()
+
+                today = datetime.now().date()
+                if last_prune_date != today:
+                    self.store.prune(self.retention_days)
+                    last_prune_date = today
+            except Exception as e:
+                # データベースのロックなどで収集を止めない
+                logger.error(f"待ち人数の保存エラー: {e}")
+
+            # 取得タイミングが揃わないように間隔を少しずらす
+            jitter = random.uniform(0, self.interval_seconds * 0.1)
+            self.stop_event.wait(self.interval_seconds + jitter)
+
+        logger.info("待ち人数の収集を停止しました")
+
+    def start(self):
+        """バックグラウンドスレッドで収集を開始"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='wait-count-collector', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """収集を停止"""
+        self.stop_event.set()
+
+# シングルトンインスタンス
+_wait_count_store = None
+
+def get_wait_count_store(db_connection_factory=None):
+    """WaitCountStoreのインスタンスを取得"""
+    global _wait_count_store
+    if _wait_count_store is None:
+        _wait_count_store = WaitCountStore(db_connection_factory)
+    elif db_connection_factory is not None:
+        _wait_count_store.db_connection_factory = db_connection_factory
+    return _wait_count_store
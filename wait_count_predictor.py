@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+待ち人数の予測 - かよ皮膚科予約管理システム
+蓄積した待ち人数の時系列から曜日・時間帯ごとの傾向を学習し、
+待ち人数が最も少なくなる時刻を推定する
+"""
+
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from wait_count_collector import get_wait_count_store
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# 1970-01-01（UNIX時間の起点）は木曜日
+EPOCH_WEEKDAY = 3
+
+class WaitCountPredictor:
+    """曜日×時間帯ごとの平均待ち人数を保持する予測モデル"""
+
+    def __init__(self, bucket_minutes=5, half_life_days=90, min_samples=3):
+        self.bucket_minutes = bucket_minutes
+        self.half_life_days = half_life_days
+        self.min_samples = min_samples
+        self.slots_per_day = 24 * 60 // bucket_minutes
+        # 日本時間は夏時間がないため固定のUTCオフセットで曜日・時刻を算出できる
+        self.utc_offset = int(datetime.now().astimezone().utcoffset().total_seconds())
+        self.mean = np.full((7, self.slots_per_day), np.nan)
+        self.counts = np.zeros((7, self.slots_per_day), dtype=np.int64)
+        self.fitted_at = None
+        self.sample_total = 0
+
+    def fit(self, timestamps, wait_counts, now=None):
+        """UNIX秒と待ち人数の配列から曜日×時間帯の加重平均を計算"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        wait_counts = np.asarray(wait_counts, dtype=np.float64)
+        size = 7 * self.slots_per_day
+
+        if timestamps.size == 0:
+            self.mean = np.full((7, self.slots_per_day), np.nan)
+            self.counts = np.zeros((7, self.slots_per_day), dtype=np.int64)
+            self.sample_total = 0
+            self.fitted_at = time.time()
+            return self
+
+        local = timestamps + self.utc_offset
+        weekdays = (local // 86400 + EPOCH_WEEKDAY) % 7
+        slots = (local % 86400) // (self.bucket_minutes * 60)
+        index = weekdays * self.slots_per_day + slots
+
+        # 直近の傾向を重視するため、半減期で古いサンプルの重みを下げる
+        now_ts = now if now is not None else time.time()
+        if self.half_life_days:
+            age_days = np.maximum(now_ts - timestamps, 0) / 86400.0
+            weights = np.power(0.5, age_days / self.half_life_days)
+        else:
+            weights = np.ones_like(wait_counts)
+
+        weighted_sums = np.bincount(index, weights=weights * wait_counts, minlength=size)
+        weight_totals = np.bincount(index, weights=weights, minlength=size)
+        counts = np.bincount(index, minlength=size)
+
+        mean = np.full(size, np.nan)
+        np.divide(weighted_sums, weight_totals, out=mean, where=weight_totals > 0)
+
+        self.mean = mean.reshape(7, self.slots_per_day)
+        self.counts = counts.reshape(7, self.slots_per_day)
+        self.sample_total = int(timestamps.size)
+        self.fitted_at = time.time()
+        return self
+
+    def fit_from_store(self, store=None, history_days=None):
+        """保存済みの時系列から学習"""
+        store = store or get_wait_count_store()
+        start = None
+        if history_days:
+            start = datetime.fromtimestamp(time.time() - history_days * 86400)
+
+        rows = store.load_series(start=start)
+        series = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        return self.fit(series[:, 0], series[:, 1])
+
+    def _slot(self, time_str):
+        """'HH:MM'を時間帯のインデックスに変換"""
+        hour, minute = map(int, time_str.split(':'))
+        return (hour * 60 + minute) // self.bucket_minutes
+
+    def _slot_to_time(self, slot):
+        """時間帯のインデックスを'HH:MM'に変換"""
+        minutes = slot * self.bucket_minutes
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def _window_curve(self, day, start_str, end_str):
+        """指定曜日・時間帯の予測値（サンプル不足の時間帯はNaN）"""
+        weekday = WEEKDAYS.index(day)
+        start_slot = self._slot(start_str)
+        end_slot = max(self._slot(end_str), start_slot + 1)
+
+        curve = self.mean[weekday, start_slot:end_slot].copy()
+        curve[self.counts[weekday, start_slot:end_slot] < self.min_samples] = np.nan
+        return start_slot, curve
+
+    def predict_best_time(self, day, start_str, end_str):
+        """時間帯内で待ち人数が最も少ないと予測される時刻と予測値を返す"""
+        start_slot, curve = self._window_curve(day, start_str, end_str)
+        if np.all(np.isnan(curve)):
+            return None
+
+        best = int(np.nanargmin(curve))
+        return self._slot_to_time(start_slot + best), float(curve[best])
+
+    def predict_remaining_minimum(self, day, now_str, end_str):
+        """現在から時間帯終了までに予測される最小の待ち人数"""
+        _, curve = self._window_curve(day, now_str, end_str)
+        if np.all(np.isnan(curve)):
+            return None
+        return float(np.nanmin(curve))
+
+    def predict_curve(self, day):
+        """曜日ごとの予測曲線（時刻と予測値のリスト）"""
+        weekday = WEEKDAYS.index(day)
+        return [
+            {'time': self._slot_to_time(slot), 'wait_count': round(float(self.mean[weekday, slot]), 2)}
+            for slot in np.flatnonzero(self.counts[weekday] >= self.min_samples)
+        ]
+
+# シングルトンインスタンス
+_wait_count_predictor = None
+
+def get_wait_count_predictor(refit_interval=3600, history_days=365):
+    """学習済みのWaitCountPredictorを取得（一定時間ごとに再学習）"""
+    global _wait_count_predictor
+    if _wait_count_predictor is None:
+        _wait_count_predictor = WaitCountPredictor()
+
+    fitted_at = _wait_count_predictor.fitted_at
+    if fitted_at is None or time.time() - fitted_at > refit_interval:
+        started = time.perf_counter()
+        _wait_count_predictor.fit_from_store(history_days=history_days)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"待ち人数の予測モデルを更新しました（サンプル数: {_wait_count_predictor.sample_total}, {elapsed_ms:.1f}ms）")
+
+    return _wait_count_predictor